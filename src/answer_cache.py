@@ -0,0 +1,156 @@
+import os
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+
+# Thư mục chứa chỉ mục (giống rag_system, đổi được qua biến môi trường DATA_DIR)
+DATA_DIR = os.getenv("DATA_DIR", "data")
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600,
+        similarity_threshold: float = 0.92,
+        index_path: str = os.path.join(DATA_DIR, "faiss_index.bin")
+    ):
+        """
+        Bộ nhớ đệm câu trả lời hai tầng đặt trước LLMGenerator.
+
+        Tầng 1 khớp chính xác câu hỏi đã chuẩn hóa; tầng 2 so khớp ngữ nghĩa bằng vector
+        nhúng câu hỏi (cosine similarity >= similarity_threshold). Câu trả lời chỉ được dùng lại
+        cho yêu cầu có cùng max_length. Mục cũ bị loại theo LRU và TTL; toàn bộ cache bị xóa khi
+        chỉ mục FAISS được xây dựng lại.
+
+        Args:
+            max_entries (int): Số câu trả lời tối đa được giữ.
+            ttl_seconds (float): Thời gian sống của mỗi mục (giây).
+            similarity_threshold (float): Ngưỡng cosine similarity cho tầng ngữ nghĩa.
+            index_path (str): Đường dẫn chỉ mục FAISS dùng để nhận biết phiên bản chỉ mục.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._matrix_keys = []
+        self.index_version = self._current_index_version()
+        self.counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def _current_index_version(self) -> str:
+        # Phiên bản chỉ mục dựa trên thời điểm sửa đổi và kích thước file
+        if not os.path.exists(self.index_path):
+            return ""
+        stat = os.stat(self.index_path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """
+        Chuẩn hóa câu hỏi cho tầng khớp chính xác (NFC, chữ thường, gộp khoảng trắng, bỏ dấu câu cuối).
+        """
+        question = unicodedata.normalize("NFC", question).lower()
+        question = " ".join(question.split())
+        return re.sub(r'[\s?.!]+$', '', question)
+
+    def _check_index_version(self) -> None:
+        version = self._current_index_version()
+        if version != self.index_version:
+            self._entries.clear()
+            self._matrix = None
+            self.index_version = version
+            self.counters["invalidations"] += 1
+
+    def _is_expired(self, entry: dict) -> bool:
+        return time.monotonic() - entry["created_at"] > self.ttl_seconds
+
+    def _semantic_matrix(self) -> np.ndarray:
+        # Ma trận vector (đã chuẩn hóa) của các mục còn hiệu lực, chỉ dựng lại khi cache thay đổi
+        if self._matrix is None:
+            self._matrix_keys = [key for key, entry in self._entries.items() if entry["vector"] is not None]
+            vectors = [self._entries[key]["vector"] for key in self._matrix_keys]
+            self._matrix = np.stack(vectors) if vectors else np.zeros((0, 0), dtype='float32')
+        return self._matrix
+
+    def get(self, question: str, query_vector=None, max_length: int = None) -> dict:
+        """
+        Tra cứu câu trả lời đã lưu.
+
+        Args:
+            question (str): Câu hỏi.
+            query_vector (optional): Vector nhúng câu hỏi (từ RagSystem) cho tầng ngữ nghĩa.
+            max_length (int, optional): Độ dài tối đa của câu trả lời được yêu cầu.
+
+        Returns:
+            dict: Kết quả đã lưu (rag_prompt, rag_answer) hoặc None nếu không có.
+        """
+        with self._lock:
+            self._check_index_version()
+
+            key = (self.normalize(question), max_length)
+            entry = self._entries.get(key)
+            if entry is not None and not self._is_expired(entry):
+                self._entries.move_to_end(key)
+                self.counters["exact_hits"] += 1
+                return entry["result"]
+
+            if query_vector is not None and self._entries:
+                matrix = self._semantic_matrix()
+                if len(matrix):
+                    vector = np.asarray(query_vector, dtype='float32')
+                    similarities = matrix @ (vector / (np.linalg.norm(vector) or 1.0))
+                    # Chỉ so với các mục có cùng max_length
+                    same_length = np.array([key[1] == max_length for key in self._matrix_keys])
+                    similarities = np.where(same_length, similarities, -np.inf)
+                    best = int(np.argmax(similarities))
+                    entry = self._entries[self._matrix_keys[best]]
+                    if similarities[best] >= self.similarity_threshold and not self._is_expired(entry):
+                        self._entries.move_to_end(self._matrix_keys[best])
+                        self.counters["semantic_hits"] += 1
+                        return entry["result"]
+
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, question: str, result: dict, query_vector=None, max_length: int = None) -> None:
+        """
+        Lưu câu trả lời cho câu hỏi.
+
+        Args:
+            question (str): Câu hỏi.
+            result (dict): Kết quả (rag_prompt, rag_answer).
+            query_vector (optional): Vector nhúng câu hỏi cho tầng ngữ nghĩa.
+            max_length (int, optional): Độ dài tối đa đã dùng khi sinh câu trả lời.
+        """
+        vector = None
+        if query_vector is not None:
+            vector = np.asarray(query_vector, dtype='float32')
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+
+        with self._lock:
+            self._check_index_version()
+            key = (self.normalize(question), max_length)
+            self._entries[key] = {"result": result, "vector": vector, "created_at": time.monotonic()}
+            self._entries.move_to_end(key)
+
+            # Loại các mục hết hạn, sau đó loại theo LRU nếu vượt quá kích thước
+            for expired_key in [k for k, entry in self._entries.items() if self._is_expired(entry)]:
+                del self._entries[expired_key]
+                self.counters["evictions"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+            self._matrix = None
+
+    def stats(self) -> dict:
+        """
+        Trả về các bộ đếm hit/miss và số mục hiện có.
+        """
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries))
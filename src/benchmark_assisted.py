@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import argparse
+from dotenv import load_dotenv
+
+# Tải biến môi trường từ file .env
+load_dotenv()
+
+# Định nghĩa các hằng số
+EMBEDDING_MODEL = os.getenv("MODEL_EMBEDDING")
+LLM_MODEL = "meta-llama/Llama-3.2-1B-Instruct"
+ASSISTANT_MODEL = os.getenv("ASSISTANT_MODEL") or None
+DATA_DIR = os.getenv("DATA_DIR", "data")
+TEST_DATA_PATH = os.path.join(DATA_DIR, "questions.json")
+REPORT_PATH = "logs/assisted_benchmark.json"
+CPU_PRECISION = os.getenv("CPU_PRECISION") or None
+NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+NUM_INTEROP_THREADS = int(os.getenv("TORCH_NUM_INTEROP_THREADS", "0"))
+
+
+def run_decoding(llm, prompts: list, max_length: int) -> tuple:
+    """
+    Sinh câu trả lời cho các prompt đã tăng cường (từng prompt một) và đo thời gian.
+
+    Returns:
+        tuple: (danh sách câu trả lời, số giây, số token của câu trả lời).
+    """
+    start = time.perf_counter()
+    results = llm.generate_batch(prompts, batch_size=1, max_length=max_length, use_rag=False)
+    seconds = time.perf_counter() - start
+    answers = [result["rag_answer"] for result in results]
+    answer_tokens = sum(len(ids) for ids in llm.tokenizer(answers, add_special_tokens=False)["input_ids"])
+    return answers, seconds, answer_tokens
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="So sánh tốc độ sinh (token/s) giữa greedy decoding thông thường và assisted decoding.")
+    parser.add_argument("--questions", default=TEST_DATA_PATH)
+    parser.add_argument("--limit", type=int, default=0, help="Số câu hỏi tối đa (0: tất cả).")
+    parser.add_argument("--llm-model", default=LLM_MODEL)
+    parser.add_argument("--assistant-model", default=ASSISTANT_MODEL, required=ASSISTANT_MODEL is None)
+    parser.add_argument("--num-assistant-tokens", type=int, default=None)
+    parser.add_argument("--embedding-model", default=EMBEDDING_MODEL)
+    parser.add_argument("--max-length", type=int, default=128)
+    parser.add_argument("--output", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    from llm_generator import LLMGenerator
+    from evaluate import compute_accuracy
+
+    with open(args.questions, "r", encoding="utf-8") as file:
+        data = json.load(file)[:args.limit or None]
+    references = [item["reference_answer"] for item in data]
+
+    llm = LLMGenerator(
+        model_name=args.llm_model,
+        embedding_model=args.embedding_model,
+        use_rag=True,
+        cpu_precision=CPU_PRECISION,
+        num_threads=NUM_THREADS,
+        num_interop_threads=NUM_INTEROP_THREADS,
+        assistant_model_name=args.assistant_model,
+        num_assistant_tokens=args.num_assistant_tokens
+    )
+    # Truy xuất một lần cho cả hai lượt để chỉ đo phần sinh
+    prompts = llm.rag.rag_query_batch([item["question"] for item in data])
+
+    # Lượt đối chứng: greedy decoding thông thường (tạm tách mô hình nháp)
+    assistant_model = llm.assistant_model
+    llm.assistant_model = None
+    llm.model.generation_config.do_sample = False
+    llm.generate_batch(prompts[:1], max_length=4, use_rag=False)
+    greedy_answers, greedy_seconds, greedy_tokens = run_decoding(llm, prompts, args.max_length)
+
+    llm.assistant_model = assistant_model
+    llm.generate_batch(prompts[:1], max_length=4, use_rag=False)
+    llm.assisted_stats.update(generations=0, main_passes=0, draft_tokens=0, new_tokens=0)
+    assisted_answers, assisted_seconds, assisted_tokens = run_decoding(llm, prompts, args.max_length)
+
+    report = {
+        "questions": len(prompts),
+        "llm_model": args.llm_model,
+        "assistant_model": args.assistant_model,
+        "cpu_precision": llm.cpu_precision,
+        "greedy": {
+            "seconds": greedy_seconds,
+            "answer_tokens_per_second": greedy_tokens / greedy_seconds,
+            "accuracy": compute_accuracy(references, greedy_answers)[0],
+        },
+        "assisted": dict(
+            seconds=assisted_seconds,
+            answer_tokens_per_second=assisted_tokens / assisted_seconds,
+            accuracy=compute_accuracy(references, assisted_answers)[0],
+            **llm.assisted_decoding_stats()
+        ),
+        "speedup": greedy_seconds / assisted_seconds,
+        "identical_answers": sum(a == b for a, b in zip(greedy_answers, assisted_answers)),
+    }
+
+    print(f"{'Chế độ':<10} {'Thời gian (s)':>14} {'Token/s':>9} {'Chính xác':>10}")
+    for mode in ("greedy", "assisted"):
+        row = report[mode]
+        print(f"{mode:<10} {row['seconds']:>14.1f} {row['answer_tokens_per_second']:>9.1f} {row['accuracy']:>9.2f}%")
+    acceptance_rate = report["assisted"]["acceptance_rate"]
+    print(f"Tăng tốc: {report['speedup']:.2f}x, tỉ lệ chấp nhận token nháp: "
+          f"{'-' if acceptance_rate is None else f'{acceptance_rate:.2%}'}, "
+          f"token/lần chạy mô hình chính: {report['assisted']['tokens_per_main_pass'] or 0:.2f}, "
+          f"câu trả lời trùng khớp: {report['identical_answers']}/{report['questions']}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, ensure_ascii=False, indent=2)
+    print(f"Đã lưu báo cáo tại: {args.output}")
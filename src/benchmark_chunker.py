@@ -0,0 +1,110 @@
+import os
+import re
+import json
+import time
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+from embedding import Embedding
+
+# Tải biến môi trường từ file .env
+load_dotenv()
+
+# Định nghĩa các hằng số
+DATA_DIR = os.getenv("DATA_DIR", "data")
+INPUT_PATH = os.path.join(DATA_DIR, "all_data.txt")
+REPORT_PATH = "logs/chunker_benchmark.json"
+
+
+def legacy_chunk_text(tokenizer, input_text: str, chunk_size: int) -> list:
+    """
+    Cài đặt chia đoạn cũ của Embedding.chunk_text (mã hóa từng câu, chia đôi đệ quy
+    danh sách token và giải mã lại từng phần), giữ lại để so sánh.
+    """
+    def split_by_token(tokens: list, max_length: int) -> list:
+        if len(tokens) <= max_length * 1.1:
+            return [tokens]
+        mid_point = len(tokens) // 2
+        return split_by_token(tokens[:mid_point], max_length) + split_by_token(tokens[mid_point:], max_length)
+
+    rough_chunks = re.split(r'\.\s+|\n+', input_text)
+    rough_chunks = [chunk.strip() for chunk in rough_chunks if chunk.strip()]
+
+    final_chunks = []
+    for chunk in rough_chunks:
+        tokens = tokenizer.encode(chunk, add_special_tokens=False)
+        if len(tokens) <= chunk_size * 1.1:
+            final_chunks.append(tokenizer.decode(tokens))
+        else:
+            final_chunks.extend(tokenizer.decode(t) for t in split_by_token(tokens, chunk_size))
+    return final_chunks
+
+
+def chunk_statistics(tokenizer, chunks: list, chunk_size: int) -> dict:
+    """
+    Thống kê phân bố số token của các đoạn.
+    """
+    lengths = np.array([len(ids) for ids in tokenizer(chunks, add_special_tokens=False)["input_ids"]])
+    return {
+        "num_chunks": len(chunks),
+        "mean_tokens": float(lengths.mean()),
+        "min_tokens": int(lengths.min()),
+        "p50_tokens": float(np.percentile(lengths, 50)),
+        "p95_tokens": float(np.percentile(lengths, 95)),
+        "max_tokens": int(lengths.max()),
+        "under_32_tokens": int((lengths < 32).sum()),
+        "over_chunk_size": int((lengths > chunk_size).sum()),
+    }
+
+
+def time_chunker(chunker, input_text: str, repeats: int) -> tuple:
+    """
+    Chạy hàm chia đoạn nhiều lần, trả về (kết quả, thời gian tốt nhất tính bằng giây).
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        chunks = chunker(input_text)
+        best = min(best, time.perf_counter() - start)
+    return chunks, best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="So sánh tốc độ và phân bố kích thước đoạn của bộ chia đoạn cũ và mới.")
+    parser.add_argument("--input", default=INPUT_PATH)
+    parser.add_argument("--embedding-model", default=os.getenv("MODEL_EMBEDDING"))
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--chunk-overlap", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as file:
+        input_text = file.read()
+
+    embedder = Embedding(model_name=args.embedding_model, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    tokenizer = embedder.tokenizer
+
+    report = {"input": args.input, "input_bytes": len(input_text.encode("utf-8")), "fast_tokenizer": tokenizer.is_fast}
+    chunkers = {
+        "legacy": lambda text: legacy_chunk_text(tokenizer, text, args.chunk_size),
+        "current": embedder.chunk_text,
+    }
+    for name, chunker in chunkers.items():
+        chunks, seconds = time_chunker(chunker, input_text, args.repeats)
+        report[name] = dict(
+            seconds=seconds,
+            mb_per_second=report["input_bytes"] / seconds / 1e6,
+            **chunk_statistics(tokenizer, chunks, args.chunk_size)
+        )
+
+    print(f"{'Bộ chia':<10} {'Giây':>8} {'MB/s':>8} {'Số đoạn':>8} {'TB token':>9} {'p95':>6} {'<32':>6} {'>max':>6}")
+    for name in chunkers:
+        row = report[name]
+        print(f"{name:<10} {row['seconds']:>8.3f} {row['mb_per_second']:>8.3f} {row['num_chunks']:>8} "
+              f"{row['mean_tokens']:>9.1f} {row['p95_tokens']:>6.0f} {row['under_32_tokens']:>6} {row['over_chunk_size']:>6}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f"Đã lưu báo cáo tại: {args.output}")
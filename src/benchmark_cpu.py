@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from dotenv import load_dotenv
+
+# Tải biến môi trường từ file .env
+load_dotenv()
+
+# Định nghĩa các hằng số
+EMBEDDING_MODEL = os.getenv("MODEL_EMBEDDING")
+LLM_MODEL = "meta-llama/Llama-3.2-1B-Instruct"
+DATA_DIR = os.getenv("DATA_DIR", "data")
+TEST_DATA_PATH = os.path.join(DATA_DIR, "questions.json")
+REPORT_PATH = "logs/cpu_benchmark.json"
+NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+NUM_INTEROP_THREADS = int(os.getenv("TORCH_NUM_INTEROP_THREADS", "0"))
+
+
+def peak_rss_mb() -> float:
+    """
+    Bộ nhớ RSS lớn nhất của tiến trình hiện tại (MB), None nếu hệ điều hành không hỗ trợ.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def run_mode(precision: str, args) -> dict:
+    """
+    Tải LLMGenerator với chế độ suy luận đã chọn, sinh câu trả lời cho bộ câu hỏi và đo
+    tốc độ, bộ nhớ và độ chính xác (cùng cách tính với evaluate.py).
+    """
+    from llm_generator import LLMGenerator
+    from cpu_inference import model_nbytes
+    from evaluate import compute_accuracy
+
+    with open(args.questions, "r", encoding="utf-8") as file:
+        data = json.load(file)[:args.limit or None]
+    questions = [item["question"] for item in data]
+    references = [item["reference_answer"] for item in data]
+
+    start = time.perf_counter()
+    llm = LLMGenerator(
+        model_name=args.llm_model,
+        embedding_model=args.embedding_model,
+        use_rag=True,
+        device="cpu",
+        cpu_precision=precision,
+        num_threads=args.num_threads,
+        num_interop_threads=args.num_interop_threads
+    )
+    load_seconds = time.perf_counter() - start
+
+    # Chạy thử một câu để khởi động mô hình
+    llm.generate_batch(questions[:1], max_length=4)
+
+    start = time.perf_counter()
+    results = llm.generate_batch(questions, batch_size=args.batch_size, max_length=args.max_length)
+    seconds = time.perf_counter() - start
+
+    answers = [result["rag_answer"] for result in results]
+    answer_tokens = sum(len(ids) for ids in llm.tokenizer(answers, add_special_tokens=False)["input_ids"])
+    accuracy, correct, total = compute_accuracy(references, answers)
+    return {
+        "requested_precision": precision,
+        "precision": llm.cpu_precision,
+        "load_seconds": load_seconds,
+        "seconds": seconds,
+        "questions_per_second": len(questions) / seconds,
+        "answer_tokens_per_second": answer_tokens / seconds,
+        "llm_weights_mb": model_nbytes(llm.model) / 2**20,
+        "embedding_weights_mb": model_nbytes(llm.rag.embedder.embedding_model) / 2**20,
+        "peak_rss_mb": peak_rss_mb(),
+        "accuracy": accuracy,
+        "correct": correct,
+        "total": total,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="So sánh tốc độ, bộ nhớ và độ chính xác của các chế độ suy luận trên CPU.")
+    parser.add_argument("--modes", default="fp32,bf16,int8", help="Danh sách chế độ, cách nhau bởi dấu phẩy.")
+    parser.add_argument("--questions", default=TEST_DATA_PATH)
+    parser.add_argument("--limit", type=int, default=0, help="Số câu hỏi tối đa (0: tất cả).")
+    parser.add_argument("--llm-model", default=LLM_MODEL)
+    parser.add_argument("--embedding-model", default=EMBEDDING_MODEL)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-length", type=int, default=128)
+    parser.add_argument("--num-threads", type=int, default=NUM_THREADS)
+    parser.add_argument("--num-interop-threads", type=int, default=NUM_INTEROP_THREADS)
+    parser.add_argument("--output", default=REPORT_PATH)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Tiến trình con: chạy một chế độ và ghi kết quả ra file
+    if args.worker:
+        with open(args.result_file, "w", encoding="utf-8") as result_file:
+            json.dump(run_mode(args.worker, args), result_file)
+        sys.exit(0)
+
+    # Mỗi chế độ chạy trong một tiến trình riêng để đo bộ nhớ độc lập
+    report = {"questions": args.questions, "limit": args.limit, "num_threads": args.num_threads,
+              "num_interop_threads": args.num_interop_threads, "modes": {}}
+    for mode in args.modes.split(","):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result_path = os.path.join(temp_dir, "result.json")
+            command = [sys.executable, __file__, "--worker", mode, "--result-file", result_path,
+                       "--questions", args.questions, "--limit", str(args.limit),
+                       "--llm-model", args.llm_model, "--embedding-model", args.embedding_model,
+                       "--batch-size", str(args.batch_size), "--max-length", str(args.max_length),
+                       "--num-threads", str(args.num_threads), "--num-interop-threads", str(args.num_interop_threads)]
+            completed = subprocess.run(command, stdout=subprocess.DEVNULL)
+            if completed.returncode != 0:
+                print(f"Chế độ {mode} thất bại (mã thoát {completed.returncode}).")
+                continue
+            with open(result_path, "r", encoding="utf-8") as result_file:
+                report["modes"][mode] = json.load(result_file)
+
+    print(f"{'Chế độ':<8} {'Tải (s)':>8} {'Câu/s':>7} {'Token/s':>8} {'LLM MB':>8} {'Nhúng MB':>9} {'RSS MB':>8} {'Chính xác':>10}")
+    for mode, row in report["modes"].items():
+        rss = f"{row['peak_rss_mb']:.0f}" if row["peak_rss_mb"] is not None else "-"
+        print(f"{row['precision']:<8} {row['load_seconds']:>8.1f} {row['questions_per_second']:>7.2f} "
+              f"{row['answer_tokens_per_second']:>8.1f} {row['llm_weights_mb']:>8.0f} {row['embedding_weights_mb']:>9.0f} "
+              f"{rss:>8} {row['accuracy']:>9.2f}%")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f"Đã lưu báo cáo tại: {args.output}")
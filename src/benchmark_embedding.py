@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+
+# Tải biến môi trường từ file .env
+load_dotenv()
+
+# Định nghĩa các hằng số
+EMBEDDING_MODEL = os.getenv("MODEL_EMBEDDING")
+DATA_DIR = os.getenv("DATA_DIR", "data")
+TEST_DATA_PATH = os.path.join(DATA_DIR, "questions.json")
+REPORT_PATH = "logs/embedding_benchmark.json"
+BATCH_SIZES = "1,8,64"
+NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+
+
+def measure_latency(embedder, questions: list, batch_size: int, repeats: int) -> dict:
+    """
+    Đo độ trễ mã hóa câu hỏi theo lô batch_size qua Embedding.embedding (không dùng cache).
+
+    Returns:
+        dict: Độ trễ mỗi lô (mean/p50/p95, ms) và độ trễ trung bình quy về mỗi câu hỏi.
+    """
+    batches = [questions[start:start + batch_size] for start in range(0, len(questions), batch_size)]
+    batches = [batch for batch in batches if len(batch) == batch_size] or [questions[:batch_size]]
+    # Chạy thử để khởi động mô hình
+    embedder.embedding(batches[0])
+
+    latencies = []
+    for _ in range(repeats):
+        for batch in batches:
+            start = time.perf_counter()
+            embedder.embedding(batch)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies = np.array(latencies)
+    return {
+        "batch_ms": {"mean": float(latencies.mean()), "p50": float(np.percentile(latencies, 50)),
+                     "p95": float(np.percentile(latencies, 95))},
+        "per_query_ms": float(latencies.mean() / len(batches[0])),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="So sánh độ trễ mã hóa câu hỏi giữa backend PyTorch và ONNX Runtime.")
+    parser.add_argument("--questions", default=TEST_DATA_PATH)
+    parser.add_argument("--embedding-model", default=EMBEDDING_MODEL)
+    parser.add_argument("--modes", default="torch:fp32,onnx:fp32,onnx:int8",
+                        help="Danh sách backend:precision, cách nhau bởi dấu phẩy.")
+    parser.add_argument("--batch-sizes", default=BATCH_SIZES)
+    parser.add_argument("--repeats", type=int, default=3, help="Số lần lặp lại toàn bộ câu hỏi.")
+    parser.add_argument("--num-threads", type=int, default=NUM_THREADS)
+    parser.add_argument("--output", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    from cpu_inference import configure_threads
+    from embedding import Embedding
+
+    configure_threads(args.num_threads)
+    with open(args.questions, "r", encoding="utf-8") as file:
+        questions = [item["question"] for item in json.load(file)]
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+
+    report = {"embedding_model": args.embedding_model, "questions": len(questions), "modes": {}}
+    reference = None
+    for mode in args.modes.split(","):
+        backend, precision = mode.split(":")
+        embedder = Embedding(model_name=args.embedding_model, precision=precision, backend=backend)
+        if embedder.backend != backend:
+            print(f"Bỏ qua {mode}: không tải được backend {backend}.")
+            continue
+        vectors = np.asarray(embedder.embedding(questions), dtype='float32')
+        if reference is None:
+            reference = vectors
+        # Độ lệch so với vector của chế độ đầu tiên trên toàn bộ câu hỏi
+        cosine = (reference * vectors).sum(axis=1) / (
+            np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1) + 1e-12
+        )
+        report["modes"][mode] = {
+            "backend": embedder.backend,
+            "precision": embedder.precision,
+            "min_cosine": float(cosine.min()),
+            "batch_sizes": {
+                str(size): measure_latency(embedder, questions, size, args.repeats) for size in batch_sizes
+            },
+        }
+
+    print(f"{'Chế độ':<12} {'Lô':>4} {'ms/lô p50':>10} {'ms/lô p95':>10} {'ms/câu':>8} {'Cosine':>9}")
+    for mode, row in report["modes"].items():
+        for size, latency in row["batch_sizes"].items():
+            print(f"{mode:<12} {size:>4} {latency['batch_ms']['p50']:>10.2f} {latency['batch_ms']['p95']:>10.2f} "
+                  f"{latency['per_query_ms']:>8.2f} {row['min_cosine']:>9.5f}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, ensure_ascii=False, indent=2)
+    print(f"Đã lưu báo cáo tại: {args.output}")
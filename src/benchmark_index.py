@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import argparse
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+from index_factory import build_faiss_index, set_search_params
+
+# Tải biến môi trường từ file .env
+load_dotenv()
+
+# Định nghĩa các hằng số
+DATA_DIR = os.getenv("DATA_DIR", "data")
+FLAT_INDEX_PATH = os.path.join(DATA_DIR, "faiss_index.bin")
+TEST_DATA_PATH = os.path.join(DATA_DIR, "questions.json")
+REPORT_PATH = "logs/index_benchmark.json"
+
+# Các cấu hình chỉ mục và tham số tìm kiếm được so sánh với IndexFlatL2
+BENCHMARK_GRID = [
+    ("ivf_flat", {}, [("nprobe", v) for v in (1, 2, 4, 8, 16, 32)]),
+    ("hnsw", {"hnsw_m": 32}, [("ef_search", v) for v in (16, 32, 64, 128, 256)]),
+    ("ivf_pq", {"pq_m": 64}, [("nprobe", v) for v in (1, 4, 8, 16, 32)]),
+]
+
+
+def load_corpus_vectors(index_path: str) -> np.ndarray:
+    """
+    Lấy lại toàn bộ vector từ chỉ mục phẳng đã lưu.
+    """
+    index = faiss.read_index(index_path)
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def load_query_vectors(corpus: np.ndarray, embedding_model: str, num_queries: int) -> np.ndarray:
+    """
+    Nhúng các câu hỏi trong questions.json, hoặc lấy mẫu vector từ kho dữ liệu (có nhiễu)
+    nếu không chỉ định mô hình nhúng.
+    """
+    if embedding_model:
+        from embedding import Embedding
+        with open(TEST_DATA_PATH, "r", encoding="utf-8") as file:
+            questions = [item["question"] for item in json.load(file)]
+        embedder = Embedding(model_name=embedding_model)
+        return np.array(embedder.embedding(questions)).astype('float32')
+
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(corpus), size=num_queries)
+    noise = rng.normal(scale=corpus.std() * 0.1, size=(num_queries, corpus.shape[1]))
+    return (corpus[rows] + noise).astype('float32')
+
+
+def scale_corpus(corpus: np.ndarray, scale: int) -> np.ndarray:
+    """
+    Nhân bản kho vector (có nhiễu) để mô phỏng kho dữ liệu lớn hơn.
+    """
+    if scale <= 1:
+        return corpus
+    rng = np.random.default_rng(1)
+    copies = [corpus] + [
+        corpus + rng.normal(scale=corpus.std() * 0.05, size=corpus.shape)
+        for _ in range(scale - 1)
+    ]
+    return np.vstack(copies).astype('float32')
+
+
+def measure(index, queries: np.ndarray, ground_truth: np.ndarray, top_k: int) -> dict:
+    """
+    Đo recall@k so với IndexFlatL2 và độ trễ tìm kiếm (từng câu và theo lô).
+    """
+    start = time.perf_counter()
+    for row in range(len(queries)):
+        index.search(queries[row:row + 1], top_k)
+    single_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    _, indices = index.search(queries, top_k)
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    hits = sum(len(set(found) & set(expected)) for found, expected in zip(indices, ground_truth))
+    return {
+        "recall_at_k": hits / ground_truth.size,
+        "latency_ms_per_query": single_ms,
+        "batch_latency_ms": batch_ms,
+    }
+
+
+def run_benchmark(corpus: np.ndarray, queries: np.ndarray, top_k: int) -> list:
+    """
+    Chạy toàn bộ lưới cấu hình và trả về danh sách kết quả.
+    """
+    flat_index, _ = build_faiss_index(corpus, "flat")
+    _, ground_truth = flat_index.search(queries, top_k)
+    results = [dict(index_type="flat", param=None, value=None, **measure(flat_index, queries, ground_truth, top_k))]
+
+    for index_type, build_params, search_grid in BENCHMARK_GRID:
+        try:
+            start = time.perf_counter()
+            index, _ = build_faiss_index(corpus, index_type, **build_params)
+            build_seconds = time.perf_counter() - start
+        except (ValueError, RuntimeError) as e:
+            print(f"Bỏ qua {index_type}: {e}")
+            continue
+
+        for param, value in search_grid:
+            set_search_params(index, **{param: value})
+            row = measure(index, queries, ground_truth, top_k)
+            results.append(dict(index_type=index_type, param=param, value=value, build_seconds=build_seconds, **row))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="So sánh recall và độ trễ của các loại chỉ mục FAISS với IndexFlatL2.")
+    parser.add_argument("--index", default=FLAT_INDEX_PATH, help="Chỉ mục phẳng chứa vector kho dữ liệu.")
+    parser.add_argument("--embedding-model", default=os.getenv("MODEL_EMBEDDING"), help="Mô hình nhúng câu hỏi (bỏ trống để lấy mẫu từ kho).")
+    parser.add_argument("--num-queries", type=int, default=200, help="Số truy vấn mẫu khi không dùng mô hình nhúng.")
+    parser.add_argument("--scale", type=int, default=1, help="Hệ số nhân bản kho vector.")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--output", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    corpus = scale_corpus(load_corpus_vectors(args.index), args.scale)
+    queries = load_query_vectors(corpus, args.embedding_model, args.num_queries)
+    results = run_benchmark(corpus, queries, args.top_k)
+
+    print(f"Kho: {len(corpus)} vector, {len(queries)} truy vấn, top_k={args.top_k}")
+    print(f"{'Chỉ mục':<10} {'Tham số':<15} {'Recall@k':>10} {'ms/truy vấn':>12} {'ms/lô':>10}")
+    print("-" * 62)
+    for row in results:
+        param = f"{row['param']}={row['value']}" if row["param"] else "-"
+        print(f"{row['index_type']:<10} {param:<15} {row['recall_at_k']:>10.3f} "
+              f"{row['latency_ms_per_query']:>12.3f} {row['batch_latency_ms']:>10.2f}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as report_file:
+        json.dump({"num_vectors": len(corpus), "top_k": args.top_k, "results": results}, report_file, indent=2)
+    print(f"Đã lưu báo cáo tại: {args.output}")
@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
+from dotenv import load_dotenv
+
+# Tải biến môi trường từ file .env
+load_dotenv()
+
+# Định nghĩa các hằng số
+EMBEDDING_MODEL = os.getenv("MODEL_EMBEDDING")
+LLM_MODEL = "meta-llama/Llama-3.2-1B-Instruct"
+DATA_DIR = os.getenv("DATA_DIR", "data")
+CORPUS_PATH = os.path.join(DATA_DIR, "data.txt")
+TEST_DATA_PATH = os.path.join(DATA_DIR, "questions.json")
+REPORT_PATH = "logs/pipeline_benchmark.json"
+STAGES = ("embed", "search", "prompt_build", "tokenize", "prefill", "decode", "post_process")
+
+
+class TokenClock(StoppingCriteria):
+    def __init__(self, eos_token_ids=None, stop_criteria=None):
+        """
+        Ghi lại thời điểm sinh xong mỗi bước token (không bao giờ dừng sinh) và số token thật
+        của từng chuỗi.
+
+        Lần gọi đầu tiên xảy ra ngay sau bước prefill (token đầu tiên), các lần sau là các bước decode.
+        Một chuỗi ngừng được đếm sau khi sinh EOS hoặc khi stop_criteria (điều kiện dừng ở câu đầu
+        tiên, được gọi trước TokenClock) đánh dấu đã xong; các bước sau đó chỉ là phần đệm.
+
+        Args:
+            eos_token_ids: Token EOS (int hoặc danh sách).
+            stop_criteria (FirstSentenceStoppingCriteria, optional): Điều kiện dừng theo từng chuỗi.
+        """
+        if isinstance(eos_token_ids, int):
+            eos_token_ids = [eos_token_ids]
+        self.eos_token_ids = torch.tensor(list(eos_token_ids or []), dtype=torch.long)
+        self.stop_criteria = stop_criteria
+        self.times = []
+        self.tokens = None
+        self._finished = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        self.times.append(time.perf_counter())
+        if self.tokens is None:
+            self.tokens = torch.zeros(input_ids.shape[0], dtype=torch.long)
+            self._finished = torch.zeros(input_ids.shape[0], dtype=torch.bool)
+        # Token của bước này là token thật với các chuỗi chưa kết thúc ở bước trước
+        self.tokens += ~self._finished
+        self._finished |= torch.isin(input_ids[:, -1].cpu(), self.eos_token_ids)
+        if self.stop_criteria is not None and self.stop_criteria.finished is not None:
+            self._finished |= self.stop_criteria.finished.cpu()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+    def decode_tokens(self) -> int:
+        """
+        Tổng số token thật sinh ở các bước decode (không tính token đầu tiên của mỗi chuỗi).
+        """
+        return 0 if self.tokens is None else int((self.tokens - 1).clamp(min=0).sum())
+
+
+def build_standin_models(corpus_text: str, directory: str) -> tuple:
+    """
+    Tạo mô hình thay thế nhỏ (khởi tạo ngẫu nhiên) để chạy benchmark không cần mạng:
+    tokenizer BPE huấn luyện trên kho dữ liệu, một Llama 2 tầng và một bi-encoder BERT 1 tầng.
+
+    Returns:
+        tuple: (thư mục LLM, thư mục mô hình nhúng).
+    """
+    from tokenizers import Tokenizer, models, trainers, pre_tokenizers, decoders
+    from transformers import BertConfig, BertModel, LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+    from sentence_transformers import SentenceTransformer, models as st_models
+
+    bpe = Tokenizer(models.BPE(unk_token="[UNK]"))
+    bpe.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    bpe.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=2000,
+        special_tokens=["[UNK]", "[PAD]", "[BOS]", "[EOS]", "[CLS]", "[SEP]", "[MASK]"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()
+    )
+    bpe.train_from_iterator(corpus_text.splitlines(), trainer)
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=bpe, unk_token="[UNK]", pad_token="[PAD]", bos_token="[BOS]", eos_token="[EOS]",
+        cls_token="[CLS]", sep_token="[SEP]", mask_token="[MASK]"
+    )
+
+    torch.manual_seed(0)
+    llm_dir = os.path.join(directory, "llm")
+    tokenizer.save_pretrained(llm_dir)
+    LlamaForCausalLM(LlamaConfig(
+        vocab_size=len(tokenizer), hidden_size=128, intermediate_size=256, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=4096,
+        bos_token_id=tokenizer.bos_token_id, eos_token_id=tokenizer.eos_token_id, pad_token_id=tokenizer.pad_token_id
+    )).save_pretrained(llm_dir)
+
+    encoder_dir = os.path.join(directory, "encoder")
+    tokenizer.save_pretrained(encoder_dir)
+    BertModel(BertConfig(
+        vocab_size=len(tokenizer), hidden_size=64, num_hidden_layers=1, num_attention_heads=2,
+        intermediate_size=128, max_position_embeddings=1024, pad_token_id=tokenizer.pad_token_id
+    )).save_pretrained(encoder_dir)
+    embedding_dir = os.path.join(directory, "embedding")
+    transformer = st_models.Transformer(encoder_dir, max_seq_length=512)
+    SentenceTransformer(modules=[transformer, st_models.Pooling(64)]).save(embedding_dir)
+    return llm_dir, embedding_dir
+
+
+def build_corpus_store(corpus_text: str, embedding_model: str, directory: str, scale: int, chunk_size: int) -> int:
+    """
+    Chia đoạn kho dữ liệu (nhân bản scale lần), tạo chỉ mục FAISS, BM25 và kho đoạn trong thư mục tạm.
+
+    Returns:
+        int: Số đoạn trong kho.
+    """
+    from embedding import Embedding
+    from data_processor import split_documents, chunk_documents
+    from index_factory import build_faiss_index, save_index
+    from chunk_store import write_chunk_store
+    from bm25_index import build_bm25_index
+
+    documents = split_documents(corpus_text)
+    # Các bản sao được đánh số để không bị loại như tài liệu trùng lặp
+    documents = documents + [f"{document} (bản sao {copy})" for copy in range(1, scale) for document in documents]
+    embedder = Embedding(model_name=embedding_model, chunk_size=chunk_size)
+    chunks, metadatas, _ = chunk_documents(embedder, documents, 0)
+    embeddings = np.array(embedder.embedding(chunks)).astype('float32')
+    index, config = build_faiss_index(embeddings, "flat", ids=np.arange(len(chunks)))
+    save_index(index, os.path.join(directory, "faiss_index.bin"), config)
+    write_chunk_store(os.path.join(directory, "chunks"), chunks, metadatas)
+    build_bm25_index(os.path.join(directory, "bm25"), chunks)
+    return len(chunks)
+
+
+def summarize(values: list) -> dict:
+    """
+    Tổng, trung bình, p50 và p95 (ms) của danh sách thời gian (giây).
+    """
+    values = np.array(values) * 1000 if values else np.zeros(1)
+    return {
+        "total_ms": float(values.sum()),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+    }
+
+
+def run_pipeline(llm, rag, questions: list, batch_size: int, max_length: int, top_k: int) -> tuple:
+    """
+    Chạy toàn bộ pipeline theo lô (giống LLMGenerator.generate_batch) và đo thời gian từng bước.
+
+    Returns:
+        tuple: (danh sách câu trả lời, dict bước -> danh sách thời gian mỗi lô, số token thật
+            sinh ở các bước decode).
+    """
+    timings = {stage: [] for stage in STAGES}
+    answers = []
+    decode_tokens = 0
+    for start in range(0, len(questions), batch_size):
+        batch = questions[start:start + batch_size]
+
+        began = time.perf_counter()
+        query_embeddings = rag.embed_queries(batch)
+        timings["embed"].append(time.perf_counter() - began)
+
+        began = time.perf_counter()
+        _, indices = rag.retrieve_batch(batch, top_k, query_embeddings=query_embeddings)
+        timings["search"].append(time.perf_counter() - began)
+
+        began = time.perf_counter()
+        prompts = [rag.build_prompt(query, row) for query, row in zip(batch, indices)]
+        timings["prompt_build"].append(time.perf_counter() - began)
+
+        began = time.perf_counter()
+        model_inputs = llm.tokenizer(prompts, padding=True, return_tensors="pt")
+        timings["tokenize"].append(time.perf_counter() - began)
+
+        stopping_criteria = llm._stopping_criteria(model_inputs["input_ids"].shape[1]) or StoppingCriteriaList()
+        clock = TokenClock(llm.model.generation_config.eos_token_id, stopping_criteria[0] if stopping_criteria else None)
+        stopping_criteria.append(clock)
+        began = time.perf_counter()
+        with torch.inference_mode():
+            output = llm.model.generate(
+                **model_inputs,
+                max_new_tokens=max_length,
+                pad_token_id=llm.tokenizer.pad_token_id,
+                stopping_criteria=stopping_criteria
+            )
+        finished = time.perf_counter()
+        first_token = clock.times[0] if clock.times else finished
+        timings["prefill"].append(first_token - began)
+        timings["decode"].append(finished - first_token)
+        decode_tokens += clock.decode_tokens()
+
+        began = time.perf_counter()
+        generated_answers = llm.tokenizer.batch_decode(output, skip_special_tokens=True)
+        answers.extend(llm._extract_answer(generated_answer) for generated_answer in generated_answers)
+        timings["post_process"].append(time.perf_counter() - began)
+    return answers, timings, decode_tokens
+
+
+def git_commit() -> str:
+    """
+    Commit hiện tại của repo (để so sánh kết quả giữa các commit), None nếu không xác định được.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Đo thời gian từng bước, thông lượng, bộ nhớ và độ chính xác của pipeline RAG.")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--questions", default=TEST_DATA_PATH)
+    parser.add_argument("--scale", type=int, default=1, help="Nhân bản kho dữ liệu và bộ câu hỏi scale lần.")
+    parser.add_argument("--llm-model", default=LLM_MODEL)
+    parser.add_argument("--embedding-model", default=EMBEDDING_MODEL)
+    parser.add_argument("--standin", action="store_true", help="Dùng mô hình thay thế nhỏ tạo tại chỗ (chạy offline).")
+    parser.add_argument("--retrieval-mode", default="dense", choices=("dense", "sparse", "hybrid"))
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-length", type=int, default=128)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--output", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    from rag_system import RagSystem
+    from llm_generator import LLMGenerator
+    from evaluate import compute_accuracy
+    from benchmark_cpu import peak_rss_mb
+
+    with open(args.corpus, "r", encoding="utf-8") as corpus_file:
+        corpus_text = corpus_file.read()
+    with open(args.questions, "r", encoding="utf-8") as questions_file:
+        data = json.load(questions_file) * args.scale
+    questions = [item["question"] for item in data]
+    references = [item["reference_answer"] for item in data]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        llm_model, embedding_model = args.llm_model, args.embedding_model
+        if args.standin:
+            llm_model, embedding_model = build_standin_models(corpus_text, work_dir)
+
+        start = time.perf_counter()
+        num_chunks = build_corpus_store(corpus_text, embedding_model, work_dir, args.scale, args.chunk_size)
+        index_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rag = RagSystem(
+            model_name=embedding_model,
+            chunk_size=args.chunk_size,
+            index_path=os.path.join(work_dir, "faiss_index.bin"),
+            chunk_store_path=os.path.join(work_dir, "chunks"),
+            bm25_path=os.path.join(work_dir, "bm25"),
+            retrieval_mode=args.retrieval_mode
+        )
+        llm = LLMGenerator(model_name=llm_model, embedding_model=embedding_model, rag_system=rag, device="cpu")
+        load_seconds = time.perf_counter() - start
+
+        # Chạy thử một lô nhỏ để khởi động mô hình
+        run_pipeline(llm, rag, questions[:1], 1, 4, args.top_k)
+
+        start = time.perf_counter()
+        answers, timings, decode_tokens = run_pipeline(
+            llm, rag, questions, args.batch_size, args.max_length, args.top_k
+        )
+        seconds = time.perf_counter() - start
+
+    accuracy, correct, total = compute_accuracy(references, answers)
+    report = {
+        "commit": git_commit(),
+        "config": dict(vars(args), llm_model=llm_model, embedding_model=embedding_model),
+        "num_chunks": num_chunks,
+        "num_questions": len(questions),
+        "index_seconds": index_seconds,
+        "load_seconds": load_seconds,
+        "seconds": seconds,
+        "questions_per_second": len(questions) / seconds,
+        "decode_tokens_per_second": decode_tokens / (sum(timings["decode"]) or 1.0),
+        "peak_rss_mb": peak_rss_mb(),
+        "accuracy": accuracy,
+        "correct": correct,
+        "total": total,
+        "stages": {stage: summarize(values) for stage, values in timings.items()},
+    }
+
+    print(f"{'Bước':<14} {'Tổng (ms)':>10} {'TB/lô (ms)':>11} {'p95 (ms)':>9}")
+    for stage, summary in report["stages"].items():
+        print(f"{stage:<14} {summary['total_ms']:>10.1f} {summary['mean_ms']:>11.2f} {summary['p95_ms']:>9.2f}")
+    print(f"Thông lượng: {report['questions_per_second']:.2f} câu/s, decode: {report['decode_tokens_per_second']:.1f} token/s, "
+          f"độ chính xác: {accuracy:.2f}% ({correct}/{total})")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2, ensure_ascii=False)
+    print(f"Đã lưu báo cáo tại: {args.output}")
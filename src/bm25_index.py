@@ -0,0 +1,198 @@
+import os
+import re
+import json
+import unicodedata
+import numpy as np
+
+
+def _index_paths(path_prefix: str) -> dict:
+    return {
+        "config": path_prefix + ".json",
+        "vocab": path_prefix + ".vocab.txt",
+        "indptr": path_prefix + ".indptr.npy",
+        "doc_ids": path_prefix + ".doc_ids.npy",
+        "weights": path_prefix + ".weights.npy",
+    }
+
+
+def tokenize(text: str) -> list:
+    """
+    Tách văn bản tiếng Việt thành âm tiết (chữ thường, chuẩn hóa NFC) và cặp âm tiết liền kề.
+
+    Từ tiếng Việt thường gồm nhiều âm tiết ("đại học", "quốc gia") nên cặp âm tiết giúp
+    khớp cụm từ chính xác hơn; số và mã (1993, INT3117) được giữ nguyên là một token.
+
+    Args:
+        text (str): Văn bản đầu vào.
+
+    Returns:
+        list: Danh sách token.
+    """
+    syllables = re.findall(r'\w+', unicodedata.normalize("NFC", text).lower())
+    return syllables + [f"{first}_{second}" for first, second in zip(syllables, syllables[1:])]
+
+
+def build_bm25_index(path_prefix: str, chunks: list, k1: float = 1.5, b: float = 0.75) -> dict:
+    """
+    Xây dựng chỉ mục ngược BM25 cho các đoạn và lưu xuống đĩa.
+
+    Danh sách posting được lưu dạng CSR: indptr (vị trí bắt đầu của từng term), doc_ids
+    (ID đoạn, int32) và weights (điểm BM25 đã tính sẵn của term trong đoạn, float32).
+    ID đoạn trùng với ID trong chỉ mục FAISS và kho đoạn; đoạn None (đã xóa) bị bỏ qua.
+
+    Args:
+        path_prefix (str): Tiền tố đường dẫn của các file chỉ mục.
+        chunks (list): Danh sách nội dung đoạn theo ID.
+        k1 (float): Tham số bão hòa tần suất term.
+        b (float): Tham số chuẩn hóa theo độ dài đoạn.
+
+    Returns:
+        dict: Cấu hình chỉ mục (số đoạn, số term, độ dài trung bình, k1, b).
+    """
+    vocabulary = {}
+    term_ids, doc_ids, term_freqs = [], [], []
+    doc_lengths = np.zeros(len(chunks), dtype='float32')
+    for doc_id, chunk in enumerate(chunks):
+        if chunk is None:
+            continue
+        tokens = tokenize(chunk)
+        doc_lengths[doc_id] = len(tokens)
+        ids = np.array([vocabulary.setdefault(token, len(vocabulary)) for token in tokens], dtype='int64')
+        unique_ids, counts = np.unique(ids, return_counts=True)
+        term_ids.append(unique_ids)
+        term_freqs.append(counts)
+        doc_ids.append(np.full(len(unique_ids), doc_id, dtype='int32'))
+
+    term_ids = np.concatenate(term_ids) if term_ids else np.zeros(0, dtype='int64')
+    doc_ids = np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype='int32')
+    term_freqs = np.concatenate(term_freqs).astype('float32') if term_freqs else np.zeros(0, dtype='float32')
+
+    # Sắp xếp posting theo term (ổn định để doc_ids trong mỗi term vẫn tăng dần)
+    order = np.argsort(term_ids, kind="stable")
+    term_ids, doc_ids, term_freqs = term_ids[order], doc_ids[order], term_freqs[order]
+    indptr = np.zeros(len(vocabulary) + 1, dtype='int64')
+    np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=indptr[1:])
+
+    # Tính sẵn điểm BM25 của từng posting để truy vấn chỉ còn phép cộng
+    num_docs = int((doc_lengths > 0).sum())
+    avg_length = float(doc_lengths.sum() / num_docs) if num_docs else 0.0
+    document_freqs = np.diff(indptr)
+    idf = np.log(1 + (num_docs - document_freqs + 0.5) / (document_freqs + 0.5))
+    length_norm = k1 * (1 - b + b * doc_lengths[doc_ids] / (avg_length or 1.0))
+    weights = (np.repeat(idf, document_freqs) * term_freqs * (k1 + 1) / (term_freqs + length_norm)).astype('float32')
+
+    paths = _index_paths(path_prefix)
+    os.makedirs(os.path.dirname(path_prefix) or ".", exist_ok=True)
+    terms = sorted(vocabulary, key=vocabulary.get)
+    with open(paths["vocab"], "w", encoding="utf-8") as vocab_file:
+        vocab_file.write("\n".join(terms))
+    np.save(paths["indptr"], indptr)
+    np.save(paths["doc_ids"], doc_ids)
+    np.save(paths["weights"], weights)
+    config = {"num_ids": len(chunks), "num_docs": num_docs, "num_terms": len(terms),
+              "avg_length": avg_length, "k1": k1, "b": b}
+    with open(paths["config"], "w", encoding="utf-8") as config_file:
+        json.dump(config, config_file)
+    return config
+
+
+def replace_bm25_index(source_prefix: str, path_prefix: str) -> None:
+    """
+    Thay chỉ mục BM25 tại path_prefix bằng chỉ mục đã tạo xong tại source_prefix (đổi tên từng file).
+    """
+    source_paths = _index_paths(source_prefix)
+    for key, path in _index_paths(path_prefix).items():
+        os.replace(source_paths[key], path)
+
+
+class BM25Index:
+    def __init__(self, path_prefix: str = "data/bm25"):
+        """
+        Chỉ mục BM25 chỉ đọc; các mảng posting được mở bằng mmap.
+
+        Args:
+            path_prefix (str): Tiền tố đường dẫn của các file chỉ mục.
+        """
+        paths = _index_paths(path_prefix)
+        with open(paths["config"], "r", encoding="utf-8") as config_file:
+            self.config = json.load(config_file)
+        with open(paths["vocab"], "r", encoding="utf-8") as vocab_file:
+            terms = vocab_file.read().split("\n") if self.config["num_terms"] else []
+        self.vocabulary = {term: term_id for term_id, term in enumerate(terms)}
+        self.indptr = np.load(paths["indptr"], mmap_mode="r")
+        self.doc_ids = np.load(paths["doc_ids"], mmap_mode="r")
+        self.weights = np.load(paths["weights"], mmap_mode="r")
+
+    @staticmethod
+    def exists(path_prefix: str = "data/bm25") -> bool:
+        """
+        Kiểm tra chỉ mục BM25 đã được tạo hay chưa.
+        """
+        return all(os.path.exists(path) for path in _index_paths(path_prefix).values())
+
+    def scores(self, query: str) -> np.ndarray:
+        """
+        Tính điểm BM25 của câu truy vấn với toàn bộ đoạn (mảng theo ID đoạn).
+        """
+        term_ids = {self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary}
+        if not term_ids:
+            return np.zeros(self.config["num_ids"], dtype='float32')
+        slices = [slice(self.indptr[term_id], self.indptr[term_id + 1]) for term_id in term_ids]
+        doc_ids = np.concatenate([self.doc_ids[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        return np.bincount(doc_ids, weights=weights, minlength=self.config["num_ids"]).astype('float32')
+
+    def search(self, queries: list, top_k: int = 3, allowed: np.ndarray = None) -> tuple:
+        """
+        Tìm top_k đoạn có điểm BM25 cao nhất cho từng câu truy vấn.
+
+        Args:
+            queries (list): Danh sách câu truy vấn.
+            top_k (int): Số đoạn lấy ra cho mỗi câu.
+            allowed (np.ndarray, optional): Mask bool theo ID đoạn; chỉ các đoạn True được xét.
+
+        Returns:
+            tuple: (scores, indices) dạng ma trận kích thước (số câu, top_k), giống
+                faiss_index.search; vị trí không có kết quả có ID -1.
+        """
+        all_scores = np.zeros((len(queries), top_k), dtype='float32')
+        all_indices = np.full((len(queries), top_k), -1, dtype='int64')
+        for row, query in enumerate(queries):
+            scores = self.scores(query)
+            if allowed is not None:
+                scores *= allowed
+            matched = np.flatnonzero(scores)
+            if len(matched) > top_k:
+                matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+            matched = matched[np.argsort(-scores[matched], kind="stable")]
+            all_scores[row, :len(matched)] = scores[matched]
+            all_indices[row, :len(matched)] = matched
+        return all_scores, all_indices
+
+
+def reciprocal_rank_fusion(rankings: list, top_k: int = 3, k: int = 60) -> tuple:
+    """
+    Kết hợp nhiều danh sách xếp hạng bằng Reciprocal Rank Fusion: điểm = tổng 1 / (k + hạng).
+
+    Args:
+        rankings (list): Các ma trận ID kích thước (số câu, độ sâu), -1 = không có kết quả.
+        top_k (int): Số kết quả sau khi kết hợp.
+        k (int): Hằng số làm mượt của RRF.
+
+    Returns:
+        tuple: (scores, indices) dạng ma trận kích thước (số câu, top_k).
+    """
+    num_queries = len(rankings[0])
+    fused_scores = np.zeros((num_queries, top_k), dtype='float32')
+    fused_indices = np.full((num_queries, top_k), -1, dtype='int64')
+    for row in range(num_queries):
+        scores = {}
+        for ranking in rankings:
+            for rank, doc_id in enumerate(ranking[row]):
+                if doc_id >= 0:
+                    scores[int(doc_id)] = scores.get(int(doc_id), 0.0) + 1.0 / (k + rank + 1)
+        best = sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+        for column, (doc_id, score) in enumerate(best):
+            fused_scores[row, column] = score
+            fused_indices[row, column] = doc_id
+    return fused_scores, fused_indices
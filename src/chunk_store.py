@@ -0,0 +1,216 @@
+import os
+import mmap
+import json
+import pickle
+import numpy as np
+
+
+def _store_paths(path_prefix: str) -> dict:
+    return {
+        "text": path_prefix + ".bin",
+        "text_spans": path_prefix + ".spans.npy",
+        "meta": path_prefix + ".meta.bin",
+        "meta_spans": path_prefix + ".meta_spans.npy",
+    }
+
+
+def _open_blob(path: str):
+    # mmap không hỗ trợ file rỗng
+    if os.path.getsize(path) == 0:
+        return None, b""
+    blob_file = open(path, "rb")
+    return blob_file, mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _save_spans(path: str, spans: np.ndarray) -> None:
+    # Ghi ra file tạm rồi thay thế để người đọc không thấy file ghi dở
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as spans_file:
+        np.save(spans_file, np.asarray(spans, dtype='int64').reshape(-1, 2))
+    os.replace(temp_path, path)
+
+
+def _encode(items: list, start: int) -> tuple:
+    # Nối các chuỗi UTF-8 và tính vị trí [start, end) của từng phần tử trong blob
+    encoded = [item.encode("utf-8") for item in items]
+    lengths = np.array([len(item) for item in encoded], dtype='int64')
+    ends = start + np.cumsum(lengths)
+    return b"".join(encoded), np.stack([ends - lengths, ends], axis=1)
+
+
+class ChunkStore:
+    def __init__(self, path_prefix: str = "data/chunks"):
+        """
+        Kho đoạn văn bản chỉ đọc, mở bằng mmap và giải mã từng đoạn khi cần.
+
+        Định dạng: một blob UTF-8 nối liền các đoạn (chunks.bin) cùng mảng vị trí
+        [start, end) kiểu int64 (chunks.spans.npy); metadata JSON của từng đoạn được
+        lưu tương tự (chunks.meta.bin, chunks.meta_spans.npy). Đoạn đã xóa có start == end.
+        Thời gian mở không phụ thuộc kích thước kho và các tiến trình dùng chung trang
+        nhớ qua page cache của hệ điều hành.
+
+        Args:
+            path_prefix (str): Tiền tố đường dẫn của các file kho đoạn.
+        """
+        paths = _store_paths(path_prefix)
+        self.path_prefix = path_prefix
+        self.text_spans = np.load(paths["text_spans"], mmap_mode="r")
+        self.meta_spans = np.load(paths["meta_spans"], mmap_mode="r")
+        self._text_file, self._text_blob = _open_blob(paths["text"])
+        self._meta_file, self._meta_blob = _open_blob(paths["meta"])
+
+    @staticmethod
+    def exists(path_prefix: str = "data/chunks") -> bool:
+        """
+        Kiểm tra kho đoạn đã được tạo hay chưa.
+        """
+        return all(os.path.exists(path) for path in _store_paths(path_prefix).values())
+
+    def __len__(self) -> int:
+        return len(self.text_spans)
+
+    def __getitem__(self, chunk_id) -> str:
+        """
+        Trả về nội dung đoạn theo ID (None nếu đoạn đã bị xóa).
+        """
+        start, end = self.text_spans[int(chunk_id)]
+        if start == end:
+            return None
+        return self._text_blob[start:end].decode("utf-8")
+
+    def metadata(self, chunk_id) -> dict:
+        """
+        Trả về metadata của đoạn theo ID (dict rỗng nếu không có).
+        """
+        start, end = self.meta_spans[int(chunk_id)]
+        if start == end:
+            return {}
+        return json.loads(self._meta_blob[start:end].decode("utf-8"))
+
+    def close(self) -> None:
+        for blob_file, blob in ((self._text_file, self._text_blob), (self._meta_file, self._meta_blob)):
+            if blob_file is not None:
+                blob.close()
+                blob_file.close()
+
+
+def write_chunk_store(path_prefix: str, chunks: list, metadatas: list = None) -> None:
+    """
+    Tạo mới kho đoạn từ danh sách đoạn (None = đoạn đã xóa) và metadata tương ứng.
+
+    Args:
+        path_prefix (str): Tiền tố đường dẫn của các file kho đoạn.
+        chunks (list): Danh sách nội dung đoạn theo ID.
+        metadatas (list, optional): Danh sách dict metadata theo ID.
+    """
+    paths = _store_paths(path_prefix)
+    os.makedirs(os.path.dirname(path_prefix) or ".", exist_ok=True)
+    for path in (paths["text"], paths["meta"]):
+        open(path, "wb").close()
+    _save_spans(paths["text_spans"], np.zeros((0, 2), dtype='int64'))
+    _save_spans(paths["meta_spans"], np.zeros((0, 2), dtype='int64'))
+    append_chunks(path_prefix, chunks, metadatas)
+
+
+def append_chunks(path_prefix: str, chunks: list, metadatas: list = None) -> None:
+    """
+    Thêm đoạn vào cuối kho (ID mới nối tiếp ID cuối cùng).
+
+    Args:
+        path_prefix (str): Tiền tố đường dẫn của các file kho đoạn.
+        chunks (list): Danh sách nội dung đoạn (None = ô trống).
+        metadatas (list, optional): Danh sách dict metadata tương ứng.
+    """
+    paths = _store_paths(path_prefix)
+    metadatas = metadatas or [None] * len(chunks)
+    texts = ["" if chunk is None else chunk for chunk in chunks]
+    metas = ["" if chunk is None or not meta else json.dumps(meta, ensure_ascii=False)
+             for chunk, meta in zip(chunks, metadatas)]
+
+    for blob_key, spans_key, items in (("text", "text_spans", texts), ("meta", "meta_spans", metas)):
+        old_spans = np.load(paths[spans_key])
+        blob, new_spans = _encode(items, os.path.getsize(paths[blob_key]))
+        with open(paths[blob_key], "ab") as blob_file:
+            blob_file.write(blob)
+        _save_spans(paths[spans_key], np.concatenate([old_spans, new_spans]))
+
+
+class ChunkStoreWriter:
+    def __init__(self, path_prefix: str = "data/chunks"):
+        """
+        Ghi kho đoạn mới theo từng lô: nội dung được ghi thẳng vào blob, chỉ mảng vị trí
+        (16 byte mỗi đoạn) được giữ trong bộ nhớ và lưu khi close().
+
+        Args:
+            path_prefix (str): Tiền tố đường dẫn của các file kho đoạn.
+        """
+        self.paths = _store_paths(path_prefix)
+        os.makedirs(os.path.dirname(path_prefix) or ".", exist_ok=True)
+        self._text_file = open(self.paths["text"], "wb")
+        self._meta_file = open(self.paths["meta"], "wb")
+        self._text_spans = []
+        self._meta_spans = []
+        self.count = 0
+
+    def add(self, chunks: list, metadatas: list = None) -> None:
+        """
+        Thêm một lô đoạn (ID nối tiếp các đoạn đã thêm).
+        """
+        metadatas = metadatas or [None] * len(chunks)
+        metas = [json.dumps(meta, ensure_ascii=False) if meta else "" for meta in metadatas]
+        for blob_file, spans, items in ((self._text_file, self._text_spans, chunks), (self._meta_file, self._meta_spans, metas)):
+            blob, new_spans = _encode(items, blob_file.tell())
+            blob_file.write(blob)
+            spans.append(new_spans)
+        self.count += len(chunks)
+
+    def close(self) -> None:
+        self._text_file.close()
+        self._meta_file.close()
+        for key, spans in (("text_spans", self._text_spans), ("meta_spans", self._meta_spans)):
+            _save_spans(self.paths[key], np.concatenate(spans) if spans else np.zeros((0, 2), dtype='int64'))
+
+
+def replace_chunk_store(source_prefix: str, path_prefix: str) -> None:
+    """
+    Thay kho đoạn tại path_prefix bằng kho đoạn đã ghi xong tại source_prefix (đổi tên từng file).
+
+    Tiến trình đang mmap kho cũ vẫn đọc được dữ liệu cũ cho tới khi mở lại.
+    """
+    source_paths = _store_paths(source_prefix)
+    for key, path in _store_paths(path_prefix).items():
+        os.replace(source_paths[key], path)
+
+
+def delete_chunks(path_prefix: str, chunk_ids: list) -> None:
+    """
+    Đánh dấu xóa các đoạn theo ID (ID của các đoạn khác không đổi).
+
+    Args:
+        path_prefix (str): Tiền tố đường dẫn của các file kho đoạn.
+        chunk_ids (list): Danh sách ID cần xóa.
+    """
+    paths = _store_paths(path_prefix)
+    ids = np.asarray(chunk_ids, dtype='int64')
+    for spans_key in ("text_spans", "meta_spans"):
+        spans = np.load(paths[spans_key])
+        spans[ids, 1] = spans[ids, 0]
+        _save_spans(paths[spans_key], spans)
+
+
+def convert_pickle(pickle_path: str = "data/chunks.pkl", path_prefix: str = "data/chunks") -> int:
+    """
+    Chuyển danh sách đoạn trong chunks.pkl sang định dạng kho đoạn mmap.
+
+    Returns:
+        int: Số đoạn đã chuyển.
+    """
+    with open(pickle_path, "rb") as chunk_file:
+        chunks = pickle.load(chunk_file)
+    write_chunk_store(path_prefix, chunks)
+    return len(chunks)
+
+
+if __name__ == "__main__":
+    num_chunks = convert_pickle()
+    print(f"Đã chuyển {num_chunks} chunks từ data/chunks.pkl sang data/chunks.bin")
@@ -0,0 +1,287 @@
+import os
+import sys
+import time
+import argparse
+
+# Chỉ dùng thư viện chuẩn ở đầu module; torch, transformers, sentence_transformers, faiss, ...
+# chỉ được import bên trong lệnh con cần đến để `--help` và các bước nhẹ khởi động nhanh
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ("torch", "transformers", "sentence_transformers", "faiss", "onnxruntime", "pandas", "bs4", "requests")
+
+# Các benchmark: tên lệnh -> (module, tham số đường dẫn -> file mặc định trong thư mục dữ liệu)
+BENCHMARKS = {
+    "cpu": ("benchmark_cpu", {"--questions": "questions.json"}),
+    "assisted": ("benchmark_assisted", {"--questions": "questions.json"}),
+    "embedding": ("benchmark_embedding", {"--questions": "questions.json"}),
+    "index": ("benchmark_index", {"--index": "faiss_index.bin"}),
+    "pipeline": ("benchmark_pipeline", {"--corpus": "data.txt", "--questions": "questions.json"}),
+    "chunker": ("benchmark_chunker", {"--input": "all_data.txt"}),
+}
+
+
+def data_path(args, value: str, file_name: str) -> str:
+    """
+    Đường dẫn do người dùng truyền vào, hoặc file_name trong thư mục dữ liệu (--data-dir).
+    """
+    return value or os.path.join(args.data_dir, file_name)
+
+
+def run_script(module_name: str, argv: list, defaults: dict = None) -> None:
+    """
+    Chạy phần __main__ của một script trong src/ với tham số argv (giữ nguyên argparse của script).
+
+    Các tham số đường dẫn trong defaults chưa có trong argv được thêm vào trước.
+    """
+    import runpy
+
+    prefix = []
+    for option, path in (defaults or {}).items():
+        if not any(arg == option or arg.startswith(option + "=") for arg in argv):
+            prefix += [option, path]
+    script_path = os.path.join(SRC_DIR, f"{module_name}.py")
+    sys.argv = [script_path] + prefix + argv
+    runpy.run_path(script_path, run_name="__main__")
+
+
+def command_crawl(args) -> None:
+    from crawl_data import crawl_urls_concurrent, read_source_urls
+
+    urls = read_source_urls(data_path(args, args.sources, "data_source.csv"))
+    crawl_urls_concurrent(
+        urls,
+        output_file=data_path(args, args.output, "all_data.txt"),
+        records_file=data_path(args, args.records, "crawled.jsonl"),
+        cache_dir=None if args.no_cache else data_path(args, args.cache_dir, "crawl_cache"),
+        max_workers=args.workers,
+        per_host=args.per_host
+    )
+
+
+def command_clean(args) -> None:
+    from processing_data import remove_extra_empty_lines
+
+    output_path = data_path(args, args.output, "data_clean.txt")
+    remove_extra_empty_lines(data_path(args, args.input, "all_data.txt"), output_path)
+    if args.dedup:
+        import json
+        from dedup import RECALL_TOP_K, dedup_file
+
+        dedup_output = data_path(args, args.dedup_output, "data_dedup.txt")
+        questions_path = data_path(args, None, "questions.json")
+        questions = None
+        if os.path.exists(questions_path):
+            with open(questions_path, "r", encoding="utf-8") as file:
+                questions = json.load(file)
+        stats = dedup_file(output_path, dedup_output, questions=questions)
+        print(f"Khử trùng lặp: {stats['pages']} -> {stats['pages_kept']} trang, "
+              f"{stats['words']} -> {stats['words_kept']} từ. Đã lưu kết quả tại: {dedup_output}")
+        if questions:
+            recall_key = f"recall@{RECALL_TOP_K}"
+            print(f"Câu trả lời còn trong dữ liệu: {stats['recall_before']['coverage']:.1%} -> "
+                  f"{stats['recall_after']['coverage']:.1%}, BM25 {recall_key}: "
+                  f"{stats['recall_before'][recall_key]:.1%} -> {stats['recall_after'][recall_key]:.1%}")
+
+
+def command_build_index(args) -> None:
+    if not args.embedding_model:
+        raise SystemExit("Chưa có mô hình nhúng: đặt MODEL_EMBEDDING trong .env hoặc dùng --embedding-model.")
+    from data_processor import process_and_store_data, process_and_store_data_parallel, update_store_incremental
+
+    input_path = data_path(args, args.input, "data.txt")
+    if args.incremental:
+        update_store_incremental(input_path, args.embedding_model, args.chunk_size, index_type=args.index_type)
+    elif args.parallel:
+        process_and_store_data_parallel(input_path, args.embedding_model, args.chunk_size, index_type=args.index_type)
+    else:
+        process_and_store_data(input_path, args.embedding_model, args.chunk_size, index_type=args.index_type)
+
+
+def command_query(args) -> None:
+    from rag_system import RagSystem
+
+    rag = RagSystem(
+        model_name=args.embedding_model,
+        embedding_cache_dir=os.getenv("EMBEDDING_CACHE_DIR"),
+        embedding_precision=os.getenv("CPU_PRECISION") or None,
+        embedding_backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+        retrieval_mode=args.retrieval_mode
+    )
+    filters = {"domain": args.domain} if args.domain else None
+
+    if args.generate:
+        from llm_generator import LLMGenerator
+
+        llm = LLMGenerator(
+            model_name=args.llm_model,
+            embedding_model=args.embedding_model,
+            rag_system=rag,
+            cpu_precision=os.getenv("CPU_PRECISION") or None,
+            prefix_cache_bytes=int(os.getenv("PREFIX_CACHE_BYTES", "0"))
+        )
+        prompts = rag.rag_query_batch(args.questions, args.top_k, filters=filters)
+        for question, result in zip(args.questions, llm.generate_batch(prompts, max_length=args.max_length, use_rag=False)):
+            print(f"\n--- {question} ---\n{result['rag_answer']}")
+        return
+
+    _, indices = rag.retrieve_batch(args.questions, args.top_k, filters=filters)
+    for question, row in zip(args.questions, indices):
+        print(f"\n--- {question} ---")
+        for rank, chunk_id in enumerate(idx for idx in row if idx >= 0):
+            source = rag.document_list.metadata(chunk_id).get("url", "") if rag.metadata_filter else ""
+            print(f"[{rank + 1}] #{chunk_id} {source}\n{rag.document_list[chunk_id]}")
+
+
+def command_run(args) -> None:
+    from run_rag import run_rag_process
+
+    run_rag_process(
+        batch_size=args.batch_size,
+        questions_path=data_path(args, args.questions, "questions.json"),
+        output_path=args.output
+    )
+
+
+def command_evaluate(args) -> None:
+    run_script("eval_runner", args.extra, {"--questions": os.path.join(args.data_dir, "questions.json")})
+
+
+def command_bench(args) -> None:
+    module_name, paths = BENCHMARKS[args.name]
+    run_script(module_name, args.extra, {option: os.path.join(args.data_dir, file_name) for option, file_name in paths.items()})
+
+
+def import_report(command: list, top: int = 15) -> dict:
+    """
+    Chạy một lệnh của CLI trong tiến trình con với `python -X importtime` và tổng hợp thời gian import.
+
+    Args:
+        command (list): Tham số của CLI (ví dụ ["--help"] hoặc ["clean", "--help"]).
+        top (int): Số module cấp cao nhất tốn thời gian import nhất được liệt kê.
+
+    Returns:
+        dict: Thời gian chạy (s), tổng thời gian import (ms), các module tốn nhất và các thư viện
+            nặng (HEAVY_MODULES) đã bị import.
+    """
+    import subprocess
+
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), *command],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    seconds = time.perf_counter() - start
+
+    top_level, packages = [], set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        packages.add(name.strip().split(".")[0])
+        # Module import trực tiếp (không lồng trong module khác) có đúng một dấu cách trước tên
+        if len(name) - len(name.lstrip()) == 1:
+            top_level.append((int(cumulative_us) / 1000, name.strip()))
+    top_level.sort(reverse=True)
+    return {
+        "command": command,
+        "returncode": completed.returncode,
+        "seconds": seconds,
+        "import_ms": sum(ms for ms, _ in top_level),
+        "top_modules": top_level[:top],
+        "heavy_modules": sorted(packages & set(HEAVY_MODULES)),
+    }
+
+
+def command_import_report(args) -> None:
+    report = import_report(args.extra or ["--help"], args.top)
+    print(f"Lệnh: cli.py {' '.join(report['command'])} (mã thoát {report['returncode']})")
+    print(f"Thời gian chạy: {report['seconds'] * 1000:.0f} ms, trong đó import: {report['import_ms']:.0f} ms")
+    print(f"{'ms':>9}  module")
+    for ms, name in report["top_modules"]:
+        print(f"{ms:>9.1f}  {name}")
+    print(f"Thư viện nặng đã import: {', '.join(report['heavy_modules']) or 'không có'}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="CLI của hệ thống RAG: crawl, làm sạch, tạo chỉ mục, truy vấn, chạy, đánh giá, benchmark.")
+    parser.add_argument("--data-dir", default=os.getenv("DATA_DIR", "data"),
+                        help="Thư mục dữ liệu (chỉ mục, kho đoạn, câu hỏi...); mặc định: DATA_DIR hoặc data.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    crawl = commands.add_parser("crawl", help="Crawl các URL nguồn thành all_data.txt và crawled.jsonl.")
+    crawl.add_argument("--sources", help="File CSV chứa URL nguồn (mặc định: <data-dir>/data_source.csv).")
+    crawl.add_argument("--output", help="File văn bản thô (mặc định: <data-dir>/all_data.txt).")
+    crawl.add_argument("--records", help="File JSON lines kèm URL và thời điểm crawl (mặc định: <data-dir>/crawled.jsonl).")
+    crawl.add_argument("--cache-dir", help="Thư mục cache trang (mặc định: <data-dir>/crawl_cache).")
+    crawl.add_argument("--no-cache", action="store_true", help="Không dùng cache trang.")
+    crawl.add_argument("--workers", type=int, default=8)
+    crawl.add_argument("--per-host", type=int, default=2)
+    crawl.set_defaults(handler=command_crawl)
+
+    clean = commands.add_parser("clean", help="Làm sạch all_data.txt thành data_clean.txt.")
+    clean.add_argument("--input", help="Mặc định: <data-dir>/all_data.txt.")
+    clean.add_argument("--output", help="Mặc định: <data-dir>/data_clean.txt.")
+    clean.add_argument("--dedup", action="store_true", help="Loại thêm boilerplate và trang/đoạn văn trùng lặp (dedup.py).")
+    clean.add_argument("--dedup-output", help="Mặc định: <data-dir>/data_dedup.txt.")
+    clean.set_defaults(handler=command_clean)
+
+    build_index = commands.add_parser("build-index", help="Chia đoạn, nhúng và tạo chỉ mục FAISS/BM25.")
+    build_index.add_argument("--input", help="Mặc định: <data-dir>/data.txt.")
+    build_index.add_argument("--embedding-model", default=os.getenv("MODEL_EMBEDDING"))
+    build_index.add_argument("--chunk-size", type=int, default=256)
+    build_index.add_argument("--index-type", default=os.getenv("INDEX_TYPE", "flat"), choices=("flat", "ivf_flat", "hnsw", "ivf_pq"))
+    mode = build_index.add_mutually_exclusive_group()
+    mode.add_argument("--incremental", action="store_true", help="Chỉ nhúng lại tài liệu mới/thay đổi.")
+    mode.add_argument("--parallel", action="store_true", help="Chia đoạn và nhúng bằng nhiều tiến trình theo shard.")
+    build_index.set_defaults(handler=command_build_index)
+
+    query = commands.add_parser("query", help="Truy xuất (hoặc trả lời với --generate) một hoặc nhiều câu hỏi.")
+    query.add_argument("questions", nargs="+")
+    query.add_argument("--embedding-model", default=os.getenv("MODEL_EMBEDDING"))
+    query.add_argument("--retrieval-mode", default=os.getenv("RETRIEVAL_MODE", "dense"), choices=("dense", "sparse", "hybrid"))
+    query.add_argument("--top-k", type=int, default=3)
+    query.add_argument("--domain", action="append", help="Chỉ truy xuất đoạn từ domain này (lặp lại để thêm domain).")
+    query.add_argument("--generate", action="store_true", help="Sinh câu trả lời bằng LLM.")
+    query.add_argument("--llm-model", default="meta-llama/Llama-3.2-1B-Instruct")
+    query.add_argument("--max-length", type=int, default=128)
+    query.set_defaults(handler=command_query)
+
+    run = commands.add_parser("run", help="Sinh câu trả lời cho bộ câu hỏi (run_rag.py).")
+    run.add_argument("--questions", help="Mặc định: <data-dir>/questions.json.")
+    run.add_argument("--output", default="system_output/system_output.txt")
+    run.add_argument("--batch-size", type=int, default=int(os.getenv("BATCH_SIZE", "8")))
+    run.set_defaults(handler=command_run)
+
+    # Các lệnh chuyển tiếp tham số còn lại (kể cả -h) cho argparse của script tương ứng
+    evaluate = commands.add_parser("evaluate", add_help=False, help="Đánh giá EM, F1, recall@k (eval_runner.py; `evaluate -h` để xem tham số).")
+    evaluate.set_defaults(handler=command_evaluate, forward=True)
+
+    bench = commands.add_parser("bench", add_help=False, help="Chạy benchmark (`bench <tên> -h` để xem tham số).")
+    bench.add_argument("name", choices=sorted(BENCHMARKS))
+    bench.set_defaults(handler=command_bench, forward=True)
+
+    report = commands.add_parser("import-report", add_help=False,
+                                 help="Đo thời gian import khi chạy một lệnh của CLI (mặc định: --help).")
+    report.add_argument("--top", type=int, default=15)
+    report.set_defaults(handler=command_import_report, forward=True)
+    return parser
+
+
+def main(argv: list = None) -> None:
+    from dotenv import load_dotenv
+
+    # Tải biến môi trường từ file .env trước khi đọc giá trị mặc định
+    load_dotenv()
+
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and not getattr(args, "forward", False):
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.extra = extra
+
+    # Các module dự án đọc DATA_DIR khi được import (sau bước này)
+    os.environ["DATA_DIR"] = args.data_dir
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
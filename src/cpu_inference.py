@@ -0,0 +1,74 @@
+import torch
+
+# Các chế độ suy luận trên CPU: fp32 (mặc định), bf16, int8 (dynamic quantization cho nn.Linear)
+CPU_PRECISIONS = ("fp32", "bf16", "int8")
+
+
+def configure_threads(num_threads: int = None, num_interop_threads: int = None) -> None:
+    """
+    Đặt số luồng intra-op/inter-op của PyTorch (None: giữ mặc định).
+
+    Số luồng inter-op chỉ đặt được trước khi PyTorch chạy phép tính song song đầu tiên,
+    nên hàm này cần được gọi trước khi tải mô hình.
+
+    Args:
+        num_threads (int, optional): Số luồng trong một phép tính (torch.set_num_threads).
+        num_interop_threads (int, optional): Số luồng chạy song song giữa các phép tính.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError as e:
+            print(f"Không thể đặt số luồng inter-op: {e}")
+
+
+def bf16_supported() -> bool:
+    """
+    Kiểm tra CPU có hỗ trợ phép tính bf16 (AVX512-BF16/AMX) qua oneDNN hay không.
+    """
+    try:
+        return bool(torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def optimize_for_cpu(model: torch.nn.Module, precision: str = "fp32") -> tuple:
+    """
+    Chuyển mô hình sang chế độ suy luận trên CPU với độ chính xác đã chọn.
+
+    Args:
+        model (torch.nn.Module): Mô hình (LLM hoặc SentenceTransformer) đã tải trên CPU.
+        precision (str): "fp32", "bf16" hoặc "int8".
+
+    Returns:
+        tuple: (mô hình đã chuyển đổi, chế độ thực sự được áp dụng).
+    """
+    if precision not in CPU_PRECISIONS:
+        raise ValueError(f"precision phải là một trong {CPU_PRECISIONS}, nhận được: {precision}")
+
+    model.eval()
+    if precision == "bf16":
+        if not bf16_supported():
+            print("CPU không hỗ trợ bf16, giữ nguyên fp32.")
+            return model, "fp32"
+        return model.to(torch.bfloat16), "bf16"
+    if precision == "int8":
+        # Lượng tử hóa trọng số nn.Linear sang int8, activation được lượng tử hóa động khi chạy
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8), "int8"
+    return model, "fp32"
+
+
+def model_nbytes(model: torch.nn.Module) -> int:
+    """
+    Dung lượng trọng số của mô hình (byte), tính cả trọng số int8 đã đóng gói.
+    """
+    def tensor_nbytes(value) -> int:
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(tensor_nbytes(item) for item in value)
+        return 0
+
+    return sum(tensor_nbytes(value) for value in model.state_dict().values())
@@ -1,9 +1,16 @@
 import requests
 from bs4 import BeautifulSoup
 import pandas as pd
+import os
+import json
 import time
 import random
+import hashlib
+import threading
 import warnings
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from urllib3.exceptions import InsecureRequestWarning
 
 # Tắt cảnh báo SSL không xác thực
@@ -17,58 +24,236 @@ user_agents = [
 ]
 
 headers = {'User-Agent': random.choice(user_agents)}
-session = requests.Session()
 
-# Lấy nội dung văn bản từ trang web
-def fetch_page_text(url, retries=3, timeout=5):
-    attempt = 0
-    while attempt < retries:
+# Mã trạng thái HTTP tạm thời, nên thử lại
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Thư mục dữ liệu (đổi được qua biến môi trường DATA_DIR)
+DATA_DIR = os.getenv('DATA_DIR', 'data')
+
+# Trích xuất văn bản từ nội dung HTML
+def extract_text(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    return soup.get_text(separator='\n', strip=True)
+
+
+class HostThrottle:
+    """
+    Giới hạn số request đồng thời và khoảng cách tối thiểu giữa các request tới cùng một host.
+    """
+
+    def __init__(self, per_host=2, min_interval=0.0):
+        self.per_host = per_host
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_allowed = {}
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.Semaphore(self.per_host)
+            return self._semaphores[host]
+
+    def acquire(self, host):
+        self._semaphore(host).acquire()
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_allowed.get(host, now))
+            self._next_allowed[host] = start_at + self.min_interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+    def release(self, host):
+        self._semaphore(host).release()
+
+
+class CrawlCache:
+    """
+    Cache trang đã crawl trên đĩa kèm ETag/Last-Modified để gửi request có điều kiện.
+    """
+
+    def __init__(self, cache_dir=os.path.join(DATA_DIR, 'crawl_cache')):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.entries = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as index_file:
+                self.entries = json.load(index_file)
+
+    def _text_path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.txt')
+
+    def conditional_headers(self, url):
+        entry = self.entries.get(url, {})
+        if not os.path.exists(self._text_path(url)):
+            return {}
+        conditional = {}
+        if entry.get('etag'):
+            conditional['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            conditional['If-Modified-Since'] = entry['last_modified']
+        return conditional
+
+    def load_text(self, url):
+        with open(self._text_path(url), 'r', encoding='utf-8') as text_file:
+            return text_file.read()
+
+    def store(self, url, response, text):
+        with open(self._text_path(url), 'w', encoding='utf-8') as text_file:
+            text_file.write(text)
+        with self._lock:
+            self.entries[url] = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+
+    def save(self):
+        with self._lock:
+            with open(self.index_path, 'w', encoding='utf-8') as index_file:
+                json.dump(self.entries, index_file, ensure_ascii=False, indent=2)
+
+
+# Mỗi luồng dùng một Session riêng (requests.Session không an toàn khi dùng chung giữa các luồng)
+_thread_local = threading.local()
+
+def _thread_session():
+    if not hasattr(_thread_local, 'session'):
+        _thread_local.session = requests.Session()
+    return _thread_local.session
+
+
+# Lấy một trang với request có điều kiện, giới hạn theo host và backoff lũy thừa
+def fetch_page(url, cache=None, throttle=None, retries=3, timeout=10, backoff=0.5):
+    host = urlparse(url).netloc
+    request_headers = dict(headers)
+    if cache is not None:
+        request_headers.update(cache.conditional_headers(url))
+
+    for attempt in range(retries):
+        if throttle is not None:
+            throttle.acquire(host)
         try:
-            response = session.get(url, timeout=timeout, headers=headers, verify=False)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            return soup.get_text(separator='\n', strip=True)
+            response = _thread_session().get(url, timeout=timeout, headers=request_headers, verify=False)
+            if response.status_code == 304 and cache is not None:
+                return 'not_modified', cache.load_text(url)
+            if response.status_code not in RETRYABLE_STATUS:
+                response.raise_for_status()
+                text = extract_text(response.content)
+                if cache is not None:
+                    cache.store(url, response, text)
+                return 'ok', text
+        except requests.exceptions.HTTPError:
+            # Lỗi 4xx không thay đổi khi thử lại
+            return 'failed', None
         except requests.exceptions.RequestException:
-            attempt += 1
-            time.sleep(1)
-    return None
-
-# Crawl dữ liệu từ danh sách URL
-def crawl_urls(url_list):
-    results = {}
-    for index, url in enumerate(url_list):
-        print(f"Fetching: {url}")
-        text = fetch_page_text(url)
-        if text:
-            results[url] = text
-        else:
-            print(f"Failed to crawl: {url}")
-    return results
-
-# Lưu tất cả dữ liệu đã crawl vào một file duy nhất
-def save_crawled_data(crawled_data, urls, output_file='data/all_data.txt'):
-    with open(output_file, 'w', encoding='utf-8') as file:
-        for url in urls:
-            text = crawled_data.get(url, "")
-            cleaned_text = text.replace('\n', ' ')
-            file.write(cleaned_text + '\n\n')  # Thêm newline để phân cách các đoạn
-    print(f"Saved all data to: {output_file}")
+            pass
+        finally:
+            if throttle is not None:
+                throttle.release(host)
+        if attempt + 1 < retries:
+            time.sleep(backoff * (2 ** attempt) + random.uniform(0, backoff))
+    return 'failed', None
 
 
-if __name__ == "__main__":
-    file_path = './data/data_source.csv'
+# Crawl đồng thời, trả về từng kết quả ngay khi hoàn thành
+def iter_crawl(url_list, max_workers=8, per_host=2, min_interval=0.0, cache_dir=os.path.join(DATA_DIR, 'crawl_cache'),
+               retries=3, timeout=10, backoff=0.5):
+    cache = CrawlCache(cache_dir) if cache_dir else None
+    throttle = HostThrottle(per_host=per_host, min_interval=min_interval)
+    urls = enumerate(url_list)
+    pending = {}
+
+    def submit_next(executor):
+        index, url = next(urls, (None, None))
+        if url is not None:
+            future = executor.submit(fetch_page, url, cache, throttle, retries, timeout, backoff)
+            pending[future] = (index, url, time.perf_counter())
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Chỉ giữ tối đa 2 * max_workers request đang chờ để bộ nhớ không tăng theo số URL
+            for _ in range(max_workers * 2):
+                submit_next(executor)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, url, started = pending.pop(future)
+                    status, text = future.result()
+                    submit_next(executor)
+                    yield {
+                        'index': index,
+                        'url': url,
+                        'status': status,
+                        'text': text,
+                        'elapsed': time.perf_counter() - started,
+                        'crawled_at': datetime.now(timezone.utc).isoformat(),
+                    }
+    finally:
+        if cache is not None:
+            cache.save()
+
+
+# Sắp xếp lại kết quả của iter_crawl theo thứ tự URL nguồn (giữ lại các trang về sớm tới khi tới lượt)
+def in_source_order(records):
+    buffered = {}
+    next_index = 0
+    for record in records:
+        buffered[record['index']] = record
+        while next_index in buffered:
+            yield buffered.pop(next_index)
+            next_index += 1
+
+
+# Crawl đồng thời và ghi kết quả ra file theo thứ tự URL nguồn (kho dữ liệu và ID đoạn không đổi giữa các lần chạy)
+def crawl_urls_concurrent(url_list, output_file=os.path.join(DATA_DIR, 'all_data.txt'),
+                          records_file=os.path.join(DATA_DIR, 'crawled.jsonl'), **crawl_options):
+    stats = {'pages': 0, 'ok': 0, 'not_modified': 0, 'failed': 0, 'bytes': 0}
+    failed_urls = []
+    start = time.perf_counter()
+
+    with open(output_file, 'w', encoding='utf-8') as text_out, open(records_file, 'w', encoding='utf-8') as records_out:
+        for record in in_source_order(iter_crawl(url_list, **crawl_options)):
+            stats['pages'] += 1
+            stats[record['status']] += 1
+            if record['text'] is None:
+                failed_urls.append(record['url'])
+                print(f"Failed to crawl: {record['url']}")
+                continue
+            print(f"Fetched ({record['status']}, {record['elapsed']:.2f}s): {record['url']}")
+            stats['bytes'] += len(record['text'].encode('utf-8'))
+            text_out.write(record['text'].replace('\n', ' ') + '\n\n')
+            records_out.write(json.dumps(
+                {'url': record['url'], 'crawled_at': record['crawled_at'], 'text': record['text']},
+                ensure_ascii=False
+            ) + '\n')
+
+    stats['elapsed'] = time.perf_counter() - start
+    stats['pages_per_sec'] = stats['pages'] / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+    stats['failed_urls'] = failed_urls
+    print(
+        f"Crawled {stats['pages']} pages in {stats['elapsed']:.1f}s ({stats['pages_per_sec']:.2f} pages/sec): "
+        f"{stats['ok']} ok, {stats['not_modified']} not modified, {stats['failed']} failed"
+    )
+    return stats
+
+
+# Đọc danh sách URL (không trùng lặp) từ file CSV nguồn
+def read_source_urls(file_path=os.path.join(DATA_DIR, 'data_source.csv')):
     data = pd.read_csv(file_path)
 
     # Nếu chỉ có 1 cột chứa URL thì dùng cột đầu tiên:
     if 'Source URL' in data.columns:
-        urls = data['Source URL'].dropna().str.strip().unique()
-    else:
-        urls = data.iloc[:, 0].dropna().str.strip().unique()
+        return data['Source URL'].dropna().str.strip().unique()
+    return data.iloc[:, 0].dropna().str.strip().unique()
 
-    # Bắt đầu crawl
-    crawled_data = crawl_urls(urls)
 
-    # Lưu kết quả
-    save_crawled_data(crawled_data, urls)
+if __name__ == "__main__":
+    urls = read_source_urls()
+
+    # Crawl đồng thời và ghi kết quả trực tiếp ra all_data.txt và crawled.jsonl trong DATA_DIR
+    crawl_urls_concurrent(urls)
 
     print("Crawling complete!")
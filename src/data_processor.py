@@ -1,12 +1,18 @@
 import warnings
 import os
+import re
 import sys
-import pickle
-import faiss
+import json
+import hashlib
+import multiprocessing
+from urllib.parse import urlparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
 from dotenv import load_dotenv
-from faiss import IndexFlatL2
 from embedding import Embedding
+from chunk_store import ChunkStore, append_chunks, convert_pickle, delete_chunks, write_chunk_store
+from index_factory import build_faiss_index, create_faiss_index, load_index, save_index, supports_removal
+from bm25_index import build_bm25_index
 
 # Bỏ qua cảnh báo UserWarning
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -14,31 +20,167 @@ warnings.filterwarnings("ignore", category=UserWarning)
 # Tải biến môi trường từ file .env
 load_dotenv()
 
-# Định nghĩa các hằng số
-DATA_FILE_PATH = "./data/data.txt"
+# Định nghĩa các hằng số (thư mục dữ liệu đổi được qua biến môi trường DATA_DIR)
+DATA_DIR = os.getenv("DATA_DIR", "data")
+DATA_FILE_PATH = os.path.join(DATA_DIR, "data.txt")
+CRAWLED_RECORDS_PATH = os.path.join(DATA_DIR, "crawled.jsonl")
 EMBEDDING_MODEL = os.getenv("MODEL_EMBEDDING")
 CHUNK_SIZE = 256
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "0"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+INDEX_PATH = os.path.join(DATA_DIR, "faiss_index.bin")
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+CHUNK_STORE_PATH = os.path.join(DATA_DIR, "chunks")
+LEGACY_CHUNKS_PATH = os.path.join(DATA_DIR, "chunks.pkl")
+MANIFEST_PATH = os.path.join(DATA_DIR, "chunk_manifest.json")
+BM25_PATH = os.path.join(DATA_DIR, "bm25")
+SHARD_DIR = os.path.join(DATA_DIR, "build_shards")
+# Tỉ lệ tài liệu khớp với crawled.jsonl dưới mức này thì cảnh báo (lọc theo domain sẽ thiếu đoạn)
+SOURCE_MATCH_WARNING = 0.5
+BUILD_WORKERS = int(os.getenv("BUILD_WORKERS", "0")) or os.cpu_count()
+SHARD_SIZE = int(os.getenv("SHARD_SIZE", "200"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+TRAIN_SAMPLE_SIZE = 100000
 
-# Kiểm tra xem biến môi trường EMBEDDING_MODEL có được thiết lập không
-if not EMBEDDING_MODEL:
-    raise ValueError("EMBEDDING_MODEL không được thiết lập trong file .env. Vui lòng thêm biến EMBEDDING_MODEL vào file .env")
+def split_documents(raw_text: str) -> list:
+    """
+    Tách dữ liệu thô thành các tài liệu (phân cách bởi dòng trống).
+
+    Args:
+        raw_text (str): Nội dung file dữ liệu thô.
+
+    Returns:
+        list: Danh sách tài liệu đã loại bỏ khoảng trắng thừa.
+    """
+    documents = re.split(r'\n\s*\n', raw_text)
+    return [document.strip() for document in documents if document.strip()]
+
+def document_hash(document: str) -> str:
+    """
+    Tính mã băm nội dung của một tài liệu.
+    """
+    return hashlib.sha1(document.encode("utf-8")).hexdigest()
+
+def source_metadata(url: str, crawled_at: str = None) -> dict:
+    """
+    Metadata nguồn của một trang: URL, domain (không có "www.") và thời điểm crawl.
+    """
+    domain = (urlparse(url).hostname or "").lower()
+    if domain.startswith("www."):
+        domain = domain[4:]
+    return {"url": url, "domain": domain, "crawled_at": crawled_at}
+
+def load_document_sources(records_path: str = CRAWLED_RECORDS_PATH) -> dict:
+    """
+    Đọc crawled.jsonl (do crawl_data.py ghi) thành dict mã băm tài liệu -> metadata nguồn.
+
+    Tài liệu trong all_data.txt là nội dung trang đã nối thành một dòng, nên mã băm được
+    tính trên cùng dạng đó; tài liệu không tìm thấy nguồn (ví dụ đã sửa tay) không có URL.
+    """
+    sources = {}
+    if not os.path.exists(records_path):
+        return sources
+    with open(records_path, "r", encoding="utf-8") as records_file:
+        for line in records_file:
+            record = json.loads(line)
+            document = record["text"].replace('\n', ' ').strip()
+            sources[document_hash(document)] = source_metadata(record["url"], record.get("crawled_at"))
+    return sources
+
+def report_source_matches(document_hashes, sources: dict, records_path: str = CRAWLED_RECORDS_PATH) -> int:
+    """
+    Đếm số tài liệu tìm thấy nguồn trong crawled.jsonl; cảnh báo khi tỉ lệ khớp thấp.
+
+    Đoạn của tài liệu không khớp không có url/domain nên không bao giờ thỏa bộ lọc metadata
+    (ví dụ `cli.py query --domain`). Lọc theo nguồn cần chỉ mục tạo từ dữ liệu crawl
+    (all_data.txt hoặc ingested.txt cùng crawled.jsonl), không phải data.txt biên soạn tay.
+
+    Returns:
+        int: Số tài liệu có metadata nguồn.
+    """
+    document_hashes = list(document_hashes)
+    matched = sum(doc_hash in sources for doc_hash in document_hashes)
+    if document_hashes and matched < SOURCE_MATCH_WARNING * len(document_hashes):
+        print(f"Cảnh báo: chỉ {matched}/{len(document_hashes)} tài liệu khớp với nguồn trong {records_path}; "
+              f"các đoạn còn lại không có url/domain nên lọc theo domain sẽ không trả về chúng. "
+              f"Tạo chỉ mục từ dữ liệu crawl (all_data.txt hoặc ingested.txt) để dùng bộ lọc nguồn.")
+    return matched
+
+def chunk_documents(embedder: Embedding, documents: list, first_id: int, sources: dict = None) -> tuple:
+    """
+    Chia đoạn từng tài liệu và cấp ID liên tiếp cho các đoạn.
+
+    Args:
+        embedder (Embedding): Đối tượng Embedding dùng để chia đoạn.
+        documents (list): Danh sách tài liệu.
+        first_id (int): ID của đoạn đầu tiên.
+        sources (dict, optional): Mã băm tài liệu -> metadata nguồn (URL, domain, thời điểm crawl).
 
-def process_and_store_data(input_file_path: str, embedding_model: str, chunk_size: int) -> None:
+    Returns:
+        tuple: (danh sách đoạn, danh sách metadata của từng đoạn,
+            dict mã băm tài liệu -> danh sách ID đoạn).
+    """
+    text_chunks = []
+    chunk_metadatas = []
+    document_chunk_ids = {}
+    for document in documents:
+        doc_hash = document_hash(document)
+        # Tài liệu trùng lặp chỉ được chia đoạn và nhúng một lần
+        if doc_hash in document_chunk_ids:
+            continue
+        chunks = embedder.chunk_text(document)
+        ids = list(range(first_id + len(text_chunks), first_id + len(text_chunks) + len(chunks)))
+        document_chunk_ids[doc_hash] = ids
+        text_chunks.extend(chunks)
+        metadata = dict((sources or {}).get(doc_hash, {}), document=doc_hash)
+        chunk_metadatas.extend(dict(metadata) for _ in chunks)
+    return text_chunks, chunk_metadatas, document_chunk_ids
+
+def save_store(faiss_index, index_config: dict, manifest: dict) -> None:
+    """
+    Lưu chỉ mục FAISS và manifest (mã băm tài liệu -> ID đoạn).
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    save_index(faiss_index, INDEX_PATH, index_config)
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, ensure_ascii=False)
+
+def process_and_store_data(
+    input_file_path: str,
+    embedding_model: str,
+    chunk_size: int,
+    index_type: str = "flat",
+    index_params: dict = None
+) -> None:
     """
     Xử lý dữ liệu thô, chia đoạn, tạo nhúng và lưu chỉ mục FAISS.
 
+    Chỉ mục được ánh xạ ID (ID = vị trí đoạn trong kho đoạn data/chunks.*) để các lần
+    cập nhật tăng dần sau đó có thể xóa và thêm từng đoạn.
+
     Args:
         input_file_path (str): Đường dẫn đến file dữ liệu thô.
         embedding_model (str): Tên mô hình nhúng từ Hugging Face.
         chunk_size (int): Kích thước tối đa của mỗi đoạn (số token).
+        index_type (str): Loại chỉ mục FAISS ("flat", "ivf_flat", "hnsw", "ivf_pq").
+        index_params (dict, optional): Tham số xây dựng chỉ mục (nlist, hnsw_m, pq_m, ...).
     """
     # Đọc dữ liệu từ file
     with open(input_file_path, "r", encoding="utf-8") as file:
         raw_text = file.read()
 
-    # Khởi tạo đối tượng Embedding và chia đoạn văn bản
-    embedder = Embedding(model_name=embedding_model, chunk_size=chunk_size)
-    text_chunks = embedder.chunk_text(raw_text)
+    # Khởi tạo đối tượng Embedding và chia đoạn văn bản theo từng tài liệu
+    embedder = Embedding(
+        model_name=embedding_model,
+        chunk_size=chunk_size,
+        cache_dir=EMBEDDING_CACHE_DIR,
+        chunk_overlap=CHUNK_OVERLAP
+    )
+    sources = load_document_sources()
+    text_chunks, chunk_metadatas, document_chunk_ids = chunk_documents(
+        embedder, split_documents(raw_text), 0, sources
+    )
+    report_source_matches(document_chunk_ids, sources)
 
     # In các đoạn văn bản đã chia với mã hóa UTF-8
     for chunk in text_chunks:
@@ -48,20 +190,305 @@ def process_and_store_data(input_file_path: str, embedding_model: str, chunk_siz
     embeddings = embedder.embedding(text_chunks)
     embeddings = np.array(embeddings).astype('float32')  # FAISS yêu cầu kiểu float32
 
-    # Tạo và lưu chỉ mục FAISS
-    embedding_dimension = embeddings.shape[1]
-    faiss_index = IndexFlatL2(embedding_dimension)
-    faiss_index.add(embeddings)
+    # Tạo chỉ mục FAISS theo loại được cấu hình
+    faiss_index, index_config = build_faiss_index(
+        embeddings, index_type, ids=np.arange(len(text_chunks)), **(index_params or {})
+    )
+
+    # Lưu chỉ mục FAISS (kèm cấu hình), kho đoạn, chỉ mục BM25 và manifest
+    write_chunk_store(CHUNK_STORE_PATH, text_chunks, chunk_metadatas)
+    build_bm25_index(BM25_PATH, text_chunks)
+    manifest = {
+        "embedding_model": embedding_model,
+        "chunk_size": chunk_size,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "next_id": len(text_chunks),
+        "documents": document_chunk_ids
+    }
+    save_store(faiss_index, index_config, manifest)
+
+    print(f"Đã lưu FAISS index ({index_type}) và chunks: {faiss_index.ntotal} chunks được xử lý.")
+
+# Embedding của tiến trình con, được tải một lần trong _init_shard_worker
+_shard_embedder = None
+
+def _init_shard_worker(embedding_model: str, chunk_size: int, chunk_overlap: int, num_threads: int) -> None:
+    global _shard_embedder
+    import torch
+    # Chia đều số nhân cho các tiến trình để tránh tranh chấp luồng
+    torch.set_num_threads(num_threads)
+    _shard_embedder = Embedding(model_name=embedding_model, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+def shard_signature(documents: list, embedding_model: str, chunk_size: int, chunk_overlap: int) -> str:
+    """
+    Mã băm xác định nội dung và cấu hình của một shard (dùng để tiếp tục build dang dở).
+    """
+    content = "\0".join([embedding_model, str(chunk_size), str(chunk_overlap)] + [document_hash(d) for d in documents])
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+def embed_shard(shard_path: str, documents: list, signature: str, batch_size: int) -> int:
+    """
+    Chia đoạn và nhúng một shard trong tiến trình con, ghi vector (.npy) và đoạn (.json) xuống đĩa.
+
+    File .json được ghi sau cùng (qua file tạm) nên chỉ tồn tại khi shard đã hoàn tất.
+
+    Returns:
+        int: Số đoạn của shard.
+    """
+    chunks, metadatas, document_chunk_ids = chunk_documents(_shard_embedder, documents, 0)
+    vectors_path = shard_path + ".npy"
+    vectors = np.lib.format.open_memmap(
+        vectors_path + ".tmp", mode="w+", dtype='float32',
+        shape=(len(chunks), _shard_embedder.embedding_dimension)
+    )
+    # Nhúng theo từng lô cố định để giới hạn bộ nhớ
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start:start + batch_size]
+        vectors[start:start + len(batch)] = _shard_embedder.embedding_model.encode(batch, batch_size=batch_size)
+    vectors.flush()
+    del vectors
+    os.replace(vectors_path + ".tmp", vectors_path)
 
-    # Tạo thư mục data nếu chưa tồn tại và lưu chỉ mục FAISS cùng các đoạn
-    os.makedirs("data", exist_ok=True)
-    faiss.write_index(faiss_index, "data/faiss_index.bin")
-    with open("data/chunks.pkl", "wb") as chunk_file:
-        pickle.dump(text_chunks, chunk_file)
+    with open(shard_path + ".json.tmp", "w", encoding="utf-8") as shard_file:
+        json.dump({
+            "signature": signature,
+            "chunks": chunks,
+            "metadatas": metadatas,
+            "documents": document_chunk_ids
+        }, shard_file, ensure_ascii=False)
+    os.replace(shard_path + ".json.tmp", shard_path + ".json")
+    return len(chunks)
 
-    print(f"Đã lưu FAISS index và chunks: {faiss_index.ntotal} chunks được xử lý.")
+def _shard_is_complete(shard_path: str, signature: str) -> bool:
+    if not (os.path.exists(shard_path + ".json") and os.path.exists(shard_path + ".npy")):
+        return False
+    with open(shard_path + ".json", "r", encoding="utf-8") as shard_file:
+        return json.load(shard_file).get("signature") == signature
+
+def _gather_rows(shard_vectors: list, rows: np.ndarray) -> np.ndarray:
+    # Lấy các hàng (theo chỉ số toàn cục đã sắp xếp) từ danh sách mảng mmap của các shard
+    offsets = np.cumsum([0] + [len(vectors) for vectors in shard_vectors])
+    parts = []
+    for number, vectors in enumerate(shard_vectors):
+        local = rows[(rows >= offsets[number]) & (rows < offsets[number + 1])] - offsets[number]
+        if len(local):
+            parts.append(np.asarray(vectors[local], dtype='float32'))
+    return np.concatenate(parts)
+
+def create_index_for_parts(vector_parts: list, index_type: str = "flat", index_params: dict = None) -> tuple:
+    """
+    Tạo chỉ mục FAISS rỗng (ánh xạ ID) cho các vector nằm trong nhiều mảng (thường là mmap),
+    huấn luyện IVF trên toàn bộ hoặc một mẫu TRAIN_SAMPLE_SIZE vector.
+
+    Returns:
+        tuple: (chỉ mục FAISS chưa có vector, dict cấu hình).
+    """
+    total = sum(len(vectors) for vectors in vector_parts)
+    if total <= TRAIN_SAMPLE_SIZE:
+        training_vectors = np.concatenate(vector_parts)
+    else:
+        rows = np.sort(np.random.default_rng(0).choice(total, size=TRAIN_SAMPLE_SIZE, replace=False))
+        training_vectors = _gather_rows(vector_parts, rows)
+    return create_faiss_index(training_vectors, index_type, id_mapped=True, num_vectors=total, **(index_params or {}))
+
+def process_and_store_data_parallel(
+    input_file_path: str,
+    embedding_model: str,
+    chunk_size: int,
+    index_type: str = "flat",
+    index_params: dict = None,
+    num_workers: int = BUILD_WORKERS,
+    shard_size: int = SHARD_SIZE,
+    batch_size: int = EMBED_BATCH_SIZE,
+    shard_dir: str = SHARD_DIR
+) -> None:
+    """
+    Xây dựng chỉ mục bằng nhiều tiến trình: kho tài liệu được chia thành shard, mỗi tiến trình
+    con chia đoạn và nhúng một shard rồi ghi vector ra đĩa, sau đó các shard được gộp theo thứ tự
+    vào chỉ mục FAISS, kho đoạn và chỉ mục BM25 (kết quả giống process_and_store_data).
+
+    Shard đã hoàn tất được giữ lại trong shard_dir; nếu có shard lỗi, chạy lại hàm này sẽ chỉ
+    xử lý các shard còn thiếu. Tiến trình con không dùng cache vector nhúng trên đĩa để tránh
+    ghi đồng thời.
+
+    Args:
+        input_file_path (str): Đường dẫn đến file dữ liệu thô.
+        embedding_model (str): Tên mô hình nhúng từ Hugging Face.
+        chunk_size (int): Kích thước tối đa của mỗi đoạn (số token).
+        index_type (str): Loại chỉ mục FAISS ("flat", "ivf_flat", "hnsw", "ivf_pq").
+        index_params (dict, optional): Tham số xây dựng chỉ mục (nlist, hnsw_m, pq_m, ...).
+        num_workers (int): Số tiến trình con.
+        shard_size (int): Số tài liệu mỗi shard.
+        batch_size (int): Số đoạn mỗi lần gọi mô hình nhúng.
+        shard_dir (str): Thư mục chứa kết quả trung gian của các shard.
+    """
+    with open(input_file_path, "r", encoding="utf-8") as file:
+        documents = split_documents(file.read())
+
+    # Loại tài liệu trùng lặp trước khi chia shard (giữ thứ tự xuất hiện đầu tiên)
+    documents = list({document_hash(document): document for document in documents}.values())
+    shards = [documents[start:start + shard_size] for start in range(0, len(documents), shard_size)]
+    shard_paths = [os.path.join(shard_dir, f"shard_{number:05d}") for number in range(len(shards))]
+    signatures = [shard_signature(shard, embedding_model, chunk_size, CHUNK_OVERLAP) for shard in shards]
+    os.makedirs(shard_dir, exist_ok=True)
+
+    # Nhúng song song các shard chưa hoàn tất
+    pending = [number for number in range(len(shards)) if not _shard_is_complete(shard_paths[number], signatures[number])]
+    print(f"Build song song: {len(shards)} shard, {len(shards) - len(pending)} shard đã có sẵn, {num_workers} tiến trình.")
+    failed = []
+    if pending:
+        num_workers = max(1, min(num_workers, len(pending)))
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_shard_worker,
+            initargs=(embedding_model, chunk_size, CHUNK_OVERLAP, max(1, (os.cpu_count() or 1) // num_workers))
+        ) as executor:
+            futures = {
+                executor.submit(embed_shard, shard_paths[number], shards[number], signatures[number], batch_size): number
+                for number in pending
+            }
+            for future in as_completed(futures):
+                number = futures[future]
+                try:
+                    print(f"Shard {number}: {future.result()} chunks.")
+                except Exception as e:
+                    print(f"Shard {number} lỗi: {e}")
+                    failed.append(number)
+    if failed:
+        raise RuntimeError(f"Các shard {sorted(failed)} bị lỗi; chạy lại để tiếp tục với các shard còn thiếu.")
+
+    # Gộp các shard theo thứ tự, cấp ID đoạn liên tiếp
+    shard_vectors = [np.load(path + ".npy", mmap_mode="r") for path in shard_paths]
+    faiss_index, index_config = create_index_for_parts(shard_vectors, index_type, index_params)
+
+    text_chunks = []
+    document_chunk_ids = {}
+    sources = load_document_sources()
+    write_chunk_store(CHUNK_STORE_PATH, [])
+    for path, vectors in zip(shard_paths, shard_vectors):
+        with open(path + ".json", "r", encoding="utf-8") as shard_file:
+            shard = json.load(shard_file)
+        first_id = len(text_chunks)
+        faiss_index.add_with_ids(
+            np.ascontiguousarray(vectors, dtype='float32'), np.arange(first_id, first_id + len(vectors))
+        )
+        # Metadata nguồn được gắn khi gộp nên shard đã xong vẫn dùng được khi crawled.jsonl thay đổi
+        metadatas = [dict(sources.get(meta["document"], {}), **meta) for meta in shard["metadatas"]]
+        append_chunks(CHUNK_STORE_PATH, shard["chunks"], metadatas)
+        for doc_hash, ids in shard["documents"].items():
+            document_chunk_ids[doc_hash] = [first_id + chunk_id for chunk_id in ids]
+        text_chunks.extend(shard["chunks"])
+    report_source_matches(document_chunk_ids, sources)
+
+    build_bm25_index(BM25_PATH, text_chunks)
+    index_config["ntotal"] = faiss_index.ntotal
+    manifest = {
+        "embedding_model": embedding_model,
+        "chunk_size": chunk_size,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "next_id": len(text_chunks),
+        "documents": document_chunk_ids
+    }
+    save_store(faiss_index, index_config, manifest)
+
+    print(f"Đã lưu FAISS index ({index_type}) và chunks: {faiss_index.ntotal} chunks được xử lý.")
+
+def update_store_incremental(
+    input_file_path: str,
+    embedding_model: str,
+    chunk_size: int,
+    index_type: str = "flat",
+    index_params: dict = None
+) -> None:
+    """
+    Cập nhật chỉ mục FAISS hiện có theo thay đổi của dữ liệu thô.
+
+    Tài liệu được so sánh bằng mã băm với manifest: chỉ tài liệu mới/thay đổi được
+    chia đoạn và nhúng, vector của tài liệu đã bị xóa được loại khỏi chỉ mục theo ID.
+    Nếu không có manifest hợp lệ hoặc chỉ mục không hỗ trợ xóa (HNSW), xây dựng lại toàn bộ.
+
+    Args:
+        input_file_path (str): Đường dẫn đến file dữ liệu thô.
+        embedding_model (str): Tên mô hình nhúng từ Hugging Face.
+        chunk_size (int): Kích thước tối đa của mỗi đoạn (số token).
+        index_type (str): Loại chỉ mục dùng khi phải xây dựng lại toàn bộ.
+        index_params (dict, optional): Tham số xây dựng chỉ mục khi phải xây dựng lại toàn bộ.
+    """
+    manifest = None
+    if os.path.exists(MANIFEST_PATH) and os.path.exists(INDEX_PATH):
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        faiss_index, index_config = load_index(INDEX_PATH)
+
+    if (
+        manifest is None
+        or manifest.get("embedding_model") != embedding_model
+        or manifest.get("chunk_size") != chunk_size
+        or manifest.get("chunk_overlap", 0) != CHUNK_OVERLAP
+        or not supports_removal(index_config)
+    ):
+        print("Không thể cập nhật tăng dần, xây dựng lại toàn bộ chỉ mục.")
+        process_and_store_data(input_file_path, embedding_model, chunk_size, index_type, index_params)
+        return
+
+    with open(input_file_path, "r", encoding="utf-8") as file:
+        documents = split_documents(file.read())
+
+    # Chuyển chunks.pkl cũ sang kho đoạn mmap nếu cần
+    if not ChunkStore.exists(CHUNK_STORE_PATH):
+        convert_pickle(LEGACY_CHUNKS_PATH, CHUNK_STORE_PATH)
+
+    # So sánh mã băm tài liệu hiện tại với manifest
+    current_documents = {document_hash(document): document for document in documents}
+    removed_hashes = [h for h in manifest["documents"] if h not in current_documents]
+    added_documents = [document for h, document in current_documents.items() if h not in manifest["documents"]]
+
+    # Xóa vector và đoạn của các tài liệu không còn tồn tại (ID của các đoạn khác không đổi)
+    removed_ids = [chunk_id for h in removed_hashes for chunk_id in manifest["documents"].pop(h)]
+    if removed_ids:
+        faiss_index.remove_ids(np.array(removed_ids, dtype='int64'))
+        delete_chunks(CHUNK_STORE_PATH, removed_ids)
+
+    # Chia đoạn, nhúng và thêm các tài liệu mới/thay đổi
+    if added_documents:
+        embedder = Embedding(
+            model_name=embedding_model,
+            chunk_size=chunk_size,
+            cache_dir=EMBEDDING_CACHE_DIR,
+            chunk_overlap=CHUNK_OVERLAP
+        )
+        sources = load_document_sources()
+        new_chunks, chunk_metadatas, document_chunk_ids = chunk_documents(
+            embedder, added_documents, manifest["next_id"], sources
+        )
+        report_source_matches(document_chunk_ids, sources)
+        if new_chunks:
+            embeddings = np.array(embedder.embedding(new_chunks)).astype('float32')
+            new_ids = np.arange(manifest["next_id"], manifest["next_id"] + len(new_chunks))
+            faiss_index.add_with_ids(embeddings, new_ids)
+            append_chunks(CHUNK_STORE_PATH, new_chunks, chunk_metadatas)
+        manifest["documents"].update(document_chunk_ids)
+        manifest["next_id"] += len(new_chunks)
+
+    # Chỉ mục BM25 được xây dựng lại từ kho đoạn (nhanh so với bước nhúng)
+    if removed_ids or added_documents:
+        chunk_store = ChunkStore(CHUNK_STORE_PATH)
+        build_bm25_index(BM25_PATH, [chunk_store[chunk_id] for chunk_id in range(len(chunk_store))])
+        chunk_store.close()
+
+    save_store(faiss_index, index_config, manifest)
+
+    print(
+        f"Cập nhật tăng dần: +{len(added_documents)} tài liệu, -{len(removed_hashes)} tài liệu, "
+        f"-{len(removed_ids)} chunks; chỉ mục hiện có {faiss_index.ntotal} chunks."
+    )
 
 if __name__ == "__main__":
+    # Kiểm tra xem biến môi trường EMBEDDING_MODEL có được thiết lập không
+    if not EMBEDDING_MODEL:
+        raise ValueError("EMBEDDING_MODEL không được thiết lập trong file .env. Vui lòng thêm biến EMBEDDING_MODEL vào file .env")
+
     # Tạo thư mục logs nếu chưa tồn tại
     os.makedirs("logs", exist_ok=True)
     
@@ -71,8 +498,13 @@ if __name__ == "__main__":
     sys.stdout = output_log
     sys.stderr = error_log
 
-    # Gọi hàm xử lý dữ liệu
-    process_and_store_data(DATA_FILE_PATH, EMBEDDING_MODEL, CHUNK_SIZE)
+    # Gọi hàm xử lý dữ liệu (cập nhật tăng dần với --incremental, build nhiều tiến trình với --parallel)
+    if "--incremental" in sys.argv[1:]:
+        update_store_incremental(DATA_FILE_PATH, EMBEDDING_MODEL, CHUNK_SIZE, index_type=INDEX_TYPE)
+    elif "--parallel" in sys.argv[1:]:
+        process_and_store_data_parallel(DATA_FILE_PATH, EMBEDDING_MODEL, CHUNK_SIZE, index_type=INDEX_TYPE)
+    else:
+        process_and_store_data(DATA_FILE_PATH, EMBEDDING_MODEL, CHUNK_SIZE, index_type=INDEX_TYPE)
 
     # Đóng file log
     output_log.close()
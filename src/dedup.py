@@ -0,0 +1,469 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+# Định nghĩa các hằng số
+DATA_DIR = os.getenv("DATA_DIR", "data")
+INPUT_FILE_PATH = os.path.join(DATA_DIR, "data_clean.txt")
+OUTPUT_FILE_PATH = os.path.join(DATA_DIR, "data_dedup.txt")
+QUESTIONS_PATH = os.path.join(DATA_DIR, "questions.json")
+RECALL_TOP_K = 3
+RECALL_CHUNK_WORDS = 200
+SHINGLE_WORDS = 8
+BOILERPLATE_MIN_PAGES = 3
+BOILERPLATE_PAGE_FRACTION = 0.05
+DUPLICATE_THRESHOLD = 0.8
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+MIN_PARAGRAPH_WORDS = 5
+SKETCH_WIDTH = 2 ** 20
+FILTER_BITS = 2 ** 23
+FILTER_HASHES = 4
+MAX_INDEXED_PAGES = 20000
+
+# Hệ số của các hàm băm h -> (a * h + b) >> 32 (mod 2^64) dùng cho MinHash
+_rng = np.random.default_rng(1993)
+_PERMUTATION_A = _rng.integers(1, 2 ** 63, size=MINHASH_PERMUTATIONS, dtype='uint64') | np.uint64(1)
+_PERMUTATION_B = _rng.integers(0, 2 ** 63, size=MINHASH_PERMUTATIONS, dtype='uint64')
+
+
+def _hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r'\s+', ' ', text.lower()).strip()
+
+
+def word_shingles(words: list, size: int = SHINGLE_WORDS) -> np.ndarray:
+    """
+    Mã băm 64 bit của các cụm size từ liên tiếp (một mã cho cả đoạn nếu đoạn ngắn hơn size từ).
+    """
+    words = [word.lower() for word in words]
+    if len(words) <= size:
+        return np.array([_hash64(" ".join(words))] if words else [], dtype='uint64')
+    return np.array([_hash64(" ".join(words[i:i + size])) for i in range(len(words) - size + 1)], dtype='uint64')
+
+
+def minhash_signature(shingles: np.ndarray) -> np.ndarray:
+    """
+    Chữ ký MinHash của tập shingle: tỉ lệ vị trí trùng nhau giữa hai chữ ký xấp xỉ độ
+    tương đồng Jaccard giữa hai tập.
+    """
+    if len(shingles) == 0:
+        return np.zeros(MINHASH_PERMUTATIONS, dtype='uint32')
+    with np.errstate(over="ignore"):
+        permuted = (shingles[:, None] * _PERMUTATION_A + _PERMUTATION_B) >> np.uint64(32)
+    return permuted.min(axis=0).astype('uint32')
+
+
+class ShingleCounter:
+    def __init__(self, width: int = SKETCH_WIDTH):
+        """
+        Đếm số trang chứa mỗi shingle bằng count-min sketch (2 hàng x width bộ đếm uint32),
+        nên bộ nhớ cố định (8 * width byte) bất kể kích thước kho dữ liệu. Số đếm có thể
+        lớn hơn thực tế khi va chạm mã băm, không bao giờ nhỏ hơn.
+
+        Args:
+            width (int): Số bộ đếm mỗi hàng (lũy thừa của 2).
+        """
+        self.mask = np.uint64(width - 1)
+        self.counts = np.zeros((2, width), dtype='uint32')
+
+    def _slots(self, shingles: np.ndarray) -> tuple:
+        return (shingles & self.mask).astype('int64'), ((shingles >> np.uint64(32)) & self.mask).astype('int64')
+
+    def add(self, shingles: np.ndarray) -> None:
+        """
+        Cộng 1 cho mỗi shingle (khác nhau) của một trang.
+        """
+        first, second = self._slots(np.unique(shingles))
+        np.add.at(self.counts[0], first, 1)
+        np.add.at(self.counts[1], second, 1)
+
+    def estimate(self, shingles: np.ndarray) -> np.ndarray:
+        first, second = self._slots(shingles)
+        return np.minimum(self.counts[0][first], self.counts[1][second])
+
+
+class BloomFilter:
+    def __init__(self, num_bits: int = FILTER_BITS, num_hashes: int = FILTER_HASHES):
+        """
+        Tập các mã băm 64 bit trong mảng bit cố định (num_bits / 8 byte) bất kể số phần tử.
+        Kiểm tra có thể trả về True nhầm (khoảng 5e-6 với 100 nghìn phần tử và 2% với 1 triệu
+        phần tử ở cấu hình mặc định), không bao giờ trả về False nhầm.
+
+        Args:
+            num_bits (int): Số bit của bộ lọc (bội của 8).
+            num_hashes (int): Số vị trí bit ứng với mỗi phần tử.
+        """
+        self.num_bits = np.uint64(num_bits)
+        self.bits = np.zeros(num_bits // 8, dtype='uint8')
+        self.steps = np.arange(num_hashes, dtype='uint64')
+
+    def _positions(self, hashes) -> np.ndarray:
+        # Băm kép: vị trí thứ i = (nửa thấp + i * nửa cao) mod num_bits
+        hashes = np.asarray(hashes, dtype='uint64').reshape(-1, 1)
+        with np.errstate(over="ignore"):
+            step = (hashes >> np.uint64(32)) | np.uint64(1)
+            positions = ((hashes & np.uint64(0xFFFFFFFF)) + self.steps * step) % self.num_bits
+        return positions.astype('int64')
+
+    def add(self, hashes) -> None:
+        positions = self._positions(hashes).ravel()
+        np.bitwise_or.at(self.bits, positions >> 3, np.left_shift(1, positions & 7).astype('uint8'))
+
+    def contains(self, hashes) -> np.ndarray:
+        """
+        Mảng bool: từng mã băm đã được thêm hay chưa.
+        """
+        positions = self._positions(hashes)
+        return ((self.bits[positions >> 3] >> (positions & 7)) & 1).all(axis=1)
+
+
+class NearDuplicateIndex:
+    def __init__(
+        self,
+        threshold: float = DUPLICATE_THRESHOLD,
+        num_bands: int = LSH_BANDS,
+        max_pages: int = MAX_INDEXED_PAGES
+    ):
+        """
+        Tìm trang gần trùng lặp bằng LSH trên chữ ký MinHash: chữ ký được chia thành num_bands
+        dải, chỉ các trang trùng ít nhất một dải mới được so độ tương đồng, nên chi phí mỗi
+        trang không tăng theo số trang đã thấy. Mỗi trang chỉ giữ chữ ký (4 byte x số hàm băm).
+
+        Chỉ giữ chữ ký của max_pages trang gần nhất (trang cũ nhất bị ghi đè và xóa khỏi bảng
+        LSH) nên bộ nhớ có giới hạn; trang gần trùng với một trang cũ hơn sẽ không bị phát hiện.
+
+        Args:
+            threshold (float): Độ tương đồng Jaccard (ước lượng) tối thiểu để coi là trùng lặp.
+            num_bands (int): Số dải LSH (phải chia hết số hàm băm MinHash).
+            max_pages (int): Số chữ ký tối đa được giữ.
+        """
+        self.threshold = threshold
+        self.num_bands = num_bands
+        self.max_pages = max_pages
+        self.pages_added = 0
+        self.signatures = []
+        self.buckets = [{} for _ in range(num_bands)]
+
+    def _bands(self, signature: np.ndarray) -> list:
+        return [band.tobytes() for band in np.split(signature, self.num_bands)]
+
+    def add(self, signature: np.ndarray) -> bool:
+        """
+        Thêm chữ ký của một trang; trả về False (không thêm) nếu đã có trang gần trùng lặp.
+        """
+        bands = self._bands(signature)
+        candidates = {page for bucket, band in zip(self.buckets, bands) for page in bucket.get(band, ())}
+        for page in candidates:
+            if np.mean(self.signatures[page] == signature) >= self.threshold:
+                return False
+
+        slot = self.pages_added % self.max_pages
+        if slot < len(self.signatures):
+            # Bảng đã đầy: xóa trang cũ nhất khỏi các bucket rồi ghi đè chữ ký của nó
+            for bucket, band in zip(self.buckets, self._bands(self.signatures[slot])):
+                bucket[band].remove(slot)
+                if not bucket[band]:
+                    del bucket[band]
+            self.signatures[slot] = signature
+        else:
+            self.signatures.append(signature)
+        for bucket, band in zip(self.buckets, bands):
+            bucket.setdefault(band, []).append(slot)
+        self.pages_added += 1
+        return True
+
+
+class Deduplicator:
+    def __init__(
+        self,
+        shingle_words: int = SHINGLE_WORDS,
+        min_pages: int = BOILERPLATE_MIN_PAGES,
+        page_fraction: float = BOILERPLATE_PAGE_FRACTION,
+        duplicate_threshold: float = DUPLICATE_THRESHOLD,
+        min_paragraph_words: int = MIN_PARAGRAPH_WORDS,
+        sketch_width: int = SKETCH_WIDTH,
+        filter_bits: int = FILTER_BITS,
+        max_indexed_pages: int = MAX_INDEXED_PAGES
+    ):
+        """
+        Loại bỏ phần lặp lại giữa các trang (menu, footer), đoạn văn trùng lặp và trang gần trùng lặp.
+
+        - Boilerplate: cụm shingle_words từ xuất hiện trên ít nhất max(min_pages, page_fraction
+          * số trang) trang (đếm bằng ShingleCounter) chỉ được giữ ở trang đầu tiên chứa nó và bị
+          xóa khỏi các trang sau, để thông tin chỉ có trong footer (địa chỉ, tên khoa) vẫn còn
+          trong kho dữ liệu.
+        - Trang gần trùng lặp: phần còn lại có độ tương đồng Jaccard (theo MinHash) với một trang
+          trước từ duplicate_threshold trở lên thì bỏ cả trang (NearDuplicateIndex).
+        - Đoạn văn trùng lặp: đoạn từ min_paragraph_words từ trở lên đã xuất hiện (sau khi chuẩn
+          hóa) chỉ được giữ lần đầu.
+
+        Chỉ giữ mã băm và chữ ký (không giữ văn bản) trong các cấu trúc kích thước cố định nên có
+        thể xử lý kho dữ liệu dạng luồng: trang và đoạn đã thấy được ghi trong BloomFilter (hiếm
+        khi nhận nhầm một trang/đoạn mới là trùng lặp), NearDuplicateIndex chỉ giữ max_indexed_pages
+        trang gần nhất.
+
+        Args:
+            shingle_words (int): Số từ mỗi shingle.
+            min_pages (int): Số trang tối thiểu để coi một shingle là boilerplate.
+            page_fraction (float): Tỉ lệ số trang tối thiểu để coi một shingle là boilerplate.
+            duplicate_threshold (float): Độ tương đồng Jaccard tối thiểu giữa hai trang trùng lặp.
+            min_paragraph_words (int): Độ dài tối thiểu (số từ) của đoạn văn được khử trùng lặp.
+            sketch_width (int): Số bộ đếm mỗi hàng của count-min sketch.
+            filter_bits (int): Số bit của mỗi BloomFilter (trang, đoạn văn đã thấy).
+            max_indexed_pages (int): Số chữ ký trang tối đa trong NearDuplicateIndex.
+        """
+        self.shingle_words = shingle_words
+        self.min_pages = min_pages
+        self.page_fraction = page_fraction
+        self.min_paragraph_words = min_paragraph_words
+        self.shingle_counter = ShingleCounter(sketch_width)
+        self.near_duplicates = NearDuplicateIndex(duplicate_threshold, max_pages=max_indexed_pages)
+        self.page_hashes = BloomFilter(filter_bits)
+        self.paragraph_hashes = BloomFilter(filter_bits)
+        self.kept_shingles = BloomFilter(filter_bits)
+        self.pages_observed = 0
+        self.stats = {
+            "pages": 0, "pages_kept": 0, "duplicate_pages": 0, "empty_pages": 0,
+            "duplicate_paragraphs": 0, "words": 0, "words_kept": 0, "boilerplate_words": 0,
+        }
+
+    def observe(self, text: str) -> None:
+        """
+        Đếm shingle của một trang (lượt thứ nhất; hoặc ngay trước clean khi xử lý một lượt).
+        """
+        shingles = [word_shingles(line.split(), self.shingle_words) for line in text.split('\n')]
+        self.shingle_counter.add(np.concatenate(shingles) if shingles else np.zeros(0, dtype='uint64'))
+        self.pages_observed += 1
+
+    def _remove_boilerplate(self, words: list) -> list:
+        shingles = word_shingles(words, self.shingle_words)
+        if len(shingles) == 0:
+            return words
+        threshold = max(self.min_pages, self.page_fraction * self.pages_observed)
+        # Shingle phổ biến chỉ bị xóa nếu đã được giữ ở một trang trước đó
+        frequent = (self.shingle_counter.estimate(shingles) >= threshold) & self.kept_shingles.contains(shingles)
+        frequent = frequent.astype('int64')
+        if len(words) <= self.shingle_words:
+            return [] if frequent[0] else words
+        # Một từ là boilerplate nếu nằm trong ít nhất một shingle phổ biến đã được giữ
+        covered = np.convolve(frequent, np.ones(self.shingle_words, dtype='int64'))[:len(words)] > 0
+        return [word for word, is_boilerplate in zip(words, covered) if not is_boilerplate]
+
+    def clean(self, text: str) -> str:
+        """
+        Làm sạch một trang; trả về None nếu trang trùng lặp hoặc không còn nội dung.
+        """
+        self.stats["pages"] += 1
+
+        # Trang trùng khớp hoàn toàn được nhận ra ngay, không phụ thuộc phần boilerplate đã xóa
+        page_hash = _hash64(_normalize(text))
+        if self.page_hashes.contains(page_hash)[0]:
+            self.stats["words"] += len(text.split())
+            self.stats["duplicate_pages"] += 1
+            return None
+        self.page_hashes.add(page_hash)
+
+        paragraphs = []
+        for line in text.split('\n'):
+            words = line.split()
+            kept = self._remove_boilerplate(words)
+            self.stats["words"] += len(words)
+            self.stats["boilerplate_words"] += len(words) - len(kept)
+            if kept:
+                paragraphs.append(kept)
+
+        if not paragraphs:
+            self.stats["empty_pages"] += 1
+            return None
+        page_shingles = np.concatenate([word_shingles(words, self.shingle_words) for words in paragraphs])
+        if not self.near_duplicates.add(minhash_signature(page_shingles)):
+            self.stats["duplicate_pages"] += 1
+            return None
+
+        unique_paragraphs = []
+        for words in paragraphs:
+            if len(words) >= self.min_paragraph_words:
+                paragraph_hash = _hash64(_normalize(" ".join(words)))
+                if self.paragraph_hashes.contains(paragraph_hash)[0]:
+                    self.stats["duplicate_paragraphs"] += 1
+                    continue
+                self.paragraph_hashes.add(paragraph_hash)
+            unique_paragraphs.append(" ".join(words))
+            self.kept_shingles.add(word_shingles(words, self.shingle_words))
+
+        self.stats["pages_kept"] += 1
+        self.stats["words_kept"] += sum(len(paragraph.split()) for paragraph in unique_paragraphs)
+        return "\n".join(unique_paragraphs)
+
+
+def iter_documents(file_path: str):
+    """
+    Đọc dần các tài liệu (phân cách bởi dòng trống) từ file, không tải toàn bộ file vào bộ nhớ.
+    """
+    lines = []
+    with open(file_path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                lines.append(line.strip())
+            elif lines:
+                yield "\n".join(lines)
+                lines = []
+    if lines:
+        yield "\n".join(lines)
+
+
+def dedup_documents(documents, deduplicator: Deduplicator):
+    """
+    Khử trùng lặp dạng luồng (một lượt): boilerplate được nhận ra khi đã xuất hiện trên đủ số
+    trang trước đó, nên vài trang đầu vẫn giữ phần lặp lại.
+
+    Args:
+        documents: Iterator các dict tài liệu có trường "text" (như ingest_pipeline.crawl_documents).
+        deduplicator (Deduplicator): Trạng thái khử trùng lặp.
+
+    Yields:
+        dict: Tài liệu với nội dung đã làm sạch (tài liệu trùng lặp bị bỏ qua).
+    """
+    for document in documents:
+        deduplicator.observe(document["text"])
+        text = deduplicator.clean(document["text"])
+        if text is not None:
+            yield dict(document, text=text)
+
+
+def answer_recall(file_path: str, questions: list, embedder=None, top_k: int = RECALL_TOP_K) -> dict:
+    """
+    Đo mức độ một file dữ liệu còn chứa câu trả lời của bộ câu hỏi đánh giá.
+
+    - coverage: tỉ lệ câu trả lời tham chiếu xuất hiện (sau khi chuẩn hóa) trong một tài liệu.
+    - recall@top_k: tỉ lệ câu hỏi có câu trả lời nằm trong top_k đoạn truy xuất bằng BM25 trên
+      các đoạn của file (chia bằng embedder.chunk_text như data_processor, hoặc thành các đoạn
+      RECALL_CHUNK_WORDS từ khi không có embedder).
+
+    Args:
+        file_path (str): File dữ liệu (các tài liệu phân cách bởi dòng trống).
+        questions (list): Các dict có trường "question" và "reference_answer" (data/questions.json).
+        embedder (Embedding, optional): Dùng bộ chia đoạn của mô hình nhúng.
+        top_k (int): Số đoạn truy xuất cho mỗi câu hỏi.
+
+    Returns:
+        dict: coverage, recall@top_k và danh sách câu trả lời không còn trong file (missing).
+    """
+    from bm25_index import BM25Index, build_bm25_index
+    from eval_runner import retrieval_hits
+    from evaluate import normalize_answer
+
+    answers = [normalize_answer(item["reference_answer"]) for item in questions]
+    found = [False] * len(answers)
+    chunks = []
+    for document in iter_documents(file_path):
+        text = normalize_answer(document)
+        found = [is_found or bool(answer) and answer in text for is_found, answer in zip(found, answers)]
+        if embedder is not None:
+            chunks.extend(embedder.chunk_text(document))
+        else:
+            words = document.split()
+            chunks.extend(" ".join(words[i:i + RECALL_CHUNK_WORDS]) for i in range(0, len(words), RECALL_CHUNK_WORDS))
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        build_bm25_index(os.path.join(index_dir, "bm25"), chunks)
+        _, indices = BM25Index(os.path.join(index_dir, "bm25")).search([item["question"] for item in questions], top_k)
+    hits = [
+        any(retrieval_hits(item["reference_answer"], [chunks[chunk_id] for chunk_id in row if chunk_id >= 0]))
+        for item, row in zip(questions, indices)
+    ]
+    return {
+        "coverage": float(np.mean(found)) if found else 0.0,
+        f"recall@{top_k}": float(np.mean(hits)) if hits else 0.0,
+        "missing": [item["reference_answer"] for item, is_found in zip(questions, found) if not is_found],
+    }
+
+
+def dedup_file(
+    input_path: str = INPUT_FILE_PATH,
+    output_path: str = OUTPUT_FILE_PATH,
+    embedder=None,
+    questions: list = None,
+    **options
+) -> dict:
+    """
+    Khử trùng lặp một file dữ liệu bằng hai lượt đọc dạng luồng: lượt đầu đếm shingle trên
+    mọi trang, lượt sau xóa boilerplate, đoạn và trang trùng lặp rồi ghi ra output_path.
+
+    Args:
+        input_path (str): File dữ liệu (các tài liệu phân cách bởi dòng trống).
+        output_path (str): File kết quả cùng định dạng.
+        embedder (Embedding, optional): Dùng để đếm số đoạn (= số vector) trước và sau khi khử trùng lặp.
+        questions (list, optional): Bộ câu hỏi đánh giá; nếu có, đo answer_recall trước và sau.
+        **options: Tham số của Deduplicator.
+
+    Returns:
+        dict: Thống kê số trang, số từ, số đoạn văn đã loại, số chunk tiết kiệm được và
+            recall_before/recall_after (nếu có questions).
+    """
+    deduplicator = Deduplicator(**options)
+    for document in iter_documents(input_path):
+        deduplicator.observe(document)
+
+    chunks_before = chunks_after = 0
+    with open(output_path, "w", encoding="utf-8") as output_file:
+        for document in iter_documents(input_path):
+            text = deduplicator.clean(document)
+            if embedder is not None:
+                chunks_before += len(embedder.chunk_text(document))
+            if text is None:
+                continue
+            if embedder is not None:
+                chunks_after += len(embedder.chunk_text(text))
+            output_file.write(text + "\n\n")
+
+    stats = dict(deduplicator.stats)
+    if embedder is not None:
+        stats.update(chunks_before=chunks_before, chunks_after=chunks_after, chunks_saved=chunks_before - chunks_after)
+    if questions:
+        stats["recall_before"] = answer_recall(input_path, questions, embedder)
+        stats["recall_after"] = answer_recall(output_path, questions, embedder)
+    return stats
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from embedding import Embedding
+
+    # Tải biến môi trường từ file .env
+    load_dotenv()
+
+    # Đếm chunk bằng cùng bộ chia đoạn với data_processor (nếu MODEL_EMBEDDING được thiết lập)
+    embedding_model = os.getenv("MODEL_EMBEDDING")
+    embedder = Embedding(model_name=embedding_model, chunk_size=256) if embedding_model else None
+
+    input_path = sys.argv[1] if len(sys.argv) > 1 else INPUT_FILE_PATH
+    output_path = sys.argv[2] if len(sys.argv) > 2 else OUTPUT_FILE_PATH
+    questions = None
+    if os.path.exists(QUESTIONS_PATH):
+        with open(QUESTIONS_PATH, "r", encoding="utf-8") as file:
+            questions = json.load(file)
+    stats = dedup_file(input_path, output_path, embedder, questions)
+
+    print(f"Trang: {stats['pages']} -> {stats['pages_kept']} "
+          f"({stats['duplicate_pages']} trang trùng lặp, {stats['empty_pages']} trang chỉ có boilerplate)")
+    print(f"Từ: {stats['words']} -> {stats['words_kept']} ({stats['boilerplate_words']} từ boilerplate, "
+          f"{stats['duplicate_paragraphs']} đoạn văn trùng lặp)")
+    if "chunks_saved" in stats:
+        print(f"Chunk/vector: {stats['chunks_before']} -> {stats['chunks_after']} (tiết kiệm {stats['chunks_saved']})")
+    if "recall_before" in stats:
+        before, after = stats["recall_before"], stats["recall_after"]
+        recall_key = f"recall@{RECALL_TOP_K}"
+        print(f"Câu trả lời còn trong dữ liệu: {before['coverage']:.1%} -> {after['coverage']:.1%}, "
+              f"BM25 {recall_key}: {before[recall_key]:.1%} -> {after[recall_key]:.1%}")
+        for answer in set(after["missing"]) - set(before["missing"]):
+            print(f"  Mất câu trả lời: {answer}")
+    print(f"Đã lưu kết quả tại: {output_path}")
@@ -1,12 +1,26 @@
 import re
+import numpy as np
+import torch
 from transformers import AutoTokenizer
 from sentence_transformers import SentenceTransformer
+from embedding_cache import EmbeddingCache
+from cpu_inference import optimize_for_cpu
+from onnx_encoder import ONNX_DIR, PARITY_MIN_COSINE
+from instrumentation import metrics
+
+# Các backend mã hóa câu: torch (SentenceTransformer), onnx (ONNX Runtime trên CPU)
+EMBEDDING_BACKENDS = ("torch", "onnx")
 
 class Embedding:
     def __init__(
         self,
         model_name="bkai-foundation-models/vietnamese-bi-encoder",
-        chunk_size=256
+        chunk_size=256,
+        cache_dir=None,
+        chunk_overlap=0,
+        precision=None,
+        backend="torch",
+        onnx_dir=ONNX_DIR
     ):
         """
         Khởi tạo đối tượng Embedding với mô hình nhúng và kích thước đoạn.
@@ -14,69 +28,195 @@ class Embedding:
         Args:
             model_name (str): Tên mô hình nhúng từ Hugging Face.
             chunk_size (int): Kích thước tối đa của mỗi đoạn (số token).
+            cache_dir (str, optional): Thư mục cache vector nhúng trên đĩa (None: không dùng cache).
+            chunk_overlap (int): Số token chồng lấn tối đa giữa hai đoạn liên tiếp.
+            precision (str, optional): Chế độ suy luận trên CPU ("fp32", "bf16", "int8"); bỏ qua khi chạy GPU.
+            backend (str): "torch" (SentenceTransformer) hoặc "onnx" (mô hình xuất sang ONNX, chạy bằng
+                ONNX Runtime trên CPU; "int8" dùng bản trọng số int8, "bf16" không được hỗ trợ).
+            onnx_dir (str): Thư mục chứa các mô hình nhúng đã xuất sang ONNX.
         """
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"backend phải là một trong {EMBEDDING_BACKENDS}, nhận được: {backend}")
         self.model_name = model_name
         self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
         self.tokenizer = AutoTokenizer.from_pretrained(
             model_name, trust_remote_code=True
         )
         self.embedding_model = SentenceTransformer(model_name)
+        self.precision = "fp32"
+        self.backend = "torch"
+        self.parity = None
+        # Mô hình dùng để mã hóa (SentenceTransformer hoặc OnnxEncoder, cùng giao diện encode)
+        self.encoder = self.embedding_model
+        if backend == "onnx":
+            self._load_onnx_encoder(onnx_dir, precision or "fp32")
+        elif precision and self.embedding_model.device.type == "cpu":
+            self.embedding_model, self.precision = optimize_for_cpu(self.embedding_model, precision)
+            self.encoder = self.embedding_model
         self.embedding_dimension = self.embedding_model.get_sentence_embedding_dimension()
+        self.cache = None
+        if cache_dir:
+            # Vector nhúng bf16/int8 lệch nhẹ so với fp32 nên được cache riêng
+            cache_key = model_name if self.precision == "fp32" else f"{model_name}@{self.precision}"
+            if self.backend == "onnx" and self.precision != "fp32":
+                cache_key = f"{model_name}@onnx-{self.precision}"
+            self.cache = EmbeddingCache(cache_dir, cache_key, self.embedding_dimension)
+
+    def _load_onnx_encoder(self, onnx_dir: str, precision: str) -> None:
+        """
+        Xuất (nếu chưa có) và tải mô hình nhúng ONNX, rồi so sánh vector với mô hình PyTorch.
+
+        Nếu thiếu onnxruntime hoặc vector lệch quá ngưỡng PARITY_MIN_COSINE, giữ backend PyTorch.
+        """
+        if precision not in PARITY_MIN_COSINE:
+            print(f"Backend ONNX không hỗ trợ {precision}, dùng fp32.")
+            precision = "fp32"
+        try:
+            from onnx_encoder import OnnxEncoder, export_onnx, parity_check
+            model_dir = export_onnx(
+                self.embedding_model, self.tokenizer, self.model_name, onnx_dir, quantize=precision == "int8"
+            )
+            encoder = OnnxEncoder(model_dir, self.tokenizer, precision)
+        except ImportError as e:
+            print(f"{e}. Dùng backend PyTorch.")
+            return
+
+        parity = parity_check(self.embedding_model, encoder)
+        print(f"So sánh vector ONNX ({precision}) với PyTorch: cosine nhỏ nhất {parity['min_cosine']:.6f}, "
+              f"sai khác lớn nhất {parity['max_abs_diff']:.2e}")
+        if parity["min_cosine"] < PARITY_MIN_COSINE[precision]:
+            print("Vector ONNX lệch quá ngưỡng, dùng backend PyTorch.")
+            return
+        self.encoder, self.backend, self.precision = encoder, "onnx", precision
+        self.parity = parity
 
-    
     def chunk_text(self, input_text: str) -> list:
         """
         Chia đoạn văn bản theo cách tối ưu dựa trên dấu chấm, xuống dòng và độ dài token.
 
+        Các câu được mã hóa theo lô một lần, câu ngắn được gộp liên tiếp cho tới khi đạt
+        chunk_size token, câu quá dài được cắt theo token (offset mapping của fast tokenizer)
+        hoặc theo từ (tokenizer thường). Đoạn được cắt trực tiếp từ văn bản gốc, không cần
+        giải mã lại token. Các đoạn liên tiếp chồng lấn tối đa chunk_overlap token.
+
         Args:
             input_text (str): Văn bản đầu vào cần chia đoạn.
 
         Returns:
             list: Danh sách các đoạn văn bản đã được chia.
         """
-        def tokenize_and_check_length(text_segment: str) -> tuple:
-            tokens = self.tokenizer.encode(text_segment, add_special_tokens=False)
-            return tokens, len(tokens)
+        # Vị trí (start, end) của từng câu trong văn bản gốc (giữ lại dấu chấm cuối câu)
+        segments = []
+        position = 0
+        for separator in re.finditer(r'\.\s+|\n+', input_text):
+            segments.append((position, separator.start() + (input_text[separator.start()] == '.')))
+            position = separator.end()
+        segments.append((position, len(input_text)))
+        segments = [(start, end) for start, end in segments if input_text[start:end].strip()]
+        if not segments:
+            return []
 
-        def decode_tokens(tokens: list) -> str:
-            return self.tokenizer.decode(tokens)
+        # Mã hóa toàn bộ câu trong một lần gọi tokenizer
+        encoded = self.tokenizer(
+            [input_text[start:end] for start, end in segments],
+            add_special_tokens=False,
+            return_offsets_mapping=self.tokenizer.is_fast
+        )
 
-        def split_by_token(tokens: list, max_length: int) -> list:
-            if len(tokens) <= max_length * 1.1:
-                return [tokens]
+        # Đơn vị để gộp: (start, end, số token); câu quá dài được tách thành token hoặc từ
+        units = []
+        for index, (start, end) in enumerate(segments):
+            num_tokens = len(encoded["input_ids"][index])
+            if num_tokens <= self.chunk_size:
+                units.append((start, end, num_tokens))
+            elif self.tokenizer.is_fast:
+                units.extend(self._offset_units(start, encoded["offset_mapping"][index]))
             else:
-                mid_point = len(tokens) // 2
-                return (split_by_token(tokens[:mid_point], max_length) +
-                        split_by_token(tokens[mid_point:], max_length))
+                units.extend(self._word_units(input_text, start, end))
 
-        def process_chunk(text_segment: str) -> list:
-            tokens, length = tokenize_and_check_length(text_segment)
+        return self._pack_units(input_text, units)
 
-            if length <= self.chunk_size * 1.1:
-                return [decode_tokens(tokens)]
+    def _offset_units(self, start: int, offsets: list) -> list:
+        """
+        Gộp các token liền nhau (cùng một từ) từ offset mapping thành đơn vị để không cắt giữa từ.
+        """
+        units = []
+        for token_start, token_end in offsets:
+            if units and token_start <= units[-1][1] - start:
+                unit_start, _, num_tokens = units[-1]
+                units[-1] = (unit_start, start + token_end, num_tokens + 1)
             else:
-                # Chia theo token nếu đoạn quá dài
-                token_chunks = split_by_token(tokens, self.chunk_size)
-                return [decode_tokens(t) for t in token_chunks]
+                units.append((start + token_start, start + token_end, 1))
+        return units
 
-        import re
-        rough_chunks = re.split(r'\.\s+|\n+', input_text)
-        rough_chunks = [chunk.strip() for chunk in rough_chunks if chunk.strip()]
+    def _word_units(self, input_text: str, start: int, end: int) -> list:
+        """
+        Tách một câu thành các từ kèm số token của từng từ (dùng khi không có offset mapping).
+        """
+        words = [(start + word.start(), start + word.end()) for word in re.finditer(r'\S+', input_text[start:end])]
+        word_texts = [input_text[word_start:word_end] for word_start, word_end in words]
+        unique_words = list(dict.fromkeys(word_texts))
+        encoded = self.tokenizer(unique_words, add_special_tokens=False)["input_ids"]
+        word_lengths = {word: max(1, len(tokens)) for word, tokens in zip(unique_words, encoded)}
+        return [(word_start, word_end, word_lengths[text]) for (word_start, word_end), text in zip(words, word_texts)]
+
+    def _pack_units(self, input_text: str, units: list) -> list:
+        """
+        Gộp tham lam các đơn vị liên tiếp thành đoạn tối đa chunk_size token, có chồng lấn.
+        """
+        chunks = []
+        first = 0
+        while first < len(units):
+            # Mở rộng đoạn cho tới khi vượt quá chunk_size (luôn lấy ít nhất một đơn vị)
+            last = first
+            total_tokens = units[first][2]
+            while last + 1 < len(units) and total_tokens + units[last + 1][2] <= self.chunk_size:
+                last += 1
+                total_tokens += units[last][2]
 
-        final_chunks = []
-        for chunk in rough_chunks:
-            final_chunks.extend(process_chunk(chunk))
+            chunk = input_text[units[first][0]:units[last][1]].strip()
+            if chunk:
+                chunks.append(chunk)
+            if last + 1 >= len(units):
+                break
 
-        return final_chunks
+            # Đoạn tiếp theo bắt đầu lại từ các đơn vị cuối có tổng token không vượt quá chunk_overlap
+            next_first = last + 1
+            overlap_tokens = 0
+            while next_first - 1 > first and overlap_tokens + units[next_first - 1][2] <= self.chunk_overlap:
+                next_first -= 1
+                overlap_tokens += units[next_first][2]
+            first = next_first
 
+        return chunks
+
+    @torch.inference_mode()
     def embedding(self, input_text: str) -> list:
         """
         Tạo vector nhúng cho văn bản đầu vào.
 
+        Nếu có cache, chỉ các văn bản chưa có trong cache mới được đưa qua mô hình.
+
         Args:
-            input_text (str): Văn bản cần nhúng.
+            input_text (str): Văn bản cần nhúng (hoặc danh sách văn bản).
 
         Returns:
             list: Vector nhúng dưới dạng danh sách.
         """
-        return self.embedding_model.encode(input_text).tolist()
+        texts = [input_text] if isinstance(input_text, str) else list(input_text)
+        with metrics.span("embed", texts=len(texts)):
+            if self.cache is None:
+                metrics.count("embedded_texts", len(texts))
+                return self.encoder.encode(input_text).tolist()
+
+            vectors, missing = self.cache.lookup(texts)
+            metrics.count("embedding_cache_hits", len(texts) - len(missing))
+            metrics.count("embedded_texts", len(missing))
+            if missing:
+                missing_texts = [texts[position] for position in missing]
+                encoded = np.asarray(self.encoder.encode(missing_texts), dtype='float32')
+                vectors[missing] = encoded
+                self.cache.add(missing_texts, encoded)
+
+            return vectors[0].tolist() if isinstance(input_text, str) else vectors.tolist()
@@ -0,0 +1,133 @@
+import os
+import re
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir: str, model_name: str, dimension: int):
+        """
+        Bộ nhớ đệm vector nhúng trên đĩa, đánh khóa theo tên mô hình và mã băm văn bản.
+
+        Vector được lưu nối tiếp trong file float32 (đọc bằng memory-map), khóa được lưu
+        trong file văn bản (mỗi dòng một khóa, dòng i ứng với hàng i của ma trận).
+        Mỗi thư mục cache chỉ nên có một tiến trình ghi tại một thời điểm; trong một tiến trình,
+        lookup/add có thể được gọi đồng thời từ nhiều luồng (được bảo vệ bằng lock).
+
+        Args:
+            cache_dir (str): Thư mục gốc của cache.
+            model_name (str): Tên mô hình nhúng (mỗi mô hình một thư mục con).
+            dimension (int): Số chiều vector nhúng.
+        """
+        self.model_name = model_name
+        self.dimension = dimension
+        self.directory = os.path.join(cache_dir, re.sub(r'[^\w.-]+', '_', model_name))
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.keys_path = os.path.join(self.directory, "keys.txt")
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        # Vector được ghi trước khóa nên số hàng hợp lệ là min của hai file
+        keys = []
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "r", encoding="utf-8") as keys_file:
+                keys = [line.strip() for line in keys_file if line.strip()]
+        vector_bytes = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        num_rows = min(len(keys), vector_bytes // (4 * self.dimension))
+
+        # Cắt bỏ các hàng vector không có khóa (ghi dở dang) để lần ghi sau không bị lệch
+        if vector_bytes > num_rows * 4 * self.dimension:
+            with open(self.vectors_path, "r+b") as vectors_file:
+                vectors_file.truncate(num_rows * 4 * self.dimension)
+
+        self.key_to_row = {key: row for row, key in enumerate(keys[:num_rows])}
+        self.num_rows = num_rows
+        self._remap()
+
+    def _remap(self) -> None:
+        vectors = None
+        if self.num_rows:
+            vectors = np.memmap(
+                self.vectors_path, dtype='float32', mode='r', shape=(self.num_rows, self.dimension)
+            )
+        self._vectors = vectors
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Chuẩn hóa văn bản trước khi băm (Unicode NFC, gộp khoảng trắng).
+        """
+        return unicodedata.normalize("NFC", " ".join(text.split()))
+
+    def key(self, text: str) -> str:
+        """
+        Tạo khóa cache từ tên mô hình và văn bản đã chuẩn hóa.
+        """
+        content = f"{self.model_name}\0{self.normalize(text)}"
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def lookup(self, texts: list) -> tuple:
+        """
+        Tra cứu vector cho danh sách văn bản.
+
+        Args:
+            texts (list): Danh sách văn bản.
+
+        Returns:
+            tuple: (ma trận float32 đã điền các hàng có trong cache, danh sách vị trí còn thiếu).
+        """
+        keys = [self.key(text) for text in texts]
+        vectors = np.zeros((len(texts), self.dimension), dtype='float32')
+        missing = []
+        with self._lock:
+            for position, key in enumerate(keys):
+                row = self.key_to_row.get(key)
+                if row is None:
+                    missing.append(position)
+                else:
+                    vectors[position] = self._vectors[row]
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return vectors, missing
+
+    def add(self, texts: list, vectors: np.ndarray) -> None:
+        """
+        Thêm vector mới vào cache (bỏ qua văn bản đã có khóa).
+
+        Args:
+            texts (list): Danh sách văn bản.
+            vectors (np.ndarray): Ma trận vector tương ứng.
+        """
+        keys = [self.key(text) for text in texts]
+        with self._lock:
+            new_keys = []
+            new_rows = []
+            seen = set()
+            for key, vector in zip(keys, vectors):
+                if key in self.key_to_row or key in seen:
+                    continue
+                seen.add(key)
+                new_keys.append(key)
+                new_rows.append(vector)
+            if not new_keys:
+                return
+
+            # Vector và khóa của cùng một lần thêm được ghi liền nhau, không xen với luồng khác
+            with open(self.vectors_path, "ab") as vectors_file:
+                vectors_file.write(np.asarray(new_rows, dtype='float32').tobytes())
+            with open(self.keys_path, "a", encoding="utf-8") as keys_file:
+                keys_file.write("".join(f"{key}\n" for key in new_keys))
+
+            for key in new_keys:
+                self.key_to_row[key] = self.num_rows
+                self.num_rows += 1
+
+            # Ánh xạ lại memory-map với kích thước mới
+            self._remap()
@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from dotenv import load_dotenv
+from evaluate import exact_match, is_match, normalize_answer, token_f1
+
+# Tải biến môi trường từ file .env
+load_dotenv()
+
+# Định nghĩa các hằng số
+EMBEDDING_MODEL = os.getenv("MODEL_EMBEDDING")
+LLM_MODEL = "meta-llama/Llama-3.2-1B-Instruct"
+CHUNK_SIZE = 256
+DATA_DIR = os.getenv("DATA_DIR", "data")
+TEST_DATA_PATH = os.path.join(DATA_DIR, "questions.json")
+CHECKPOINT_PATH = "logs/eval_checkpoint.jsonl"
+REPORT_PATH = "logs/eval_report.json"
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "8"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+CPU_PRECISION = os.getenv("CPU_PRECISION") or None
+PREFIX_CACHE_BYTES = int(os.getenv("PREFIX_CACHE_BYTES", "0"))
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+NUM_INTEROP_THREADS = int(os.getenv("TORCH_NUM_INTEROP_THREADS", "0"))
+
+
+def retrieval_hits(reference: str, retrieved_chunks: list) -> list:
+    """
+    Với từng vị trí k, câu trả lời tham chiếu đã xuất hiện trong k đoạn truy xuất đầu tiên hay chưa.
+
+    Args:
+        reference (str): Câu trả lời tham chiếu.
+        retrieved_chunks (list): Nội dung các đoạn theo thứ tự truy xuất.
+
+    Returns:
+        list: Danh sách bool (phần tử k-1 ứng với recall@k).
+    """
+    reference = normalize_answer(reference)
+    hits, found = [], False
+    for chunk in retrieved_chunks:
+        found = found or bool(reference) and reference in normalize_answer(chunk)
+        hits.append(found)
+    return hits
+
+
+def load_checkpoint(path: str, signature: dict) -> dict:
+    """
+    Đọc kết quả đã chấm của lần chạy trước có cùng cấu hình (theo chỉ số câu hỏi).
+
+    Dòng ghi dở (khi tiến trình bị dừng giữa chừng) và dòng của cấu hình khác bị bỏ qua.
+    """
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, "r", encoding="utf-8") as checkpoint_file:
+        for line in checkpoint_file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("signature") == signature:
+                results[record["index"]] = record["result"]
+    return results
+
+
+def evaluate_batch(rag, llm, items: list, top_k: int, max_length: int, retrieval_mode: str) -> list:
+    """
+    Chấm một lô câu hỏi: truy xuất một lần, sinh câu trả lời (nếu có LLM) rồi tính các chỉ số.
+
+    Args:
+        rag: RagSystem dùng để truy xuất.
+        llm: LLMGenerator (None: chỉ đánh giá bước truy xuất).
+        items (list): Danh sách (chỉ số, câu hỏi, câu trả lời tham chiếu).
+        top_k (int): Số đoạn truy xuất cho mỗi câu hỏi.
+        max_length (int): Độ dài tối đa của câu trả lời.
+        retrieval_mode (str): "dense", "sparse" hoặc "hybrid".
+
+    Returns:
+        list: Danh sách (chỉ số, kết quả) của từng câu hỏi.
+    """
+    queries = [question for _, question, _ in items]
+    start = time.perf_counter()
+    _, indices = rag.retrieve_batch(queries, top_k, retrieval_mode=retrieval_mode)
+    retrieval_ms = (time.perf_counter() - start) * 1000
+
+    answers = [None] * len(items)
+    generation_ms = 0.0
+    if llm is not None:
+        # Dùng lại kết quả truy xuất ở trên thay vì để generate_batch truy xuất lại
+        prompts = [rag.build_prompt(query, row) for query, row in zip(queries, indices)]
+        start = time.perf_counter()
+        outputs = llm.generate_batch(prompts, batch_size=len(prompts), max_length=max_length, use_rag=False)
+        generation_ms = (time.perf_counter() - start) * 1000
+        answers = [output["rag_answer"] for output in outputs]
+
+    results = []
+    for (index, question, reference), row, answer in zip(items, indices, answers):
+        chunk_ids = [int(idx) for idx in row if idx >= 0]
+        result = {
+            "question": question,
+            "reference_answer": reference,
+            "retrieved_ids": chunk_ids,
+            "retrieval_hits": retrieval_hits(reference, [rag.document_list[idx] for idx in chunk_ids]),
+            # Thời gian của cả lô chứa câu hỏi (bằng thời gian từng câu khi batch_size = 1)
+            "retrieval_ms": retrieval_ms,
+            "latency_ms": retrieval_ms + generation_ms,
+        }
+        if answer is not None:
+            result.update(
+                answer=answer,
+                exact_match=exact_match(reference, answer),
+                f1=token_f1(reference, answer),
+                match=is_match(reference, answer),
+            )
+        results.append((index, result))
+    return results
+
+
+def summarize(results: list, top_k: int) -> dict:
+    """
+    Tổng hợp các chỉ số trên toàn bộ câu hỏi (EM, F1, độ chính xác theo evaluate.py, recall@k, độ trễ).
+    """
+    summary = {"questions": len(results)}
+    if not results:
+        return summary
+    for k in range(1, top_k + 1):
+        summary[f"recall@{k}"] = float(np.mean([any(result["retrieval_hits"][:k]) for result in results]))
+    if "answer" in results[0]:
+        summary["exact_match"] = float(np.mean([result["exact_match"] for result in results]))
+        summary["f1"] = float(np.mean([result["f1"] for result in results]))
+        summary["accuracy"] = float(np.mean([result["match"] for result in results]))
+    for name in ("retrieval_ms", "latency_ms"):
+        values = np.array([result[name] for result in results])
+        summary[name] = {"mean": float(values.mean()), "p50": float(np.percentile(values, 50)),
+                         "p95": float(np.percentile(values, 95))}
+    return summary
+
+
+def run_evaluation(
+    rag,
+    llm,
+    data: list,
+    checkpoint_path: str = CHECKPOINT_PATH,
+    signature: dict = None,
+    batch_size: int = BATCH_SIZE,
+    workers: int = 1,
+    top_k: int = 3,
+    max_length: int = 128,
+    retrieval_mode: str = RETRIEVAL_MODE
+) -> tuple:
+    """
+    Chạy bộ câu hỏi qua pipeline bằng nhiều luồng làm việc, ghi kết quả từng lô vào checkpoint.
+
+    Câu hỏi đã có kết quả trong checkpoint (cùng signature) được bỏ qua, nên chạy lại sau
+    khi bị dừng sẽ tiếp tục từ chỗ đã dừng.
+
+    Args:
+        rag: RagSystem dùng để truy xuất.
+        llm: LLMGenerator (None: chỉ đánh giá bước truy xuất, không tải LLM).
+        data (list): Danh sách câu hỏi dạng {"question", "reference_answer"}.
+        checkpoint_path (str): File JSON lines lưu kết quả từng câu hỏi.
+        signature (dict, optional): Cấu hình của lần chạy; chỉ kết quả cùng cấu hình mới được dùng lại.
+        batch_size (int): Số câu hỏi trong một lô.
+        workers (int): Số luồng xử lý các lô song song.
+        top_k (int): Số đoạn truy xuất cho mỗi câu hỏi.
+        max_length (int): Độ dài tối đa của câu trả lời.
+        retrieval_mode (str): "dense", "sparse" hoặc "hybrid".
+
+    Returns:
+        tuple: (kết quả theo thứ tự câu hỏi, bảng tổng hợp).
+    """
+    signature = signature or {}
+    done = load_checkpoint(checkpoint_path, signature)
+    pending = [(index, item["question"], item["reference_answer"])
+               for index, item in enumerate(data) if index not in done]
+    print(f"Đã có {len(done)}/{len(data)} câu hỏi trong checkpoint, còn {len(pending)} câu.")
+
+    os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint_file, \
+            ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [
+            executor.submit(evaluate_batch, rag, llm, pending[start:start + batch_size], top_k, max_length, retrieval_mode)
+            for start in range(0, len(pending), batch_size)
+        ]
+        for future in as_completed(futures):
+            # Chỉ luồng chính ghi checkpoint, từng lô xong được ghi và flush ngay
+            for index, result in future.result():
+                done[index] = result
+                checkpoint_file.write(json.dumps(
+                    {"index": index, "signature": signature, "result": result}, ensure_ascii=False
+                ) + "\n")
+            checkpoint_file.flush()
+            print(f"Đã chấm {len(done)}/{len(data)} câu hỏi.")
+
+    results = [done[index] for index in range(len(data))]
+    return results, summarize(results, top_k)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Đánh giá pipeline RAG: EM, F1, recall@k của truy xuất và độ trễ từng câu hỏi.")
+    parser.add_argument("--questions", default=TEST_DATA_PATH)
+    parser.add_argument("--llm-model", default=LLM_MODEL)
+    parser.add_argument("--embedding-model", default=EMBEDDING_MODEL)
+    parser.add_argument("--retrieval-only", action="store_true", help="Chỉ đánh giá bước truy xuất (không tải LLM).")
+    parser.add_argument("--retrieval-mode", default=RETRIEVAL_MODE, choices=("dense", "sparse", "hybrid"))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--max-length", type=int, default=128)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--fresh", action="store_true", help="Bỏ checkpoint cũ và chấm lại từ đầu.")
+    parser.add_argument("--output", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    with open(args.questions, "r", encoding="utf-8") as input_file:
+        data = json.load(input_file)
+    if args.fresh and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    # Chế độ chỉ truy xuất không import/tải LLM
+    if args.retrieval_only:
+        from rag_system import RagSystem
+        llm = None
+        rag = RagSystem(
+            args.embedding_model, CHUNK_SIZE, embedding_cache_dir=EMBEDDING_CACHE_DIR,
+            embedding_precision=CPU_PRECISION, embedding_backend=EMBEDDING_BACKEND,
+            retrieval_mode=args.retrieval_mode
+        )
+    else:
+        from llm_generator import LLMGenerator
+        llm = LLMGenerator(
+            model_name=args.llm_model,
+            embedding_model=args.embedding_model,
+            use_rag=True,
+            embedding_cache_dir=EMBEDDING_CACHE_DIR,
+            cpu_precision=CPU_PRECISION,
+            prefix_cache_bytes=PREFIX_CACHE_BYTES,
+            num_threads=NUM_THREADS,
+            num_interop_threads=NUM_INTEROP_THREADS,
+            retrieval_mode=args.retrieval_mode,
+            embedding_backend=EMBEDDING_BACKEND
+        )
+        rag = llm.rag
+
+    signature = {
+        "questions": os.path.abspath(args.questions),
+        "llm_model": None if args.retrieval_only else args.llm_model,
+        "embedding_model": args.embedding_model,
+        "retrieval_mode": args.retrieval_mode,
+        "top_k": args.top_k,
+        "max_length": args.max_length,
+        "cpu_precision": CPU_PRECISION,
+        "embedding_backend": EMBEDDING_BACKEND,
+    }
+    start = time.perf_counter()
+    results, summary = run_evaluation(
+        rag, llm, data, args.checkpoint, signature, args.batch_size, args.workers,
+        args.top_k, args.max_length, args.retrieval_mode
+    )
+    summary["seconds"] = time.perf_counter() - start
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as report_file:
+        json.dump({"config": signature, "summary": summary, "results": results}, report_file, ensure_ascii=False, indent=2)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
@@ -1,14 +1,66 @@
+import os
 import json
 import re
+import unicodedata
+from collections import Counter
 
 # Đường dẫn đến các file
-REFERENCE_DATA_PATH = "./data/questions.json"
+DATA_DIR = os.getenv("DATA_DIR", "data")
+REFERENCE_DATA_PATH = os.path.join(DATA_DIR, "questions.json")
 PREDICTION_PATH = "./system_output/system_output.txt"
 
 def clean_text(text):
     text = text.strip().lower()
     return text
 
+def is_match(reference, prediction):
+    """
+    So khớp câu trả lời dự đoán với câu trả lời tham chiếu (khớp chính xác hoặc một phần).
+    """
+    ref_clean = clean_text(reference)
+    pred_clean = clean_text(prediction)
+    return ref_clean == pred_clean or ref_clean in pred_clean or pred_clean in ref_clean
+
+def normalize_answer(text):
+    """
+    Chuẩn hóa câu trả lời cho exact match/F1: NFC, chữ thường, bỏ dấu câu, gộp khoảng trắng.
+    """
+    text = unicodedata.normalize("NFC", text).lower()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return " ".join(text.split())
+
+def exact_match(reference, prediction):
+    """
+    Câu trả lời dự đoán trùng khớp hoàn toàn với tham chiếu sau khi chuẩn hóa.
+    """
+    return normalize_answer(reference) == normalize_answer(prediction)
+
+def token_f1(reference, prediction):
+    """
+    F1 theo token (âm tiết) giữa câu trả lời dự đoán và tham chiếu.
+    """
+    reference_tokens = normalize_answer(reference).split()
+    prediction_tokens = normalize_answer(prediction).split()
+    if not reference_tokens or not prediction_tokens:
+        return float(reference_tokens == prediction_tokens)
+    common = sum((Counter(reference_tokens) & Counter(prediction_tokens)).values())
+    if common == 0:
+        return 0.0
+    precision = common / len(prediction_tokens)
+    recall = common / len(reference_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+def compute_accuracy(reference_answers, predicted_answers):
+    """
+    Tính độ chính xác (%) của danh sách câu trả lời dự đoán.
+
+    Returns:
+        tuple: (độ chính xác theo %, số câu đúng, tổng số câu).
+    """
+    correct = sum(is_match(ref, pred) for ref, pred in zip(reference_answers, predicted_answers))
+    total = len(reference_answers)
+    return (correct / total) * 100 if total else 0.0, correct, total
+
 def evaluate_model():
     # Đọc dữ liệu tham chiếu từ questions.json
     try:
@@ -54,10 +106,8 @@ def evaluate_model():
     correct = 0
     total = len(reference_answers)
     for idx, (ref, pred) in enumerate(zip(reference_answers, predicted_answers)):
-        ref_clean = clean_text(ref)
-        pred_clean = clean_text(pred)
         # Logic khớp lệnh được sửa đổi để xử lý các khớp lệnh một phần như đã chỉ định
-        match = ref_clean == pred_clean or ref_clean in pred_clean or pred_clean in ref_clean
+        match = is_match(ref, pred)
         result = "✅ Đúng" if match else "❌ Sai"
         if match:
             correct += 1
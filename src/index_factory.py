@@ -0,0 +1,216 @@
+import os
+import json
+import math
+import faiss
+import numpy as np
+
+# Các loại chỉ mục FAISS được hỗ trợ
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+
+def index_config_path(index_path: str) -> str:
+    """
+    Trả về đường dẫn file cấu hình lưu kèm chỉ mục (faiss_index.bin -> faiss_index.json).
+    """
+    return os.path.splitext(index_path)[0] + ".json"
+
+
+def _default_nlist(num_vectors: int) -> int:
+    # FAISS cần khoảng 39 điểm huấn luyện cho mỗi centroid
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+
+def build_faiss_index(
+    embeddings: np.ndarray,
+    index_type: str = "flat",
+    ids: np.ndarray = None,
+    nlist: int = None,
+    hnsw_m: int = 32,
+    ef_construction: int = 200,
+    pq_m: int = 64,
+    pq_nbits: int = 8
+) -> tuple:
+    """
+    Tạo chỉ mục FAISS theo loại được chọn và thêm các vector nhúng vào.
+
+    Args:
+        embeddings (np.ndarray): Ma trận vector nhúng float32.
+        index_type (str): Một trong "flat", "ivf_flat", "hnsw", "ivf_pq".
+        ids (np.ndarray, optional): ID int64 cho từng vector. Nếu có, chỉ mục được ánh xạ ID
+            (IndexIDMap2 với flat/HNSW, add_with_ids với IVF) để có thể xóa/thêm từng vector.
+        nlist (int, optional): Số centroid cho IVF (mặc định: ~4*sqrt(N)).
+        hnsw_m (int): Số láng giềng mỗi nút của đồ thị HNSW.
+        ef_construction (int): Độ rộng tìm kiếm khi xây dựng HNSW.
+        pq_m (int): Số sub-quantizer của PQ (phải chia hết số chiều).
+        pq_nbits (int): Số bit cho mỗi mã PQ.
+
+    Returns:
+        tuple: (chỉ mục FAISS, dict cấu hình để lưu kèm chỉ mục).
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    index, config = create_faiss_index(
+        embeddings, index_type, id_mapped=ids is not None, nlist=nlist, hnsw_m=hnsw_m,
+        ef_construction=ef_construction, pq_m=pq_m, pq_nbits=pq_nbits
+    )
+    if ids is None:
+        index.add(embeddings)
+    else:
+        index.add_with_ids(embeddings, np.ascontiguousarray(ids, dtype='int64'))
+    config["ntotal"] = index.ntotal
+    return index, config
+
+
+def create_faiss_index(
+    training_vectors: np.ndarray,
+    index_type: str = "flat",
+    id_mapped: bool = False,
+    num_vectors: int = None,
+    nlist: int = None,
+    hnsw_m: int = 32,
+    ef_construction: int = 200,
+    pq_m: int = 64,
+    pq_nbits: int = 8
+) -> tuple:
+    """
+    Tạo chỉ mục FAISS rỗng (đã huấn luyện với IVF) để thêm vector dần theo từng phần.
+
+    Args:
+        training_vectors (np.ndarray): Vector float32 dùng để huấn luyện IVF (toàn bộ hoặc một mẫu).
+        index_type (str): Một trong "flat", "ivf_flat", "hnsw", "ivf_pq".
+        id_mapped (bool): Dùng ID tự chọn (add_with_ids), bọc IndexIDMap2 với flat/HNSW.
+        num_vectors (int, optional): Tổng số vector sẽ được thêm, dùng để chọn nlist mặc định
+            (mặc định: số vector huấn luyện).
+        nlist, hnsw_m, ef_construction, pq_m, pq_nbits: Như build_faiss_index.
+
+    Returns:
+        tuple: (chỉ mục FAISS chưa có vector, dict cấu hình).
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"index_type không hợp lệ: {index_type}. Chọn một trong {INDEX_TYPES}")
+
+    training_vectors = np.ascontiguousarray(training_vectors, dtype='float32')
+    num_training, dimension = training_vectors.shape
+    num_vectors = num_vectors or num_training
+    config = {"index_type": index_type, "dimension": dimension}
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+        config.update({"hnsw_m": hnsw_m, "ef_construction": ef_construction, "ef_search": 64})
+    else:
+        nlist = nlist or min(_default_nlist(num_vectors), max(1, num_training // 39))
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        else:
+            if dimension % pq_m != 0:
+                raise ValueError(f"pq_m={pq_m} phải chia hết số chiều {dimension}")
+            # Mỗi sub-quantizer cần khoảng 39 điểm huấn luyện cho mỗi trong 2^nbits centroid
+            pq_nbits = min(pq_nbits, max(1, int(math.log2(max(2, num_training // 39)))))
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_nbits)
+            config.update({"pq_m": pq_m, "pq_nbits": pq_nbits})
+        index.train(training_vectors)
+        config.update({"nlist": nlist, "nprobe": min(nlist, 8)})
+
+    if id_mapped:
+        if index_type in ("flat", "hnsw"):
+            index = faiss.IndexIDMap2(index)
+        config["id_mapped"] = True
+    set_search_params(index, nprobe=config.get("nprobe"), ef_search=config.get("ef_search"))
+    return index, config
+
+
+def supports_removal(config: dict) -> bool:
+    """
+    Kiểm tra chỉ mục có thể xóa vector theo ID hay không (HNSW không hỗ trợ xóa).
+    """
+    return bool(config.get("id_mapped")) and config.get("index_type") != "hnsw"
+
+
+def set_search_params(index, nprobe: int = None, ef_search: int = None) -> None:
+    """
+    Thiết lập tham số tìm kiếm (nprobe cho IVF, efSearch cho HNSW) nếu chỉ mục hỗ trợ.
+
+    Args:
+        index: Chỉ mục FAISS (có thể được bọc bởi IndexIDMap).
+        nprobe (int, optional): Số cụm IVF được duyệt khi tìm kiếm.
+        ef_search (int, optional): Độ rộng hàng đợi khi tìm kiếm HNSW.
+    """
+    parameter_space = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        if value is None:
+            continue
+        try:
+            parameter_space.set_index_parameter(index, name, value)
+        except RuntimeError:
+            # Tham số không áp dụng cho loại chỉ mục này (ví dụ nprobe với HNSW)
+            pass
+
+
+def search_parameters(config: dict, selector=None):
+    """
+    Tạo tham số tìm kiếm cho một lần gọi index.search (ví dụ để lọc ID bằng selector).
+
+    Tham số truyền theo lời gọi ghi đè tham số của chỉ mục, nên nprobe/efSearch hiện tại
+    trong config được chép lại để kết quả giống tìm kiếm không lọc.
+
+    Args:
+        config (dict): Cấu hình chỉ mục (loại chỉ mục, nprobe, ef_search).
+        selector (faiss.IDSelector, optional): Chỉ xét các ID được selector chấp nhận.
+
+    Returns:
+        faiss.SearchParameters: Tham số phù hợp với loại chỉ mục.
+    """
+    index_type = config.get("index_type", "flat")
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=config.get("nprobe", 1))
+    if index_type == "hnsw":
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=config.get("ef_search", 16))
+    return faiss.SearchParameters(sel=selector)
+
+
+def save_index(index, index_path: str, config: dict) -> None:
+    """
+    Lưu chỉ mục FAISS cùng file cấu hình JSON bên cạnh.
+
+    Args:
+        index: Chỉ mục FAISS.
+        index_path (str): Đường dẫn file chỉ mục.
+        config (dict): Cấu hình chỉ mục (loại, tham số xây dựng và tìm kiếm).
+    """
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    faiss.write_index(index, index_path)
+    config = dict(config, ntotal=index.ntotal)
+    with open(index_config_path(index_path), "w", encoding="utf-8") as config_file:
+        json.dump(config, config_file, ensure_ascii=False, indent=2)
+
+
+def load_index(index_path: str, nprobe: int = None, ef_search: int = None) -> tuple:
+    """
+    Tải chỉ mục FAISS và áp dụng tham số tìm kiếm đã lưu (hoặc tham số được truyền vào).
+
+    Args:
+        index_path (str): Đường dẫn file chỉ mục.
+        nprobe (int, optional): Ghi đè nprobe đã lưu.
+        ef_search (int, optional): Ghi đè efSearch đã lưu.
+
+    Returns:
+        tuple: (chỉ mục FAISS, dict cấu hình).
+    """
+    index = faiss.read_index(index_path)
+
+    # Chỉ mục cũ không có file cấu hình đi kèm là IndexFlatL2
+    config = {"index_type": "flat", "dimension": index.d}
+    config_path = index_config_path(index_path)
+    if os.path.exists(config_path):
+        with open(config_path, "r", encoding="utf-8") as config_file:
+            config = json.load(config_file)
+
+    if nprobe is not None:
+        config["nprobe"] = nprobe
+    if ef_search is not None:
+        config["ef_search"] = ef_search
+    set_search_params(index, nprobe=config.get("nprobe"), ef_search=config.get("ef_search"))
+    return index, config
@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from embedding import Embedding
+from crawl_data import in_source_order, iter_crawl, read_source_urls
+from chunk_store import ChunkStore, ChunkStoreWriter, replace_chunk_store
+from bm25_index import build_bm25_index, replace_bm25_index
+from dedup import Deduplicator, dedup_documents
+from data_processor import (
+    BM25_PATH, CHUNK_OVERLAP, CHUNK_SIZE, CHUNK_STORE_PATH, CRAWLED_RECORDS_PATH, DATA_DIR,
+    EMBEDDING_CACHE_DIR, EMBEDDING_MODEL, EMBED_BATCH_SIZE, INDEX_TYPE, create_index_for_parts, document_hash,
+    save_store, source_metadata
+)
+
+# Tải biến môi trường từ file .env
+load_dotenv()
+
+# Định nghĩa các hằng số
+SOURCE_PATH = os.path.join(DATA_DIR, "data_source.csv")
+# Tài liệu đã làm sạch được ghi riêng, không ghi đè data.txt (dữ liệu biên soạn tay)
+INGESTED_FILE_PATH = os.path.join(DATA_DIR, "ingested.txt")
+VECTOR_SPOOL_PATH = os.path.join(DATA_DIR, "ingest_vectors.f32")
+# Kho đoạn và chỉ mục BM25 mới được ghi dưới tiền tố tạm, chỉ thay bản đang phục vụ khi đã tạo xong
+STAGING_SUFFIX = ".ingest"
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "64"))
+INDEX_ADD_BLOCK = 65536
+
+# Đánh dấu kết thúc luồng dữ liệu giữa các bước
+_END = object()
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def threaded(iterable, maxsize: int = QUEUE_SIZE):
+    """
+    Chạy một generator trong luồng riêng, chuyển kết quả qua hàng đợi có giới hạn.
+
+    Bước phía trước bị chặn khi hàng đợi đầy nên bộ nhớ không tăng theo kích thước dữ liệu;
+    lỗi trong luồng được ném lại ở phía tiêu thụ.
+    """
+    items = queue.Queue(maxsize=maxsize)
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put(item)
+        except BaseException as e:
+            items.put(_StageError(e))
+            return
+        items.put(_END)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = items.get()
+        if item is _END:
+            return
+        if isinstance(item, _StageError):
+            raise item.error
+        yield item
+
+
+def crawl_documents(urls, **crawl_options):
+    """
+    Bước crawl: trả về từng trang tải được (theo thứ tự URL nguồn) kèm URL nguồn và thời điểm crawl.
+    """
+    for record in in_source_order(iter_crawl(urls, **crawl_options)):
+        if record["text"] is None:
+            print(f"Failed to crawl: {record['url']}")
+            continue
+        yield {"url": record["url"], "crawled_at": record["crawled_at"], "text": record["text"]}
+
+
+def clean_documents(documents):
+    """
+    Bước làm sạch: gộp khoảng trắng/dòng trống thừa, bỏ trang rỗng và trang trùng nội dung.
+    """
+    seen_hashes = set()
+    for document in documents:
+        text = " ".join(document["text"].split())
+        if not text:
+            continue
+        doc_hash = document_hash(text)
+        if doc_hash in seen_hashes:
+            continue
+        seen_hashes.add(doc_hash)
+        yield dict(document, text=text, document=doc_hash)
+
+
+def record_documents(documents, text_file, records_file, document_hashes: list):
+    """
+    Ghi từng tài liệu đã làm sạch vào file văn bản (phân cách bởi dòng trống, giống data.txt) và
+    file JSON lines kèm nguồn (giống crawled.jsonl) rồi chuyển tiếp cho bước sau.
+
+    Nội dung được ghi đúng như khi tính mã băm trong manifest, nên
+    `data_processor.py --incremental` trên file này nhận ra các tài liệu chưa thay đổi. Mã băm
+    của từng tài liệu được thêm vào document_hashes (kể cả tài liệu không tạo ra đoạn nào).
+    """
+    for document in documents:
+        document_hashes.append(document["document"])
+        text_file.write(document["text"] + "\n\n")
+        records_file.write(json.dumps(
+            {"url": document["url"], "crawled_at": document["crawled_at"], "text": document["text"]},
+            ensure_ascii=False
+        ) + "\n")
+        yield document
+
+
+def chunk_stream(documents, embedder: Embedding):
+    """
+    Bước chia đoạn: trả về từng (đoạn, metadata) với nguồn gốc (URL, domain, thời điểm crawl, mã băm tài liệu).
+    """
+    for document in documents:
+        metadata = dict(source_metadata(document["url"], document["crawled_at"]), document=document["document"])
+        for chunk in embedder.chunk_text(document["text"]):
+            yield chunk, metadata
+
+
+def embed_stream(chunk_items, embedder: Embedding, batch_size: int = EMBED_BATCH_SIZE):
+    """
+    Bước nhúng: gom đoạn thành lô batch_size và trả về (đoạn, metadata, ma trận vector) của từng lô.
+    """
+    batch = []
+    for item in chunk_items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield _embed_batch(batch, embedder)
+            batch = []
+    if batch:
+        yield _embed_batch(batch, embedder)
+
+
+def _embed_batch(batch: list, embedder: Embedding) -> tuple:
+    chunks = [chunk for chunk, _ in batch]
+    metadatas = [metadata for _, metadata in batch]
+    return chunks, metadatas, np.asarray(embedder.embedding(chunks), dtype='float32')
+
+
+def ingest(
+    urls,
+    embedding_model: str = EMBEDDING_MODEL,
+    chunk_size: int = CHUNK_SIZE,
+    index_type: str = INDEX_TYPE,
+    index_params: dict = None,
+    batch_size: int = EMBED_BATCH_SIZE,
+    queue_size: int = QUEUE_SIZE,
+    dedup: bool = True,
+    documents_path: str = INGESTED_FILE_PATH,
+    records_path: str = CRAWLED_RECORDS_PATH,
+    **crawl_options
+) -> dict:
+    """
+    Chạy pipeline crawl -> khử trùng lặp -> làm sạch -> chia đoạn -> nhúng -> tạo chỉ mục theo dạng luồng.
+
+    Mỗi bước chạy trong một luồng và truyền dữ liệu qua hàng đợi có giới hạn; đoạn được ghi
+    thẳng vào kho đoạn và vector được ghi tạm xuống đĩa, nên bộ nhớ không phụ thuộc kích thước
+    kho dữ liệu (ngoài bản thân chỉ mục). Kho đoạn và chỉ mục BM25 được ghi ra file tạm và chỉ
+    thay bản cũ sau khi lưu chỉ mục FAISS, nên nếu pipeline lỗi giữa chừng chỉ mục đang phục vụ
+    không bị ảnh hưởng. Kết quả gồm chỉ mục FAISS, kho đoạn (metadata có URL
+    nguồn), chỉ mục BM25 và manifest, sẵn sàng cho RagSystem. Tài liệu đã làm sạch được ghi vào
+    documents_path/records_path với cùng nội dung đã băm trong manifest, nên có thể sửa
+    documents_path rồi cập nhật tăng dần bằng `cli.py build-index --incremental --input <documents_path>`.
+
+    Args:
+        urls: Danh sách (hoặc iterator) URL nguồn.
+        embedding_model (str): Tên mô hình nhúng từ Hugging Face.
+        chunk_size (int): Kích thước tối đa của mỗi đoạn (số token).
+        index_type (str): Loại chỉ mục FAISS ("flat", "ivf_flat", "hnsw", "ivf_pq").
+        index_params (dict, optional): Tham số xây dựng chỉ mục.
+        batch_size (int): Số đoạn trong một lần nhúng.
+        queue_size (int): Kích thước tối đa của hàng đợi giữa hai bước.
+        dedup (bool): Loại boilerplate (menu, footer), đoạn văn và trang trùng lặp trước khi chia đoạn.
+        documents_path (str): File văn bản chứa các tài liệu đã làm sạch (đầu vào của cập nhật tăng dần);
+            mặc định ingested.txt trong DATA_DIR để không ghi đè data.txt.
+        records_path (str): File JSON lines chứa tài liệu đã làm sạch kèm URL và thời điểm crawl.
+        **crawl_options: Tham số của crawl_data.iter_crawl (max_workers, per_host, ...).
+
+    Returns:
+        dict: Thống kê (số tài liệu, số đoạn, thời gian, thống kê khử trùng lặp).
+    """
+    start = time.perf_counter()
+    embedder = Embedding(
+        model_name=embedding_model,
+        chunk_size=chunk_size,
+        cache_dir=EMBEDDING_CACHE_DIR,
+        chunk_overlap=CHUNK_OVERLAP
+    )
+
+    pages = threaded(crawl_documents(urls, **crawl_options), queue_size)
+    deduplicator = Deduplicator() if dedup else None
+    if deduplicator is not None:
+        pages = threaded(dedup_documents(pages, deduplicator), queue_size)
+    documents = threaded(clean_documents(pages), queue_size)
+
+    # Tài liệu được ghi ra file tạm, chỉ thay file cũ khi chỉ mục đã tạo xong
+    os.makedirs(os.path.dirname(VECTOR_SPOOL_PATH) or ".", exist_ok=True)
+    text_file = open(documents_path + ".tmp", "w", encoding="utf-8")
+    records_file = open(records_path + ".tmp", "w", encoding="utf-8")
+    document_hashes = []
+    documents = record_documents(documents, text_file, records_file, document_hashes)
+    chunks = threaded(chunk_stream(documents, embedder), queue_size * batch_size)
+    batches = threaded(embed_stream(chunks, embedder, batch_size), max(1, queue_size // 8))
+
+    # Ghi đoạn vào kho đoạn tạm và vector vào file tạm theo từng lô
+    chunk_store_path = CHUNK_STORE_PATH + STAGING_SUFFIX
+    bm25_path = BM25_PATH + STAGING_SUFFIX
+    writer = ChunkStoreWriter(chunk_store_path)
+    document_chunk_ids = {}
+    with text_file, records_file, open(VECTOR_SPOOL_PATH, "wb") as spool:
+        for batch_chunks, batch_metadatas, vectors in batches:
+            for offset, metadata in enumerate(batch_metadatas):
+                document_chunk_ids.setdefault(metadata["document"], []).append(writer.count + offset)
+            writer.add(batch_chunks, batch_metadatas)
+            spool.write(vectors.tobytes())
+    writer.close()
+    num_chunks = writer.count
+    if num_chunks == 0:
+        raise ValueError("Không có đoạn nào được tạo từ các URL nguồn.")
+
+    # Tạo chỉ mục FAISS từ file vector tạm, thêm theo từng khối
+    vectors = np.memmap(VECTOR_SPOOL_PATH, dtype='float32', mode='r', shape=(num_chunks, embedder.embedding_dimension))
+    faiss_index, index_config = create_index_for_parts([vectors], index_type, index_params)
+    for block_start in range(0, num_chunks, INDEX_ADD_BLOCK):
+        block = np.ascontiguousarray(vectors[block_start:block_start + INDEX_ADD_BLOCK])
+        faiss_index.add_with_ids(block, np.arange(block_start, block_start + len(block)))
+    del vectors
+    os.remove(VECTOR_SPOOL_PATH)
+
+    # Chỉ mục BM25 đọc lại đoạn từ kho đoạn mmap
+    chunk_store = ChunkStore(chunk_store_path)
+    build_bm25_index(bm25_path, chunk_store)
+    chunk_store.close()
+
+    index_config["ntotal"] = faiss_index.ntotal
+    # Tài liệu không tạo ra đoạn nào vẫn có trong manifest (giống data_processor)
+    for doc_hash in document_hashes:
+        document_chunk_ids.setdefault(doc_hash, [])
+    manifest = {
+        "embedding_model": embedding_model,
+        "chunk_size": chunk_size,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "next_id": num_chunks,
+        "documents": document_chunk_ids
+    }
+    save_store(faiss_index, index_config, manifest)
+    replace_chunk_store(chunk_store_path, CHUNK_STORE_PATH)
+    replace_bm25_index(bm25_path, BM25_PATH)
+    os.replace(documents_path + ".tmp", documents_path)
+    os.replace(records_path + ".tmp", records_path)
+
+    stats = {
+        "documents": len(document_chunk_ids),
+        "chunks": num_chunks,
+        "seconds": time.perf_counter() - start,
+    }
+    if deduplicator is not None:
+        stats["dedup"] = deduplicator.stats
+        print(f"Khử trùng lặp: bỏ {deduplicator.stats['duplicate_pages']} trang trùng lặp, "
+              f"{deduplicator.stats['boilerplate_words']}/{deduplicator.stats['words']} từ boilerplate, "
+              f"{deduplicator.stats['duplicate_paragraphs']} đoạn văn trùng lặp.")
+    print(f"Đã tạo chỉ mục ({index_type}) từ {stats['documents']} tài liệu, {stats['chunks']} chunks "
+          f"trong {stats['seconds']:.1f}s.")
+    return stats
+
+
+if __name__ == "__main__":
+    # Tạo thư mục logs nếu chưa tồn tại
+    os.makedirs("logs", exist_ok=True)
+
+    # Chuyển hướng stdout và stderr vào file log
+    output_log = open("logs/ingest_output.log", "w", encoding="utf-8")
+    error_log = open("logs/ingest_error.log", "w", encoding="utf-8")
+    sys.stdout = output_log
+    sys.stderr = error_log
+
+    # Từ data_source.csv tới chỉ mục sẵn sàng phục vụ trong một lệnh
+    ingest(read_source_urls(SOURCE_PATH))
+
+    output_log.close()
+    error_log.close()
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import threading
+from dotenv import load_dotenv
+
+# Tải biến môi trường từ file .env
+load_dotenv()
+
+# Biên trên (ms) của các bucket histogram thời gian
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class _NullSpan:
+    # Span rỗng dùng chung khi tắt instrumentation (không cấp phát, không đo thời gian)
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set(self, **attributes) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, instrumentation, name: str, attributes: dict):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        self.instrumentation.observe(f"{self.name}_ms", elapsed_ms)
+        self.instrumentation.emit(
+            "span", name=self.name, ms=elapsed_ms, error=exc_type.__name__ if exc_type else None, **self.attributes
+        )
+        return False
+
+    def set(self, **attributes) -> None:
+        """
+        Gắn thêm thuộc tính cho span (ví dụ số token) trước khi span kết thúc.
+        """
+        self.attributes.update(attributes)
+
+
+class Instrumentation:
+    def __init__(self, enabled: bool = False, jsonl_path: str = None, buckets_ms: tuple = DEFAULT_BUCKETS_MS):
+        """
+        Bộ ghi nhận span thời gian, counter, histogram và sự kiện cho các bước của pipeline.
+
+        Khi enabled=False mọi lời gọi trả về ngay (span là đối tượng rỗng dùng chung).
+        Bản ghi span/sự kiện được ghi ra file JSON lines (nếu có) và chuyển cho các hook;
+        counter và histogram được xuất dạng dict hoặc văn bản Prometheus.
+
+        Args:
+            enabled (bool): Bật ghi nhận.
+            jsonl_path (str, optional): File JSON lines nhận các bản ghi span và sự kiện.
+            buckets_ms (tuple): Biên trên các bucket histogram.
+        """
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.buckets_ms = tuple(buckets_ms)
+        self.hooks = []
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._jsonl_file = None
+
+    def configure(self, enabled: bool = None, jsonl_path: str = None) -> None:
+        """
+        Bật/tắt ghi nhận hoặc đổi file JSON lines khi đang chạy.
+        """
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if jsonl_path is not None and jsonl_path != self.jsonl_path:
+                if self._jsonl_file is not None:
+                    self._jsonl_file.close()
+                    self._jsonl_file = None
+                self.jsonl_path = jsonl_path
+
+    def add_hook(self, hook) -> None:
+        """
+        Đăng ký hàm nhận từng bản ghi span/sự kiện (dict), ví dụ để chuyển sang hệ thống tracing khác.
+        """
+        self.hooks.append(hook)
+
+    def span(self, name: str, **attributes):
+        """
+        Đo thời gian một khối lệnh: `with metrics.span("retrieve", mode="dense"):`.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, attributes)
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        """
+        Cộng giá trị vào counter (ví dụ số token, số lần cache hit).
+        """
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        """
+        Ghi một giá trị vào histogram.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = {"buckets": [0] * len(self.buckets_ms), "sum": 0.0, "count": 0}
+            for position, bound in enumerate(self.buckets_ms):
+                if value <= bound:
+                    histogram["buckets"][position] += 1
+                    break
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def emit(self, record_type: str, **fields) -> None:
+        """
+        Ghi một bản ghi (span hoặc sự kiện) ra file JSON lines và các hook.
+        """
+        if not self.enabled:
+            return
+        record = dict(type=record_type, ts=time.time(), **fields)
+        for hook in self.hooks:
+            hook(record)
+        if self.jsonl_path:
+            line = json.dumps(record, ensure_ascii=False, default=str)
+            with self._lock:
+                if self._jsonl_file is None:
+                    os.makedirs(os.path.dirname(self.jsonl_path) or ".", exist_ok=True)
+                    self._jsonl_file = open(self.jsonl_path, "a", encoding="utf-8", buffering=1)
+                self._jsonl_file.write(line + "\n")
+
+    def event(self, name: str, **fields) -> None:
+        """
+        Ghi một sự kiện có dữ liệu (ví dụ ID đoạn và khoảng cách truy xuất được).
+        """
+        self.emit("event", name=name, **fields)
+
+    def snapshot(self) -> dict:
+        """
+        Trả về counter và histogram hiện tại dạng dict.
+        """
+        with self._lock:
+            counters = {}
+            for (name, labels), value in self._counters.items():
+                label_text = ",".join(f"{key}={label}" for key, label in labels)
+                counters[f"{name}{{{label_text}}}" if labels else name] = value
+            histograms = {
+                name: {
+                    "count": histogram["count"],
+                    "sum": histogram["sum"],
+                    "buckets": dict(zip(map(str, self.buckets_ms), histogram["buckets"])),
+                }
+                for name, histogram in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self, prefix: str = "rag_") -> str:
+        """
+        Xuất counter và histogram theo định dạng văn bản của Prometheus.
+        """
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f"{prefix}{name}_total{{{label_text}}} {value}" if labels else f"{prefix}{name}_total {value}")
+            for name, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, bucket in zip(self.buckets_ms, histogram["buckets"]):
+                    cumulative += bucket
+                    lines.append(f'{prefix}{name}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}{name}_bucket{{le="+Inf"}} {histogram["count"]}')
+                lines.append(f"{prefix}{name}_sum {histogram['sum']}")
+                lines.append(f"{prefix}{name}_count {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# Đối tượng dùng chung cho Embedding, RagSystem và LLMGenerator (bật bằng INSTRUMENTATION=1 trong .env)
+metrics = Instrumentation(
+    enabled=os.getenv("INSTRUMENTATION", "0") == "1",
+    jsonl_path=os.getenv("INSTRUMENTATION_LOG") or None
+)
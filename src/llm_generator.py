@@ -1,8 +1,60 @@
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from threading import Lock, Thread
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    TextIteratorStreamer
+)
 
 from dotenv import load_dotenv
-from rag_system import RagSystem
+from rag_system import PROMPT_HEAD, RagSystem, prompt_prefixes
+from answer_cache import AnswerCache
+from prefix_cache import PrefixKVCache
+from cpu_inference import configure_threads, optimize_for_cpu
+from instrumentation import metrics
+
+def first_sentence(text: str) -> tuple:
+    """
+    Cắt văn bản tại dòng mới hoặc ". " đầu tiên (cùng quy tắc với hậu xử lý câu trả lời).
+
+    Args:
+        text (str): Văn bản sinh ra (không gồm prompt).
+
+    Returns:
+        tuple: (câu đầu tiên, True nếu câu đầu tiên đã kết thúc).
+    """
+    text = text.lstrip()
+    positions = [pos for pos in (text.find('\n'), text.find('. ')) if pos != -1]
+    if positions:
+        return text[:min(positions)], True
+    return text, False
+
+
+class FirstSentenceStoppingCriteria(StoppingCriteria):
+    def __init__(self, tokenizer, prompt_length: int):
+        """
+        Dừng sinh cho từng chuỗi ngay khi câu đầu tiên (hoặc dòng đầu tiên) đã hoàn tất,
+        vì phần sau đều bị loại bỏ khi hậu xử lý.
+
+        Args:
+            tokenizer: Tokenizer để giải mã phần token mới sinh.
+            prompt_length (int): Số token của prompt (đã đệm) trong input_ids.
+        """
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.finished = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if self.finished is None:
+            self.finished = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        texts = self.tokenizer.batch_decode(input_ids[:, self.prompt_length:], skip_special_tokens=True)
+        for row, text in enumerate(texts):
+            if not self.finished[row]:
+                self.finished[row] = first_sentence(text)[1]
+        return self.finished.clone()
+
 
 class LLMGenerator:
     def __init__(
@@ -11,7 +63,20 @@ class LLMGenerator:
         model_name: str = "meta-llama/Llama-3.2-1B-Instruct",
         embedding_model: str = "bkai-foundation-models/vietnamese-bi-encoder",
         use_quantization: bool = False,
-        device: str = "cuda" if torch.cuda.is_available() else "cpu"
+        device: str = "cuda" if torch.cuda.is_available() else "cpu",
+        rag_system: RagSystem = None,
+        embedding_cache_dir: str = None,
+        stop_at_first_sentence: bool = True,
+        answer_cache: AnswerCache = None,
+        prefix_cache_bytes: int = 0,
+        cpu_precision: str = None,
+        num_threads: int = None,
+        num_interop_threads: int = None,
+        retrieval_mode: str = "dense",
+        reranker=None,
+        embedding_backend: str = "torch",
+        assistant_model_name: str = None,
+        num_assistant_tokens: int = None
     ):
         """
         Khởi tạo đối tượng LLMGenerator để tạo văn bản với hoặc không dùng RAG.
@@ -20,21 +85,52 @@ class LLMGenerator:
             use_rag (bool): Sử dụng hệ thống RAG hay không (mặc định: True).
             model_name (str): Tên mô hình LLM từ Hugging Face.
             embedding_model (str): Tên mô hình nhúng cho RAG.
-            use_quantization (bool): Sử dụng quantization 4-bit để giảm bộ nhớ.
+            use_quantization (bool): Sử dụng quantization 4-bit để giảm bộ nhớ (chỉ trên GPU).
             device (str): Thiết bị chạy mô hình (mặc định: "cuda" nếu có GPU, nếu không thì "cpu").
+            rag_system (RagSystem, optional): Hệ thống RAG có sẵn để dùng chung (tránh tải lại mô hình nhúng).
+            embedding_cache_dir (str, optional): Thư mục cache vector nhúng khi tự tạo RagSystem.
+            stop_at_first_sentence (bool): Dừng sinh khi câu đầu tiên đã hoàn tất.
+            answer_cache (AnswerCache, optional): Cache câu trả lời (khớp chính xác và ngữ nghĩa)
+                dùng khi bật RAG.
+            prefix_cache_bytes (int): Dung lượng tối đa của KV cache cho các prefix prompt dùng chung
+                (0: tắt). generate_text và generate_stream dùng prefix dài nhất (kể cả khối ngữ cảnh),
+                generate_batch dùng chung KV của phần mở đầu cố định cho cả lô.
+            cpu_precision (str, optional): Chế độ suy luận trên CPU cho cả LLM và mô hình nhúng:
+                "fp32", "bf16" (nếu CPU hỗ trợ) hoặc "int8" (dynamic quantization).
+            num_threads (int, optional): Số luồng intra-op của PyTorch.
+            num_interop_threads (int, optional): Số luồng inter-op của PyTorch.
+            retrieval_mode (str): Chế độ truy xuất khi tự tạo RagSystem ("dense", "sparse", "hybrid").
+            reranker (CrossEncoderReranker, optional): Bước sắp xếp lại ứng viên khi tự tạo RagSystem.
+            embedding_backend (str): Backend của mô hình nhúng khi tự tạo RagSystem ("torch", "onnx").
+            assistant_model_name (str, optional): Mô hình nháp nhỏ cho assisted decoding: mô hình nháp
+                đề xuất nhiều token, mô hình chính kiểm tra chúng trong một lần chạy. Khi bật, việc
+                sinh dùng greedy decoding (kết quả giống greedy thông thường) và mỗi lô chỉ có một prompt.
+            num_assistant_tokens (int, optional): Số token nháp ban đầu mỗi lượt (mặc định của transformers).
         """
         load_dotenv()
 
+        # Cấu hình số luồng trước khi tải mô hình
+        configure_threads(num_threads, num_interop_threads)
+
         # Khởi tạo các thuộc tính
         self.model_name = model_name
         self.embedding_model = embedding_model
         self.use_rag = use_rag
         self.device = device
         self.use_quantization = use_quantization
+        self.stop_at_first_sentence = stop_at_first_sentence
+        self.answer_cache = answer_cache
 
         # Khởi tạo hệ thống RAG nếu được bật
         if self.use_rag:
-            self.rag = RagSystem(model_name=self.embedding_model)
+            self.rag = rag_system or RagSystem(
+                model_name=self.embedding_model,
+                embedding_cache_dir=embedding_cache_dir,
+                embedding_precision=cpu_precision,
+                retrieval_mode=retrieval_mode,
+                reranker=reranker,
+                embedding_backend=embedding_backend
+            )
 
         print(f"Using LLM model for generation: {self.model_name}")
         print(f"Running on device: {self.device}")
@@ -48,6 +144,10 @@ class LLMGenerator:
                 self.model_name,
                 trust_remote_code=True
             )
+            # Llama không có pad token; dùng eos và đệm bên trái để sinh theo lô
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
+            self.tokenizer.padding_side = "left"
             print("Tokenizer loaded.")
         except Exception as e:
             print(f"Error loading tokenizer: {e}")
@@ -79,6 +179,26 @@ class LLMGenerator:
             print(f"Error loading model: {e}")
             raise
 
+        # Lượng tử hóa int8 hoặc chuyển sang bf16 khi chạy trên CPU
+        self.cpu_precision = None
+        if cpu_precision and self.device == "cpu":
+            self.model, self.cpu_precision = optimize_for_cpu(self.model, cpu_precision)
+            print(f"CPU inference precision: {self.cpu_precision}")
+
+        self.prefix_cache = PrefixKVCache(self.model, prefix_cache_bytes) if prefix_cache_bytes > 0 else None
+
+        # Mô hình nháp cho assisted decoding
+        self.assistant_model = None
+        self.assistant_kwargs = {}
+        self.assisted_stats = {"generations": 0, "main_passes": 0, "draft_tokens": 0, "new_tokens": 0}
+        self._active_assisted = 0
+        self._stats_lock = Lock()
+        if assistant_model_name:
+            if self.prefix_cache is not None:
+                raise ValueError("Assisted decoding không dùng chung được với prefix cache (prefix_cache_bytes).")
+            self._load_assistant(assistant_model_name, num_assistant_tokens, cpu_precision)
+
+    @torch.inference_mode()
     def generate_text(self, input_prompt: str, max_length: int = 128, use_rag: bool = None) -> dict:
         """
         Tạo văn bản dựa trên prompt với hoặc không dùng RAG.
@@ -94,9 +214,12 @@ class LLMGenerator:
         # Xác định xem có dùng RAG hay không
         should_use_rag = self.use_rag if use_rag is None else use_rag
 
-        # Tăng cường prompt bằng RAG nếu cần
+        # Tăng cường prompt bằng RAG nếu cần (trả về ngay nếu câu hỏi đã có trong cache)
         if should_use_rag:
-            rag_prompt = self.rag.rag_query(input_prompt)
+            cached_results, query_embeddings = self._lookup_answer_cache([input_prompt], max_length)
+            if cached_results[0] is not None:
+                return cached_results[0]
+            rag_prompt = self.rag.rag_query_batch([input_prompt], query_embeddings=query_embeddings)[0]
             final_prompt = rag_prompt
         else:
             final_prompt = input_prompt
@@ -109,15 +232,366 @@ class LLMGenerator:
             model_inputs = {k: v.to(self.device) for k, v in model_inputs.items()}
 
         # Tạo văn bản
+        prompt_length = model_inputs["input_ids"].shape[1]
         try:
-            output = self.model.generate(**model_inputs, max_new_tokens=max_length)
-            print("Output:", output)
+            with metrics.span("generate", prompts=1, tokens_in=prompt_length) as span:
+                output = self._generate(
+                    **model_inputs,
+                    max_new_tokens=max_length,
+                    stopping_criteria=self._stopping_criteria(prompt_length),
+                    **self._prefix_cache_kwargs(final_prompt, model_inputs["input_ids"])
+                )
+                span.set(tokens_out=output.shape[1] - prompt_length)
         except Exception as e:
             print(f"Error generating text: {e}")
             raise
-        
+        metrics.count("tokens_in", prompt_length)
+        metrics.count("tokens_out", output.shape[1] - prompt_length)
+
         generated_answer = self.tokenizer.decode(output[0], skip_special_tokens=True)
-        
+
+        result = {
+            "rag_prompt": final_prompt,
+            "rag_answer": self._extract_answer(generated_answer)
+        }
+        if should_use_rag and self.answer_cache is not None:
+            self.answer_cache.put(input_prompt, result, query_embeddings[0], max_length=max_length)
+        return result
+
+    @torch.inference_mode()
+    def generate_batch(
+        self,
+        input_prompts: list,
+        batch_size: int = 8,
+        max_length: int = 128,
+        use_rag: bool = None,
+        use_answer_cache: bool = True
+    ) -> list:
+        """
+        Tạo văn bản cho nhiều prompt cùng lúc, mỗi lô chạy một lần model.generate.
+
+        Các prompt được sắp xếp theo độ dài token để giảm phần đệm (đệm bên trái),
+        kết quả được trả về đúng thứ tự đầu vào.
+
+        Args:
+            input_prompts (list): Danh sách prompt đầu vào.
+            batch_size (int): Số prompt tối đa trong một lô.
+            max_length (int): Độ dài tối đa của văn bản được tạo.
+            use_rag (bool, optional): Sử dụng RAG hay không (nếu None, dùng giá trị self.use_rag).
+            use_answer_cache (bool): Tra cứu và lưu cache câu trả lời (False khi chạy thử mô hình).
+
+        Returns:
+            list: Danh sách dict gồm rag_prompt và rag_answer, cùng thứ tự với input_prompts.
+        """
+        should_use_rag = self.use_rag if use_rag is None else use_rag
+        input_prompts = list(input_prompts)
+        if not input_prompts:
+            return []
+
+        # Tăng cường prompt bằng RAG cho các câu hỏi chưa có trong cache
+        if should_use_rag:
+            results, query_embeddings = self._lookup_answer_cache(input_prompts, max_length, use_answer_cache)
+            pending = [i for i, result in enumerate(results) if result is None]
+            augmented = self.rag.rag_query_batch(
+                [input_prompts[i] for i in pending], query_embeddings=query_embeddings[pending]
+            )
+            final_prompts = dict(zip(pending, augmented))
+        else:
+            results = [None] * len(input_prompts)
+            pending = list(range(len(input_prompts)))
+            final_prompts = dict(enumerate(input_prompts))
+
+        if not pending:
+            return results
+
+        # Assisted decoding của transformers chỉ hỗ trợ lô một prompt
+        if self.assistant_model is not None:
+            batch_size = 1
+
+        # Mã hóa một lần, sắp xếp theo độ dài để các prompt trong cùng lô có độ dài gần nhau
+        encoded_prompts = dict(zip(pending, self.tokenizer([final_prompts[i] for i in pending])["input_ids"]))
+        order = sorted(pending, key=lambda i: len(encoded_prompts[i]))
+
+        for start in range(0, len(order), batch_size):
+            batch_indices = order[start:start + batch_size]
+            model_inputs, prefix_kwargs = self._batch_prefix_inputs([encoded_prompts[i] for i in batch_indices])
+            if model_inputs is None:
+                model_inputs = self.tokenizer.pad(
+                    {"input_ids": [encoded_prompts[i] for i in batch_indices]},
+                    padding=True,
+                    return_tensors="pt"
+                )
+
+            if self.device == "cuda":
+                model_inputs = {k: v.to(self.device) for k, v in model_inputs.items()}
+
+            prompt_length = model_inputs["input_ids"].shape[1]
+            try:
+                with metrics.span("generate", prompts=len(batch_indices)) as span:
+                    output = self._generate(
+                        **model_inputs,
+                        max_new_tokens=max_length,
+                        pad_token_id=self.tokenizer.pad_token_id,
+                        stopping_criteria=self._stopping_criteria(prompt_length),
+                        **prefix_kwargs
+                    )
+                    if metrics.enabled:
+                        tokens_in = int(model_inputs["attention_mask"].sum())
+                        tokens_out = int((output[:, prompt_length:] != self.tokenizer.pad_token_id).sum())
+                        span.set(tokens_in=tokens_in, tokens_out=tokens_out)
+                        metrics.count("tokens_in", tokens_in)
+                        metrics.count("tokens_out", tokens_out)
+            except Exception as e:
+                print(f"Error generating text: {e}")
+                raise
+
+            generated_answers = self.tokenizer.batch_decode(output, skip_special_tokens=True)
+            for i, generated_answer in zip(batch_indices, generated_answers):
+                results[i] = {
+                    "rag_prompt": final_prompts[i],
+                    "rag_answer": self._extract_answer(generated_answer)
+                }
+                if should_use_rag and use_answer_cache and self.answer_cache is not None:
+                    self.answer_cache.put(input_prompts[i], results[i], query_embeddings[i], max_length=max_length)
+
+        return results
+
+    def _lookup_answer_cache(self, questions: list, max_length: int, use_answer_cache: bool = True) -> tuple:
+        """
+        Nhúng câu hỏi một lần và tra cứu cache câu trả lời (nếu có).
+
+        Args:
+            questions (list): Danh sách câu hỏi.
+            max_length (int): Độ dài tối đa của câu trả lời được yêu cầu.
+            use_answer_cache (bool): Tra cứu cache hay chỉ nhúng câu hỏi.
+
+        Returns:
+            tuple: (danh sách kết quả đã lưu hoặc None, ma trận vector nhúng câu hỏi).
+        """
+        query_embeddings = self.rag.embed_queries(questions)
+        if self.answer_cache is None or not use_answer_cache:
+            return [None] * len(questions), query_embeddings
+        cached_results = [
+            self.answer_cache.get(question, query_embedding, max_length=max_length)
+            for question, query_embedding in zip(questions, query_embeddings)
+        ]
+        hits = sum(result is not None for result in cached_results)
+        metrics.count("answer_cache_hits", hits)
+        metrics.count("answer_cache_misses", len(questions) - hits)
+        return cached_results, query_embeddings
+
+    def generate_stream(self, input_prompt: str, max_length: int = 128, use_rag: bool = None):
+        """
+        Sinh câu trả lời dạng luồng, trả về từng phần văn bản mới ngay khi có token.
+
+        Chỉ phần thuộc câu đầu tiên được trả về (giống rag_answer của generate_text);
+        việc sinh dừng ngay khi câu đầu tiên hoàn tất.
+
+        Args:
+            input_prompt (str): Prompt đầu vào để tạo văn bản.
+            max_length (int): Độ dài tối đa của văn bản được tạo.
+            use_rag (bool, optional): Sử dụng RAG hay không (nếu None, dùng giá trị self.use_rag).
+
+        Yields:
+            str: Phần văn bản mới của câu trả lời.
+        """
+        should_use_rag = self.use_rag if use_rag is None else use_rag
+        final_prompt = self.rag.rag_query(input_prompt) if should_use_rag else input_prompt
+
+        model_inputs = self.tokenizer(final_prompt, return_tensors="pt")
+        if self.device == "cuda":
+            model_inputs = {k: v.to(self.device) for k, v in model_inputs.items()}
+
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        generation_kwargs = dict(
+            **model_inputs,
+            max_new_tokens=max_length,
+            streamer=streamer,
+            stopping_criteria=StoppingCriteriaList([
+                FirstSentenceStoppingCriteria(self.tokenizer, model_inputs["input_ids"].shape[1])
+            ]),
+            **self._prefix_cache_kwargs(final_prompt, model_inputs["input_ids"])
+        )
+        # Lỗi trong luồng sinh được chuyển về luồng tiêu thụ; streamer luôn được đóng để
+        # vòng lặp bên dưới không chờ mãi
+        errors = []
+
+        def run_generation():
+            try:
+                with torch.inference_mode():
+                    self._generate(**generation_kwargs)
+            except BaseException as e:
+                errors.append(e)
+                streamer.end()
+
+        generation_thread = Thread(target=run_generation, daemon=True)
+        generation_thread.start()
+
+        generated_text = ""
+        emitted = 0
+        for delta in streamer:
+            generated_text += delta
+            answer, finished = first_sentence(generated_text)
+            # Giữ lại dấu chấm/khoảng trắng cuối cho tới khi biết câu đã kết thúc hay chưa
+            safe_answer = answer.rstrip() if finished else answer.rstrip().rstrip('.').rstrip()
+            safe_end = len(safe_answer)
+            if safe_end > emitted:
+                yield answer[emitted:safe_end]
+                emitted = safe_end
+            if finished:
+                break
+        if errors:
+            raise errors[0]
+
+        answer = first_sentence(generated_text)[0].strip()
+        if len(answer) > emitted:
+            yield answer[emitted:]
+        generation_thread.join()
+
+    def _load_assistant(self, assistant_model_name: str, num_assistant_tokens: int, cpu_precision: str) -> None:
+        """
+        Tải mô hình nháp (cùng thiết bị và chế độ suy luận CPU với mô hình chính).
+
+        Nếu tokenizer của mô hình nháp khác mô hình chính, transformers chuyển token giữa
+        hai tokenizer (universal assisted decoding).
+        """
+        print(f"Loading assistant model {assistant_model_name}...")
+        self.assistant_model = AutoModelForCausalLM.from_pretrained(
+            assistant_model_name,
+            device_map=self.device if self.device == "cuda" else None,
+            trust_remote_code=True
+        )
+        if cpu_precision and self.device == "cpu":
+            self.assistant_model, _ = optimize_for_cpu(self.assistant_model, cpu_precision)
+        if num_assistant_tokens:
+            self.assistant_model.generation_config.num_assistant_tokens = num_assistant_tokens
+
+        self.assistant_kwargs = {"assistant_model": self.assistant_model, "do_sample": False}
+        assistant_tokenizer = AutoTokenizer.from_pretrained(assistant_model_name, trust_remote_code=True)
+        if assistant_tokenizer.get_vocab() != self.tokenizer.get_vocab():
+            self.assistant_kwargs.update(tokenizer=self.tokenizer, assistant_tokenizer=assistant_tokenizer)
+
+        # Đếm số lần chạy của mô hình chính (mỗi lần kiểm tra một loạt token nháp) và của mô hình nháp
+        # (mỗi lần đề xuất một token); chỉ tính khi đang có lượt sinh assisted
+        self.model.register_forward_hook(lambda *_: self._count_forward("main_passes"))
+        self.assistant_model.register_forward_hook(lambda *_: self._count_forward("draft_tokens"))
+        print("Assistant model loaded.")
+
+    def _count_forward(self, name: str) -> None:
+        if self._active_assisted:
+            with self._stats_lock:
+                self.assisted_stats[name] += 1
+
+    def _generate(self, **generation_kwargs):
+        """
+        Gọi model.generate, thêm mô hình nháp và ghi nhận số token mới khi bật assisted decoding.
+        """
+        if self.assistant_model is None:
+            return self.model.generate(**generation_kwargs)
+
+        with self._stats_lock:
+            self._active_assisted += 1
+        try:
+            output = self.model.generate(**generation_kwargs, **self.assistant_kwargs)
+        finally:
+            with self._stats_lock:
+                self._active_assisted -= 1
+        new_tokens = output.shape[1] - generation_kwargs["input_ids"].shape[1]
+        with self._stats_lock:
+            self.assisted_stats["generations"] += 1
+            self.assisted_stats["new_tokens"] += new_tokens
+        metrics.count("assisted_new_tokens", new_tokens)
+        return output
+
+    def assisted_decoding_stats(self) -> dict:
+        """
+        Thống kê assisted decoding: số token nháp đề xuất, tỉ lệ được chấp nhận và số token
+        mới trên mỗi lần chạy mô hình chính (1.0 với decoding thông thường).
+        """
+        with self._stats_lock:
+            stats = dict(self.assisted_stats)
+        # Mỗi lần chạy mô hình chính tạo thêm một token của chính nó, phần còn lại là token nháp được chấp nhận
+        accepted = max(0, stats["new_tokens"] - stats["main_passes"])
+        stats["accepted_tokens"] = accepted
+        stats["acceptance_rate"] = accepted / stats["draft_tokens"] if stats["draft_tokens"] else None
+        stats["tokens_per_main_pass"] = stats["new_tokens"] / stats["main_passes"] if stats["main_passes"] else None
+        return stats
+
+    def _prefix_cache_kwargs(self, final_prompt: str, input_ids: torch.Tensor) -> dict:
+        """
+        Tìm KV cache của prefix dùng chung dài nhất để truyền vào model.generate.
+
+        Prefix chỉ được dùng khi token của nó trùng khớp với phần đầu token của prompt đầy đủ.
+
+        Returns:
+            dict: {"past_key_values": ...} hoặc dict rỗng nếu không dùng được cache.
+        """
+        if self.prefix_cache is None or input_ids.shape[0] != 1:
+            return {}
+        prompt_ids = input_ids[0].tolist()
+        prefix_lengths = []
+        for prefix in prompt_prefixes(final_prompt):
+            prefix_ids = self.tokenizer(prefix)["input_ids"]
+            if prompt_ids[:len(prefix_ids)] == prefix_ids:
+                prefix_lengths.append(len(prefix_ids))
+        past_key_values = self.prefix_cache.lookup(prompt_ids, prefix_lengths)
+        metrics.count("prefix_cache_lookups", result="none" if past_key_values is None else "reuse")
+        return {} if past_key_values is None else {"past_key_values": past_key_values}
+
+    def _batch_prefix_inputs(self, batch_ids: list) -> tuple:
+        """
+        Dùng chung KV cache của phần mở đầu cố định (PROMPT_HEAD) cho cả lô prompt.
+
+        Khi mọi prompt trong lô bắt đầu bằng token của PROMPT_HEAD, KV cache của phần này được
+        lặp lại theo số prompt và phần đệm được đặt giữa phần mở đầu và phần còn lại của prompt
+        (attention_mask = 0), nên vị trí token và kết quả giống như khi đệm bên trái.
+
+        Args:
+            batch_ids (list): Token của từng prompt trong lô.
+
+        Returns:
+            tuple: (model_inputs, {"past_key_values": ...}) hoặc (None, {}) nếu không dùng được cache.
+        """
+        if self.prefix_cache is None or self.assistant_model is not None:
+            return None, {}
+        head_ids = self.tokenizer(PROMPT_HEAD)["input_ids"]
+        head_length = len(head_ids)
+        if not all(len(ids) > head_length and ids[:head_length] == head_ids for ids in batch_ids):
+            return None, {}
+        past_key_values = self.prefix_cache.lookup(batch_ids[0], [head_length])
+        metrics.count("prefix_cache_lookups", result="none" if past_key_values is None else "reuse")
+        if past_key_values is None:
+            return None, {}
+        if len(batch_ids) > 1:
+            past_key_values.batch_repeat_interleave(len(batch_ids))
+
+        prompt_length = max(len(ids) for ids in batch_ids)
+        input_ids, attention_mask = [], []
+        for ids in batch_ids:
+            padding = prompt_length - len(ids)
+            input_ids.append(head_ids + [self.tokenizer.pad_token_id] * padding + ids[head_length:])
+            attention_mask.append([1] * head_length + [0] * padding + [1] * (len(ids) - head_length))
+        model_inputs = {"input_ids": torch.tensor(input_ids), "attention_mask": torch.tensor(attention_mask)}
+        return model_inputs, {"past_key_values": past_key_values}
+
+    def _stopping_criteria(self, prompt_length: int):
+        """
+        Tạo điều kiện dừng ở câu đầu tiên (None nếu bị tắt).
+        """
+        if not self.stop_at_first_sentence:
+            return None
+        return StoppingCriteriaList([FirstSentenceStoppingCriteria(self.tokenizer, prompt_length)])
+
+    def _extract_answer(self, generated_answer: str) -> str:
+        """
+        Hậu xử lý văn bản sinh ra để chỉ lấy câu trả lời ngắn gọn.
+
+        Args:
+            generated_answer (str): Văn bản đã giải mã (bao gồm cả prompt).
+
+        Returns:
+            str: Câu đầu tiên của phần trả lời.
+        """
         # Hậu xử lý để chỉ lấy câu trả lời ngắn gọn
         if "Câu trả lời:" in generated_answer:
             answer = generated_answer.split("Câu trả lời:")[-1].strip()
@@ -125,10 +599,4 @@ class LLMGenerator:
             answer = generated_answer
 
         # Lấy câu đầu tiên (nếu có nhiều câu)
-        answer = answer.split('\n')[0].split('. ')[0].strip()
-        
-        
-        return {
-            "rag_prompt": final_prompt,
-            "rag_answer": answer
-        }
\ No newline at end of file
+        return answer.split('\n')[0].split('. ')[0].strip()
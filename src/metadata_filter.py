@@ -0,0 +1,100 @@
+import threading
+from collections import OrderedDict
+import faiss
+import numpy as np
+
+
+def filter_key(filters: dict) -> tuple:
+    """
+    Chuẩn hóa điều kiện lọc thành khóa cache: {"domain": "uet.vnu.edu.vn"} hoặc
+    {"domain": ["uet.vnu.edu.vn", "vnu.edu.vn"], "document": ...}.
+    """
+    key = []
+    for field, values in sorted(filters.items()):
+        if isinstance(values, (list, tuple, set, frozenset)):
+            key.append((field, tuple(sorted(map(str, values)))))
+        else:
+            key.append((field, (str(values),)))
+    return tuple(key)
+
+
+class MetadataFilter:
+    def __init__(self, chunk_store, cache_size: int = 64):
+        """
+        Tập ID đoạn thỏa mãn điều kiện trên metadata (url, domain, document, crawled_at, ...).
+
+        Lần lọc đầu tiên đọc metadata của toàn bộ kho đoạn một lần để lập chỉ mục ngược
+        giá trị -> ID đoạn. Với mỗi điều kiện lọc, mask, bitmap và faiss.IDSelectorBitmap được
+        tính một lần và giữ trong cache LRU, nên truy vấn lọc sau đó chỉ truyền selector vào
+        FAISS (không lấy thừa rồi lọc lại bằng Python).
+
+        Args:
+            chunk_store (ChunkStore): Kho đoạn có metadata.
+            cache_size (int): Số điều kiện lọc tối đa được giữ trong cache.
+        """
+        self.chunk_store = chunk_store
+        self.cache_size = cache_size
+        self._values = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _build_values(self) -> dict:
+        values = {}
+        for chunk_id in range(len(self.chunk_store)):
+            for field, value in self.chunk_store.metadata(chunk_id).items():
+                values.setdefault(field, {}).setdefault(str(value), []).append(chunk_id)
+        return {
+            field: {value: np.array(ids, dtype='int64') for value, ids in field_values.items()}
+            for field, field_values in values.items()
+        }
+
+    def field_values(self, field: str) -> dict:
+        """
+        Trả về các giá trị của một trường metadata kèm số đoạn (ví dụ số đoạn theo domain).
+        """
+        with self._lock:
+            if self._values is None:
+                self._values = self._build_values()
+            return {value: len(ids) for value, ids in self._values.get(field, {}).items()}
+
+    def get(self, filters: dict) -> dict:
+        """
+        Trả về tập ID thỏa mãn điều kiện lọc (các trường kết hợp bằng AND, các giá trị của
+        một trường kết hợp bằng OR).
+
+        Returns:
+            dict: key (khóa cache), ids (mảng ID tăng dần), mask (mảng bool theo ID đoạn) và
+                selector (faiss.IDSelectorBitmap dùng trong SearchParameters).
+        """
+        key = filter_key(filters)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+            if self._values is None:
+                self._values = self._build_values()
+            mask = np.ones(len(self.chunk_store), dtype=bool)
+            for field, values in key:
+                if field not in self._values:
+                    print(f"Cảnh báo: không đoạn nào có metadata '{field}' (chỉ mục không được tạo từ dữ liệu "
+                          f"crawl kèm crawled.jsonl), bộ lọc {field} sẽ không trả về kết quả.")
+                field_mask = np.zeros(len(self.chunk_store), dtype=bool)
+                for value in values:
+                    field_mask[self._values.get(field, {}).get(value, [])] = True
+                mask &= field_mask
+
+            # Bitmap phải sống cùng selector vì FAISS chỉ giữ con trỏ tới vùng nhớ
+            bits = np.packbits(mask, bitorder="little")
+            entry = {
+                "key": key,
+                "ids": np.flatnonzero(mask),
+                "mask": mask,
+                "bits": bits,
+                "selector": faiss.IDSelectorBitmap(len(bits), faiss.swig_ptr(bits)),
+            }
+            self._entries[key] = entry
+            while len(self._entries) > self.cache_size:
+                self._entries.popitem(last=False)
+            return entry
@@ -0,0 +1,181 @@
+import os
+import json
+import numpy as np
+import torch
+
+# Thư mục mặc định chứa các mô hình nhúng đã xuất sang ONNX
+ONNX_DIR = os.path.join(os.getenv("DATA_DIR", "data"), "onnx")
+ONNX_OPSET = 17
+
+# Câu mẫu dùng để so sánh vector ONNX với vector PyTorch khi tải mô hình
+PARITY_TEXTS = [
+    "Trường Đại học Công nghệ được thành lập năm nào?",
+    "Địa chỉ của Đại học Quốc gia Hà Nội ở đâu?",
+    "Chương trình đào tạo cử nhân ngành Khoa học máy tính kéo dài bao lâu?",
+    "VNU có bao nhiêu cơ sở chính tại Hà Nội",
+    "Điểm chuẩn",
+    "Học phí của chương trình thạc sĩ liên quan bán dẫn năm 2025 là bao nhiêu và sinh viên có thể "
+    "đăng ký học bổng ở đâu?",
+]
+# Cosine tối thiểu giữa vector ONNX và vector PyTorch (int8 lệch nhiều hơn do lượng tử hóa)
+PARITY_MIN_COSINE = {"fp32": 0.9999, "int8": 0.98}
+
+
+class _SentenceEncoderModule(torch.nn.Module):
+    def __init__(self, sentence_model, input_names: list):
+        """
+        Bọc SentenceTransformer (transformer + pooling + chuẩn hóa nếu có) thành mô hình nhận
+        tensor và trả về vector câu, để xuất sang ONNX trong một đồ thị.
+        """
+        super().__init__()
+        self.sentence_model = sentence_model
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        features = dict(zip(self.input_names, inputs))
+        return self.sentence_model(features)["sentence_embedding"]
+
+
+def onnx_model_dir(model_name: str, onnx_dir: str = ONNX_DIR) -> str:
+    """
+    Thư mục chứa bản ONNX của một mô hình nhúng (tên mô hình Hugging Face hoặc đường dẫn cục bộ).
+    """
+    return os.path.join(onnx_dir, model_name.strip("/").replace("/", "__"))
+
+
+def export_onnx(sentence_model, tokenizer, model_name: str, onnx_dir: str = ONNX_DIR, quantize: bool = False) -> str:
+    """
+    Xuất mô hình nhúng sang ONNX (gồm cả pooling), tùy chọn thêm bản trọng số int8.
+
+    Bản đã xuất được dùng lại ở lần tải sau nếu cấu hình không đổi.
+
+    Args:
+        sentence_model (SentenceTransformer): Mô hình nhúng fp32 đã tải.
+        tokenizer: Tokenizer của mô hình nhúng.
+        model_name (str): Tên mô hình nhúng (dùng để đặt tên thư mục).
+        onnx_dir (str): Thư mục gốc chứa các mô hình ONNX.
+        quantize (bool): Tạo thêm model_int8.onnx (dynamic quantization trọng số MatMul sang int8).
+
+    Returns:
+        str: Thư mục chứa model.onnx, model_int8.onnx (nếu có) và encoder_config.json.
+    """
+    model_dir = onnx_model_dir(model_name, onnx_dir)
+    model_path = os.path.join(model_dir, "model.onnx")
+    config_path = os.path.join(model_dir, "encoder_config.json")
+    input_names = list(tokenizer.model_input_names)
+    config = {
+        "model_name": model_name,
+        "input_names": input_names,
+        "max_seq_length": sentence_model.max_seq_length,
+        "do_lower_case": bool(getattr(sentence_model[0], "do_lower_case", False)),
+        "embedding_dimension": sentence_model.get_sentence_embedding_dimension(),
+    }
+
+    exported = False
+    if os.path.exists(config_path) and os.path.exists(model_path):
+        with open(config_path, "r", encoding="utf-8") as config_file:
+            exported = json.load(config_file) == config
+    if not exported:
+        print(f"Đang xuất {model_name} sang ONNX tại {model_dir}...")
+        os.makedirs(model_dir, exist_ok=True)
+        sample = tokenizer(["Xin chào", "Đại học Quốc gia Hà Nội"], padding=True, return_tensors="pt")
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["sentence_embedding"] = {0: "batch"}
+        module = _SentenceEncoderModule(sentence_model.cpu().eval(), input_names)
+        with torch.inference_mode():
+            torch.onnx.export(
+                module,
+                tuple(sample[name] for name in input_names),
+                model_path,
+                input_names=input_names,
+                output_names=["sentence_embedding"],
+                dynamic_axes=dynamic_axes,
+                opset_version=ONNX_OPSET,
+                dynamo=False
+            )
+        with open(config_path, "w", encoding="utf-8") as config_file:
+            json.dump(config, config_file, ensure_ascii=False, indent=2)
+
+    int8_path = os.path.join(model_dir, "model_int8.onnx")
+    if quantize and (not exported or not os.path.exists(int8_path)):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(model_path, int8_path, weight_type=QuantType.QInt8)
+    return model_dir
+
+
+class OnnxEncoder:
+    def __init__(self, model_dir: str, tokenizer, precision: str = "fp32", num_threads: int = 0):
+        """
+        Mã hóa câu bằng mô hình nhúng đã xuất sang ONNX, chạy với ONNX Runtime trên CPU.
+
+        Tránh chi phí Python/PyTorch của SentenceTransformer.encode, đáng kể với câu hỏi ngắn
+        được nhúng từng câu một. Giao diện encode giống SentenceTransformer.encode.
+
+        Args:
+            model_dir (str): Thư mục do export_onnx tạo ra.
+            tokenizer: Tokenizer của mô hình nhúng.
+            precision (str): "fp32" (model.onnx) hoặc "int8" (model_int8.onnx).
+            num_threads (int): Số luồng intra-op của ONNX Runtime (0: mặc định).
+        """
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("Backend ONNX cần cài onnxruntime: pip install onnxruntime onnx") from e
+
+        with open(os.path.join(model_dir, "encoder_config.json"), "r", encoding="utf-8") as config_file:
+            self.config = json.load(config_file)
+        self.tokenizer = tokenizer
+        self.precision = precision
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        model_file = "model_int8.onnx" if precision == "int8" else "model.onnx"
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["embedding_dimension"]
+
+    def encode(self, sentences, batch_size: int = 32) -> np.ndarray:
+        """
+        Tạo vector nhúng (float32) cho một câu hoặc danh sách câu.
+
+        Câu được sắp theo độ dài trước khi chia lô để giảm phần đệm, giống SentenceTransformer.
+
+        Returns:
+            np.ndarray: Vector (một câu) hoặc ma trận (danh sách câu).
+        """
+        texts = [sentences] if isinstance(sentences, str) else list(sentences)
+        if self.config["do_lower_case"]:
+            texts = [text.lower() for text in texts]
+        vectors = np.zeros((len(texts), self.config["embedding_dimension"]), dtype='float32')
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            positions = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [texts[position] for position in positions],
+                padding=True,
+                truncation=True,
+                max_length=self.config["max_seq_length"],
+                return_tensors="np"
+            )
+            inputs = {name: encoded[name].astype('int64') for name in self.config["input_names"]}
+            vectors[positions] = self.session.run(None, inputs)[0]
+        return vectors[0] if isinstance(sentences, str) else vectors
+
+
+def parity_check(reference_model, encoder, texts: list = PARITY_TEXTS) -> dict:
+    """
+    So sánh vector của encoder (ONNX) với vector của mô hình PyTorch trên cùng các câu.
+
+    Returns:
+        dict: min_cosine (cosine nhỏ nhất giữa hai vector của cùng một câu) và max_abs_diff.
+    """
+    expected = np.asarray(reference_model.encode(texts), dtype='float32')
+    actual = np.asarray(encoder.encode(texts), dtype='float32')
+    cosine = (expected * actual).sum(axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1) + 1e-12
+    )
+    return {"min_cosine": float(cosine.min()), "max_abs_diff": float(np.abs(expected - actual).max())}
@@ -0,0 +1,104 @@
+import copy
+import threading
+from collections import OrderedDict
+import torch
+
+
+def cache_nbytes(past_key_values) -> int:
+    """
+    Ước lượng dung lượng bộ nhớ (byte) của một KV cache.
+    """
+    if hasattr(past_key_values, "layers"):
+        tensors = [t for layer in past_key_values.layers for t in (layer.keys, layer.values) if t is not None]
+    elif hasattr(past_key_values, "key_cache"):
+        tensors = list(past_key_values.key_cache) + list(past_key_values.value_cache)
+    else:
+        tensors = [t for layer in past_key_values for t in layer]
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class PrefixKVCache:
+    def __init__(self, model, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Bộ nhớ đệm past key/values cho các phần đầu prompt dùng chung (phần mở đầu cố định
+        của prompt RAG, khối ngữ cảnh lặp lại), giới hạn theo dung lượng và loại bỏ theo LRU.
+
+        Args:
+            model: Mô hình causal LM dùng để tính KV cache.
+            max_bytes (int): Dung lượng tối đa của toàn bộ KV cache được giữ.
+        """
+        self.model = model
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "reused_tokens": 0}
+
+    def _compute(self, prefix_ids: tuple, base_ids: tuple = None, base_cache=None):
+        # Tính KV cache cho prefix, nối tiếp từ cache của một prefix ngắn hơn nếu có
+        device = self.model.device
+        if base_cache is None:
+            input_ids = torch.tensor([prefix_ids], device=device)
+            past_key_values = None
+        else:
+            input_ids = torch.tensor([prefix_ids[len(base_ids):]], device=device)
+            past_key_values = copy.deepcopy(base_cache)
+        with torch.inference_mode():
+            output = self.model(input_ids=input_ids, past_key_values=past_key_values, use_cache=True)
+        return output.past_key_values
+
+    def _store(self, prefix_ids: tuple, past_key_values) -> None:
+        nbytes = cache_nbytes(past_key_values)
+        if nbytes > self.max_bytes:
+            return
+        self._entries[prefix_ids] = (past_key_values, nbytes)
+        self.total_bytes += nbytes
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_bytes) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_bytes
+            self.counters["evictions"] += 1
+
+    def lookup(self, input_ids: list, prefix_lengths: list):
+        """
+        Lấy KV cache cho prefix dài nhất trong các độ dài ứng viên (tính và lưu nếu chưa có).
+
+        Args:
+            input_ids (list): Token của toàn bộ prompt.
+            prefix_lengths (list): Số token của các prefix ứng viên (ví dụ: phần mở đầu cố định,
+                phần mở đầu + ngữ cảnh).
+
+        Returns:
+            Bản sao KV cache của prefix (có thể truyền vào model.generate), hoặc None.
+        """
+        # Phải chừa ít nhất một token cho generate
+        lengths = sorted({length for length in prefix_lengths if 0 < length < len(input_ids)})
+        if not lengths:
+            return None
+
+        with self._lock:
+            longest = tuple(input_ids[:lengths[-1]])
+            if longest in self._entries:
+                self._entries.move_to_end(longest)
+                self.counters["hits"] += 1
+            else:
+                self.counters["misses"] += 1
+                # Nối tiếp từ prefix ngắn hơn đã có trong cache (ví dụ phần mở đầu cố định)
+                base_ids, base_cache = None, None
+                for length in lengths[:-1]:
+                    shorter = tuple(input_ids[:length])
+                    if shorter not in self._entries:
+                        self._store(shorter, self._compute(shorter))
+                    if shorter in self._entries:
+                        self._entries.move_to_end(shorter)
+                        base_ids, base_cache = shorter, self._entries[shorter][0]
+                self._store(longest, self._compute(longest, base_ids, base_cache))
+                if longest not in self._entries:
+                    return None
+
+            self.counters["reused_tokens"] += len(longest)
+            # generate() ghi thêm vào cache nên luôn trả về bản sao
+            return copy.deepcopy(self._entries[longest][0])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries), total_bytes=self.total_bytes)
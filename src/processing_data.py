@@ -1,3 +1,11 @@
+import os
+
+# Định nghĩa các hằng số
+DATA_DIR = os.getenv('DATA_DIR', 'data')  # Thư mục dữ liệu
+INPUT_FILE_PATH = os.path.join(DATA_DIR, 'all_data.txt')  # File đầu vào
+OUTPUT_FILE_PATH = os.path.join(DATA_DIR, 'data_clean.txt')  # File đầu ra
+
+
 def remove_extra_empty_lines(input_file, output_file):
     try:
         # Đọc nội dung file
@@ -33,7 +41,6 @@ def remove_extra_empty_lines(input_file, output_file):
     except Exception as e:
         print(f"Đã xảy ra lỗi: {e}")
 
-# Sử dụng hàm
-input_file = './data/all_data.txt'  # File đầu vào
-output_file = 'data/data_clean.txt'  # File đầu ra
-remove_extra_empty_lines(input_file, output_file)
\ No newline at end of file
+if __name__ == "__main__":
+    # Sử dụng hàm
+    remove_extra_empty_lines(INPUT_FILE_PATH, OUTPUT_FILE_PATH)
@@ -11,32 +11,48 @@ load_dotenv()
 # Định nghĩa các hằng số
 EMBEDDING_MODEL = os.getenv("MODEL_EMBEDDING")
 CHUNK_SIZE = 256
-TEST_DATA_PATH = "./data/questions.json"
-OUTPUT_JSON_PATH = "data/rag_prompt_result.json"
+DATA_DIR = os.getenv("DATA_DIR", "data")
+TEST_DATA_PATH = os.path.join(DATA_DIR, "questions.json")
+OUTPUT_JSON_PATH = os.path.join(DATA_DIR, "rag_prompt_result.json")
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "8"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+PREFIX_CACHE_BYTES = int(os.getenv("PREFIX_CACHE_BYTES", "0"))
 
-def process_queries_with_rag():
+def process_queries_with_rag(batch_size: int = BATCH_SIZE):
     """
     Xử lý các câu hỏi từ file JSON bằng RAG và LLM, sau đó lưu kết quả.
+
+    Args:
+        batch_size (int): Số câu hỏi được sinh câu trả lời trong một lô.
     """
     # Khởi tạo RAG và LLMGenerator
-    rag_system = RagSystem(model_name=EMBEDDING_MODEL, chunk_size=CHUNK_SIZE)
+    rag_system = RagSystem(
+        model_name=EMBEDDING_MODEL,
+        chunk_size=CHUNK_SIZE,
+        embedding_cache_dir=EMBEDDING_CACHE_DIR,
+        retrieval_mode=RETRIEVAL_MODE
+    )
     llm = LLMGenerator(
         model_name="meta-llama/Llama-3.2-1B-Instruct",
         embedding_model=EMBEDDING_MODEL,
-        use_rag=True
+        use_rag=True,
+        rag_system=rag_system,
+        prefix_cache_bytes=PREFIX_CACHE_BYTES
     )
 
     # Đọc dữ liệu câu hỏi từ file JSON
     with open(TEST_DATA_PATH, "r", encoding="utf-8") as file:
         data = json.load(file)
 
-    # Xử lý từng câu hỏi
-    for index, item in enumerate(data):
+    # Tạo câu trả lời bằng RAG và LLM theo lô
+    queries = [item["question"] for item in data]
+    results = llm.generate_batch(queries, batch_size=batch_size, max_length=128)
+
+    for index, (item, result) in enumerate(zip(data, results)):
         query = item["question"]
         print(f"\n--- Query {index + 1}: {query} ---")
-        
-        # Tạo câu trả lời bằng RAG và LLM
-        result = llm.generate_text(query, max_length=128)
+
         rag_prompt = result["rag_prompt"]
         rag_answer = result["rag_answer"]
         
@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from dotenv import load_dotenv
+from instrumentation import metrics
+
+# Tải biến môi trường từ file .env
+load_dotenv()
+
+# Định nghĩa các hằng số
+EMBEDDING_MODEL = os.getenv("MODEL_EMBEDDING")
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+DATA_DIR = os.getenv("DATA_DIR", "data")
+INDEX_PATH = os.path.join(DATA_DIR, "faiss_index.bin")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+RERANKER_MODEL = os.getenv("RERANKER_MODEL") or None
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "0"))
+ASSISTANT_MODEL = os.getenv("ASSISTANT_MODEL") or None
+NUM_ASSISTANT_TOKENS = int(os.getenv("NUM_ASSISTANT_TOKENS", "0"))
+CPU_PRECISION = os.getenv("CPU_PRECISION") or None
+PREFIX_CACHE_BYTES = int(os.getenv("PREFIX_CACHE_BYTES", "0"))
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+NUM_INTEROP_THREADS = int(os.getenv("TORCH_NUM_INTEROP_THREADS", "0"))
+LLM_MODEL = "meta-llama/Llama-3.2-1B-Instruct"
+SERVER_HOST = os.getenv("RAG_SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("RAG_SERVER_PORT", "8000"))
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "8"))
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "20"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+DEFAULT_MAX_LENGTH = 128
+MAX_ANSWER_LENGTH = int(os.getenv("MAX_ANSWER_LENGTH", "512"))
+
+
+class LatencyStats:
+    def __init__(self, window: int = 1000):
+        """
+        Thống kê độ trễ trên cửa sổ các request gần nhất.
+
+        Args:
+            window (int): Số request gần nhất được giữ lại để tính phân vị.
+        """
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_items = 0
+
+    def record(self, latency_ms: float, error: bool = False) -> None:
+        with self._lock:
+            self._latencies.append(latency_ms)
+            self.requests += 1
+            self.errors += int(error)
+
+    def record_batch(self, size: int) -> None:
+        with self._lock:
+            self.batches += 1
+            self.batched_items += size
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = np.array(self._latencies) if self._latencies else np.zeros(1)
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "batches": self.batches,
+                "mean_batch_size": self.batched_items / self.batches if self.batches else 0.0,
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p95_ms": float(np.percentile(latencies, 95)),
+            }
+
+
+class _PendingQuery:
+    def __init__(self, question: str, max_length: int):
+        self.question = question
+        self.max_length = max_length
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    def __init__(self, llm, batch_size: int = 8, batch_window_ms: float = 20.0, stats: LatencyStats = None):
+        """
+        Gom các câu hỏi đến trong một khoảng thời gian ngắn thành lô và chạy generate_batch.
+
+        Args:
+            llm (LLMGenerator): Bộ sinh văn bản đã được tải sẵn.
+            batch_size (int): Số câu hỏi tối đa trong một lô.
+            batch_window_ms (float): Thời gian chờ tối đa để gom thêm câu hỏi vào lô.
+            stats (LatencyStats, optional): Nơi ghi nhận độ trễ và số lô.
+        """
+        self.llm = llm
+        self.batch_size = batch_size
+        self.batch_window = batch_window_ms / 1000
+        self.stats = stats or LatencyStats()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, questions: list, max_length: int = 128) -> list:
+        """
+        Đưa danh sách câu hỏi vào hàng đợi và chờ kết quả.
+
+        Returns:
+            list: Danh sách dict gồm rag_prompt, rag_answer và latency_ms.
+        """
+        pending = [_PendingQuery(question, max_length) for question in questions]
+        for item in pending:
+            self._queue.put(item)
+        for item in pending:
+            item.done.wait()
+            if item.error is not None:
+                raise item.error
+        return [item.result for item in pending]
+
+    def _collect_batch(self) -> list:
+        # Chờ câu hỏi đầu tiên, sau đó gom thêm trong batch_window giây
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect_batch()
+            self.stats.record_batch(len(batch))
+
+            # Các câu hỏi trong một lô phải có cùng max_length
+            groups = {}
+            for item in batch:
+                groups.setdefault(item.max_length, []).append(item)
+
+            for max_length, items in groups.items():
+                try:
+                    results = self.llm.generate_batch(
+                        [item.question for item in items], batch_size=self.batch_size, max_length=max_length
+                    )
+                except Exception as e:
+                    results = [None] * len(items)
+                    for item in items:
+                        item.error = e
+                for item, result in zip(items, results):
+                    latency_ms = (time.perf_counter() - item.enqueued_at) * 1000
+                    if result is not None:
+                        item.result = dict(result, latency_ms=latency_ms)
+                    self.stats.record(latency_ms, error=item.error is not None)
+                    metrics.observe("request_ms", latency_ms)
+                    metrics.count("requests", status="error" if item.error is not None else "ok")
+                    item.done.set()
+
+
+def make_handler(batcher: MicroBatcher):
+    """
+    Tạo lớp xử lý HTTP cho các endpoint /query, /query_batch, /health và /metrics (Prometheus).
+    """
+    class RagRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+
+        def do_GET(self):
+            if self.path == "/health":
+                health = dict(status="ok", queue_depth=batcher.queue_depth, **batcher.stats.snapshot())
+                answer_cache = getattr(batcher.llm, "answer_cache", None)
+                if answer_cache is not None:
+                    health["answer_cache"] = answer_cache.stats()
+                reranker = getattr(getattr(batcher.llm, "rag", None), "reranker", None)
+                if reranker is not None:
+                    health["reranker"] = reranker.stats()
+                prefix_cache = getattr(batcher.llm, "prefix_cache", None)
+                if prefix_cache is not None:
+                    health["prefix_cache"] = prefix_cache.stats()
+                embedder = getattr(getattr(batcher.llm, "rag", None), "embedder", None)
+                if embedder is not None:
+                    health["embedding"] = {"backend": embedder.backend, "precision": embedder.precision}
+                if getattr(batcher.llm, "assistant_model", None) is not None:
+                    health["assisted_decoding"] = batcher.llm.assisted_decoding_stats()
+                self._send_json(200, health)
+            elif self.path == "/metrics":
+                body = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            try:
+                payload = self._read_json()
+            except (ValueError, UnicodeDecodeError):
+                self._send_json(400, {"error": "invalid JSON"})
+                return
+
+            if self.path not in ("/query", "/query_batch"):
+                self._send_json(404, {"error": "not found"})
+                return
+            if not isinstance(payload, dict):
+                self._send_json(400, {"error": "request body must be a JSON object"})
+                return
+            if self.path == "/query" and isinstance(payload.get("question"), str):
+                questions = [payload["question"]]
+            elif self.path == "/query_batch" and isinstance(payload.get("questions"), list):
+                questions = [str(question) for question in payload["questions"]]
+            else:
+                self._send_json(400, {"error": "bad request"})
+                return
+
+            # max_length phải là số nguyên trong khoảng [1, MAX_ANSWER_LENGTH]
+            max_length = payload.get("max_length", DEFAULT_MAX_LENGTH)
+            if isinstance(max_length, bool) or not isinstance(max_length, (int, str)):
+                max_length = None
+            try:
+                max_length = int(max_length)
+            except (TypeError, ValueError):
+                max_length = None
+            if max_length is None or not 1 <= max_length <= MAX_ANSWER_LENGTH:
+                self._send_json(400, {"error": f"max_length must be an integer between 1 and {MAX_ANSWER_LENGTH}"})
+                return
+
+            try:
+                results = batcher.submit(questions, max_length=max_length)
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+                return
+
+            if self.path == "/query":
+                self._send_json(200, results[0])
+            else:
+                self._send_json(200, {"results": results})
+
+        def log_message(self, format, *args):
+            # Không ghi log cho từng request
+            pass
+
+    return RagRequestHandler
+
+
+def create_server(llm, host: str = SERVER_HOST, port: int = SERVER_PORT, batch_size: int = BATCH_SIZE,
+                  batch_window_ms: float = BATCH_WINDOW_MS) -> ThreadingHTTPServer:
+    """
+    Tạo HTTP server giữ một LLMGenerator trong bộ nhớ (chưa chạy serve_forever).
+    """
+    batcher = MicroBatcher(llm, batch_size=batch_size, batch_window_ms=batch_window_ms)
+    server = ThreadingHTTPServer((host, port), make_handler(batcher))
+    server.batcher = batcher
+    return server
+
+
+def query_server(base_url: str, questions: list, max_length: int = 128, timeout: float = 600) -> list:
+    """
+    Client đơn giản: gửi câu hỏi tới server và trả về danh sách kết quả.
+    """
+    body = json.dumps({"questions": questions, "max_length": max_length}, ensure_ascii=False).encode("utf-8")
+    request = urllib.request.Request(
+        base_url.rstrip("/") + "/query_batch", data=body, headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))["results"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chạy RAG query server giữ sẵn mô hình trong bộ nhớ.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_MS)
+    args = parser.parse_args()
+
+    from llm_generator import LLMGenerator
+    from answer_cache import AnswerCache
+
+    # ANSWER_CACHE_SIZE=0 để tắt cache câu trả lời
+    answer_cache = None
+    if ANSWER_CACHE_SIZE > 0:
+        answer_cache = AnswerCache(
+            max_entries=ANSWER_CACHE_SIZE,
+            ttl_seconds=ANSWER_CACHE_TTL,
+            similarity_threshold=ANSWER_CACHE_THRESHOLD,
+            index_path=INDEX_PATH
+        )
+
+    # Bước sắp xếp lại bằng cross-encoder (bật khi RERANKER_MODEL được thiết lập)
+    reranker = None
+    if RERANKER_MODEL:
+        from reranker import CrossEncoderReranker
+        reranker = CrossEncoderReranker(
+            RERANKER_MODEL, latency_budget_ms=RERANK_BUDGET_MS or None, precision=CPU_PRECISION
+        )
+
+    llm = LLMGenerator(
+        model_name=LLM_MODEL,
+        embedding_model=EMBEDDING_MODEL,
+        use_rag=True,
+        embedding_cache_dir=EMBEDDING_CACHE_DIR,
+        answer_cache=answer_cache,
+        cpu_precision=CPU_PRECISION,
+        prefix_cache_bytes=PREFIX_CACHE_BYTES,
+        num_threads=NUM_THREADS,
+        num_interop_threads=NUM_INTEROP_THREADS,
+        retrieval_mode=RETRIEVAL_MODE,
+        reranker=reranker,
+        embedding_backend=EMBEDDING_BACKEND,
+        assistant_model_name=ASSISTANT_MODEL,
+        num_assistant_tokens=NUM_ASSISTANT_TOKENS or None
+    )
+    # Chạy thử một câu để khởi động mô hình trước khi nhận request (không lưu vào cache câu trả lời)
+    llm.generate_batch(["Xin chào"], max_length=1, use_answer_cache=False)
+
+    server = create_server(llm, args.host, args.port, args.batch_size, args.batch_window_ms)
+    print(f"RAG server đang chạy tại http://{args.host}:{args.port} (/query, /query_batch, /health, /metrics)")
+    server.serve_forever()
@@ -1,14 +1,63 @@
+import os
 import re
 import pickle
+import faiss
 import numpy as np
-from faiss import IndexFlatL2, read_index
 from embedding import Embedding
+from chunk_store import ChunkStore
+from index_factory import load_index, search_parameters, set_search_params
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from metadata_filter import MetadataFilter
+from instrumentation import metrics
+
+# Thư mục chứa chỉ mục và kho đoạn (đổi được qua biến môi trường DATA_DIR)
+DATA_DIR = os.getenv("DATA_DIR", "data")
+
+# Các chế độ truy xuất: dense (FAISS), sparse (BM25), hybrid (kết hợp bằng RRF)
+RETRIEVAL_MODES = ("dense", "sparse", "hybrid")
+
+# Các phần cố định mở đầu prompt tăng cường; phần trước mỗi mốc là prefix dùng chung giữa các câu hỏi
+PROMPT_HEAD = "\nDựa vào thông tin sau:"
+PROMPT_QUESTION = "\nTrả lời câu hỏi:"
+
+
+def prompt_prefixes(prompt: str) -> list:
+    """
+    Trả về các prefix dùng chung của một prompt tăng cường: phần mở đầu cố định và
+    phần mở đầu + ngữ cảnh (dùng cho KV cache của LLMGenerator).
+
+    Args:
+        prompt (str): Prompt tăng cường do RagSystem tạo ra.
+
+    Returns:
+        list: Danh sách prefix (chuỗi) từ ngắn đến dài, rỗng nếu prompt không theo mẫu.
+    """
+    if not prompt.startswith(PROMPT_HEAD):
+        return []
+    prefixes = [PROMPT_HEAD]
+    question_position = prompt.find(PROMPT_QUESTION)
+    if question_position > len(PROMPT_HEAD):
+        prefixes.append(prompt[:question_position])
+    return prefixes
 
 class RagSystem:
     def __init__(
         self,
         model_name: str = "bkai-foundation-models/vietnamese-bi-encoder",
-        chunk_size: int = 256
+        chunk_size: int = 256,
+        index_path: str = os.path.join(DATA_DIR, "faiss_index.bin"),
+        chunk_store_path: str = os.path.join(DATA_DIR, "chunks"),
+        nprobe: int = None,
+        ef_search: int = None,
+        embedding_cache_dir: str = None,
+        embedding_precision: str = None,
+        embedding_backend: str = "torch",
+        retrieval_mode: str = "dense",
+        bm25_path: str = os.path.join(DATA_DIR, "bm25"),
+        hybrid_depth: int = 20,
+        reranker=None,
+        rerank_candidates: int = 50,
+        subindex_max_chunks: int = 0
     ):
         """
         Khởi tạo hệ thống RAG với mô hình nhúng và kích thước đoạn.
@@ -16,14 +65,70 @@ class RagSystem:
         Args:
             model_name (str): Tên mô hình nhúng từ Hugging Face.
             chunk_size (int): Kích thước tối đa của mỗi đoạn (số token).
+            index_path (str): Đường dẫn chỉ mục FAISS (cấu hình đọc từ file .json đi kèm).
+            chunk_store_path (str): Tiền tố kho đoạn mmap (dùng chunks.pkl cùng thư mục nếu chưa có).
+            nprobe (int, optional): Số cụm duyệt khi tìm kiếm với chỉ mục IVF.
+            ef_search (int, optional): Độ rộng tìm kiếm với chỉ mục HNSW.
+            embedding_cache_dir (str, optional): Thư mục cache vector nhúng dùng chung với data_processor.
+            embedding_precision (str, optional): Chế độ suy luận trên CPU của mô hình nhúng ("fp32", "bf16", "int8").
+            embedding_backend (str): Backend mã hóa câu hỏi ("torch" hoặc "onnx" - ONNX Runtime trên CPU).
+            retrieval_mode (str): Chế độ truy xuất mặc định ("dense", "sparse", "hybrid").
+            bm25_path (str): Tiền tố chỉ mục BM25 do data_processor tạo ra.
+            hybrid_depth (int): Số kết quả lấy từ mỗi phía trước khi kết hợp bằng RRF.
+            reranker (CrossEncoderReranker, optional): Bước sắp xếp lại bằng cross-encoder.
+            rerank_candidates (int): Số ứng viên truy xuất để sắp xếp lại khi có reranker.
+            subindex_max_chunks (int): Bộ lọc metadata chọn không quá số đoạn này được tìm trong
+                chỉ mục con (flat, chính xác) tạo riêng cho bộ lọc, ví dụ theo từng domain (0: tắt).
         """
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"retrieval_mode phải là một trong {RETRIEVAL_MODES}, nhận được: {retrieval_mode}")
+
         # Khởi tạo đối tượng Embedding
-        self.embedder = Embedding(model_name=model_name, chunk_size=chunk_size)
+        self.embedder = Embedding(
+            model_name=model_name,
+            chunk_size=chunk_size,
+            cache_dir=embedding_cache_dir,
+            precision=embedding_precision,
+            backend=embedding_backend
+        )
 
         # Tải chỉ mục FAISS và danh sách tài liệu
-        self.faiss_index = read_index("data/faiss_index.bin")
-        with open("data/chunks.pkl", "rb") as file:
-            self.document_list = pickle.load(file)
+        self.faiss_index, self.index_config = load_index(index_path, nprobe=nprobe, ef_search=ef_search)
+        # Kho đoạn mmap chỉ giải mã các đoạn được truy xuất; chunks.pkl cũ được tải toàn bộ
+        if ChunkStore.exists(chunk_store_path):
+            self.document_list = ChunkStore(chunk_store_path)
+            self.metadata_filter = MetadataFilter(self.document_list)
+        else:
+            with open(os.path.join(os.path.dirname(chunk_store_path), "chunks.pkl"), "rb") as file:
+                self.document_list = pickle.load(file)
+            # chunks.pkl không có metadata nên không hỗ trợ lọc
+            self.metadata_filter = None
+        self.subindex_max_chunks = subindex_max_chunks
+        self._subindexes = {}
+
+        # Chỉ mục BM25 cho truy xuất sparse/hybrid (quay về dense nếu chưa được tạo)
+        self.bm25_index = BM25Index(bm25_path) if BM25Index.exists(bm25_path) else None
+        if retrieval_mode != "dense" and self.bm25_index is None:
+            print(f"Không tìm thấy chỉ mục BM25 tại {bm25_path}, dùng truy xuất dense.")
+            retrieval_mode = "dense"
+        self.retrieval_mode = retrieval_mode
+        self.hybrid_depth = hybrid_depth
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+
+    def set_search_params(self, nprobe: int = None, ef_search: int = None) -> None:
+        """
+        Thay đổi tham số tìm kiếm của chỉ mục đã tải (đánh đổi recall và độ trễ).
+
+        Args:
+            nprobe (int, optional): Số cụm duyệt khi tìm kiếm với chỉ mục IVF.
+            ef_search (int, optional): Độ rộng tìm kiếm với chỉ mục HNSW.
+        """
+        set_search_params(self.faiss_index, nprobe=nprobe, ef_search=ef_search)
+        if nprobe is not None:
+            self.index_config["nprobe"] = nprobe
+        if ef_search is not None:
+            self.index_config["ef_search"] = ef_search
 
     def clean_rag_output(self, raw_text: str) -> str:
         """
@@ -50,31 +155,177 @@ class RagSystem:
         # Bước 4: Loại bỏ khoảng trắng thừa ở đầu và cuối
         return cleaned_text.strip()
 
-    def rag_query(self, query_text: str, top_k: int = 3) -> str:
+    def embed_queries(self, queries: list) -> np.ndarray:
         """
-        Thực hiện truy vấn RAG để tạo prompt tăng cường.
+        Tạo vector nhúng cho nhiều câu truy vấn trong một lần gọi mô hình.
+
+        Args:
+            queries (list): Danh sách câu hỏi.
+
+        Returns:
+            np.ndarray: Ma trận float32 kích thước (số câu hỏi, số chiều nhúng).
+        """
+        queries = list(queries)
+        if not queries:
+            return np.zeros((0, self.embedder.embedding_dimension), dtype='float32')
+        query_embeddings = self.embedder.embedding(queries)
+        return np.array(query_embeddings).astype('float32').reshape(len(queries), -1)
+
+    def retrieve_batch(
+        self,
+        queries: list,
+        top_k: int = 3,
+        query_embeddings: np.ndarray = None,
+        retrieval_mode: str = None,
+        filters: dict = None
+    ) -> tuple:
+        """
+        Truy xuất tài liệu cho toàn bộ câu hỏi bằng một lần tìm kiếm duy nhất.
+
+        Chế độ hybrid lấy hybrid_depth kết quả từ FAISS và BM25 rồi kết hợp bằng
+        Reciprocal Rank Fusion. Khi có reranker, rerank_candidates ứng viên được lấy ra và
+        chấm điểm lại bằng cross-encoder trước khi giữ top_k. Với filters, chỉ các đoạn có
+        metadata thỏa mãn được xét ngay trong lần tìm kiếm FAISS/BM25.
+
+        Args:
+            queries (list): Danh sách câu hỏi.
+            top_k (int): Số lượng tài liệu liên quan lấy ra cho mỗi câu hỏi.
+            query_embeddings (np.ndarray, optional): Vector nhúng đã tính sẵn của các câu hỏi.
+            retrieval_mode (str, optional): "dense", "sparse" hoặc "hybrid" (None: dùng self.retrieval_mode).
+            filters (dict, optional): Điều kiện trên metadata đoạn, ví dụ {"domain": "uet.vnu.edu.vn"}
+                hoặc {"url": [...]}; các trường kết hợp bằng AND, danh sách giá trị bằng OR.
+
+        Returns:
+            tuple: (scores, indices) dạng ma trận kích thước (số câu hỏi, top_k); với dense,
+                scores là khoảng cách FAISS.
+        """
+        with metrics.span("retrieve", mode=retrieval_mode or self.retrieval_mode, queries=len(queries)):
+            selection = self._filter_selection(filters)
+            if self.reranker is not None:
+                _, candidate_indices = self._retrieve(
+                    queries, max(top_k, self.rerank_candidates), query_embeddings, retrieval_mode, selection
+                )
+                with metrics.span("rerank", candidates=int((candidate_indices >= 0).sum())):
+                    scores, indices = self._rerank(queries, candidate_indices, top_k)
+            else:
+                scores, indices = self._retrieve(queries, top_k, query_embeddings, retrieval_mode, selection)
+
+        # ID đoạn và điểm/khoảng cách chỉ được chuyển thành danh sách khi bật instrumentation
+        if metrics.enabled:
+            metrics.count("retrieved_chunks", int((indices >= 0).sum()))
+            metrics.event("retrieval", chunk_ids=indices.tolist(), scores=np.asarray(scores).tolist())
+        return scores, indices
+
+    def _filter_selection(self, filters: dict) -> dict:
+        """
+        Lấy tập ID (mask, selector FAISS) đã tính sẵn cho điều kiện lọc (None nếu không lọc).
+        """
+        if not filters:
+            return None
+        if self.metadata_filter is None:
+            raise ValueError("Lọc theo metadata cần kho đoạn data/chunks.* (chunks.pkl không có metadata).")
+        return self.metadata_filter.get(filters)
+
+    def _dense_search(self, query_embeddings: np.ndarray, top_k: int, selection: dict) -> tuple:
+        """
+        Tìm kiếm FAISS; với bộ lọc, selector bitmap được áp dụng ngay trong lúc duyệt chỉ mục.
+        """
+        if selection is None:
+            return self.faiss_index.search(query_embeddings, top_k)
+        if 0 < len(selection["ids"]) <= self.subindex_max_chunks:
+            return self._subindex(selection).search(query_embeddings, top_k)
+        return self.faiss_index.search(
+            query_embeddings, top_k, params=search_parameters(self.index_config, selection["selector"])
+        )
+
+    def _subindex(self, selection: dict):
+        """
+        Chỉ mục con flat (tìm kiếm chính xác) chứa riêng các đoạn của một bộ lọc rất chọn lọc.
+
+        Với IVF/HNSW, selector chỉ loại ID trong các cụm/nút được duyệt nên bộ lọc chỉ còn vài
+        đoạn có thể trả về ít hơn top_k; chỉ mục con duyệt đủ các đoạn đó với chi phí nhỏ.
+        Vector được dựng lại từ chỉ mục chính (xấp xỉ với IVF-PQ).
+        """
+        subindex = self._subindexes.get(selection["key"])
+        if subindex is None:
+            if self.index_config.get("index_type", "flat").startswith("ivf"):
+                ivf_index = faiss.extract_index_ivf(self.faiss_index)
+                if ivf_index.direct_map.type == faiss.DirectMap.NoMap:
+                    ivf_index.set_direct_map_type(faiss.DirectMap.Hashtable)
+            ids = selection["ids"]
+            vectors = np.vstack([
+                self.faiss_index.reconstruct_batch(ids[start:start + 4096]) for start in range(0, len(ids), 4096)
+            ])
+            subindex = faiss.IndexIDMap2(faiss.IndexFlatL2(self.faiss_index.d))
+            subindex.add_with_ids(vectors, ids)
+            self._subindexes[selection["key"]] = subindex
+        return subindex
+
+    def _retrieve(
+        self,
+        queries: list,
+        top_k: int,
+        query_embeddings: np.ndarray,
+        retrieval_mode: str,
+        selection: dict = None
+    ) -> tuple:
+        """
+        Truy xuất top_k ứng viên bằng FAISS, BM25 hoặc kết hợp cả hai (trong tập ID của bộ lọc nếu có).
+        """
+        retrieval_mode = retrieval_mode or self.retrieval_mode
+        if retrieval_mode != "dense" and self.bm25_index is None:
+            retrieval_mode = "dense"
+        allowed = None if selection is None else selection["mask"]
+
+        if retrieval_mode == "sparse":
+            return self.bm25_index.search(queries, top_k, allowed)
+
+        if query_embeddings is None:
+            query_embeddings = self.embed_queries(queries)
+        if retrieval_mode == "dense":
+            return self._dense_search(query_embeddings, top_k, selection)
+
+        depth = max(top_k, self.hybrid_depth)
+        _, dense_indices = self._dense_search(query_embeddings, depth, selection)
+        _, sparse_indices = self.bm25_index.search(queries, depth, allowed)
+        return reciprocal_rank_fusion([dense_indices, sparse_indices], top_k)
+
+    def _rerank(self, queries: list, candidate_indices: np.ndarray, top_k: int) -> tuple:
+        """
+        Sắp xếp lại ứng viên bằng cross-encoder, trả về ma trận (scores, indices) kích thước (số câu hỏi, top_k).
+        """
+        candidates = []
+        for row in candidate_indices:
+            items = [(int(idx), self.document_list[idx]) for idx in row if idx >= 0]
+            candidates.append([(idx, doc) for idx, doc in items if doc is not None])
+
+        scores = np.zeros((len(queries), top_k), dtype='float32')
+        indices = np.full((len(queries), top_k), -1, dtype='int64')
+        for row, ranked in enumerate(self.reranker.rerank_batch(queries, candidates, top_k)):
+            for column, (idx, score) in enumerate(ranked):
+                scores[row, column] = score
+                indices[row, column] = idx
+        return scores, indices
+
+    def build_prompt(self, query_text: str, doc_indices) -> str:
+        """
+        Tạo prompt tăng cường từ câu hỏi và chỉ số các tài liệu đã truy xuất.
 
         Args:
             query_text (str): Câu hỏi đầu vào.
-            top_k (int): Số lượng tài liệu liên quan lấy ra.
+            doc_indices: Chỉ số các tài liệu liên quan (một hàng của ma trận indices).
 
         Returns:
             str: Prompt tăng cường với ngữ cảnh và câu hỏi.
         """
-        # Tạo vector nhúng cho câu truy vấn
-        query_embedding = self.embedder.embedding(query_text)
-        query_embedding = np.array([query_embedding]).astype('float32')
-
-        # Truy vấn FAISS để lấy top-k tài liệu gần nhất
-        distances, indices = self.faiss_index.search(query_embedding, top_k)
+        # FAISS trả về -1 khi không đủ kết quả; đoạn đã xóa khi cập nhật tăng dần là None
+        retrieved_docs = [self.document_list[idx] for idx in doc_indices if idx >= 0]
+        retrieved_docs = [doc for doc in retrieved_docs if doc is not None]
 
         # Kiểm tra nếu không có kết quả hợp lệ
-        if indices.size == 0 or len(indices[0]) == 0:
+        if not retrieved_docs:
             return "Không thể tìm thấy thông tin liên quan."
 
-        # Lấy các tài liệu liên quan
-        retrieved_docs = [self.document_list[idx] for idx in indices[0]]
-
         # Làm sạch và giới hạn độ dài của tài liệu
         cleaned_documents = []
         for doc in retrieved_docs:
@@ -86,13 +337,56 @@ class RagSystem:
         # Tạo ngữ cảnh
         context_text = " ".join(cleaned_documents)
 
-        print(f"Context type: {type(context_text)}")
-
         # Tạo prompt tăng cường
-        augmented_prompt = f"""
-Dựa vào thông tin sau: {context_text}
-Trả lời câu hỏi: {query_text}
+        augmented_prompt = f"""{PROMPT_HEAD} {context_text}{PROMPT_QUESTION} {query_text}
 Chỉ trả lời bằng một câu ngắn gọn, đúng trọng tâm, không lặp lại thông tin thừa hoặc prompt.
 Câu trả lời: """
 
-        return augmented_prompt
\ No newline at end of file
+        return augmented_prompt
+
+    def rag_query_batch(
+        self,
+        queries: list,
+        top_k: int = 3,
+        query_embeddings: np.ndarray = None,
+        retrieval_mode: str = None,
+        filters: dict = None
+    ) -> list:
+        """
+        Thực hiện truy vấn RAG cho nhiều câu hỏi cùng lúc.
+
+        Toàn bộ câu hỏi được nhúng trong một lần gọi SentenceTransformer.encode
+        và tìm kiếm trong một lần gọi faiss_index.search.
+
+        Args:
+            queries (list): Danh sách câu hỏi.
+            top_k (int): Số lượng tài liệu liên quan lấy ra cho mỗi câu hỏi.
+            query_embeddings (np.ndarray, optional): Vector nhúng đã tính sẵn của các câu hỏi.
+            retrieval_mode (str, optional): "dense", "sparse" hoặc "hybrid" (None: dùng self.retrieval_mode).
+            filters (dict, optional): Điều kiện trên metadata đoạn (xem retrieve_batch).
+
+        Returns:
+            list: Danh sách prompt tăng cường, cùng thứ tự với queries.
+        """
+        if not queries:
+            return []
+
+        _, indices = self.retrieve_batch(
+            queries, top_k, query_embeddings=query_embeddings, retrieval_mode=retrieval_mode, filters=filters
+        )
+        return [self.build_prompt(query, row) for query, row in zip(queries, indices)]
+
+    def rag_query(self, query_text: str, top_k: int = 3, retrieval_mode: str = None, filters: dict = None) -> str:
+        """
+        Thực hiện truy vấn RAG để tạo prompt tăng cường.
+
+        Args:
+            query_text (str): Câu hỏi đầu vào.
+            top_k (int): Số lượng tài liệu liên quan lấy ra.
+            retrieval_mode (str, optional): "dense", "sparse" hoặc "hybrid" (None: dùng self.retrieval_mode).
+            filters (dict, optional): Điều kiện trên metadata đoạn, ví dụ {"domain": "uet.vnu.edu.vn"}.
+
+        Returns:
+            str: Prompt tăng cường với ngữ cảnh và câu hỏi.
+        """
+        return self.rag_query_batch([query_text], top_k, retrieval_mode=retrieval_mode, filters=filters)[0]
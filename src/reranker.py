@@ -0,0 +1,129 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import torch
+from sentence_transformers import CrossEncoder
+from cpu_inference import optimize_for_cpu
+
+
+class CrossEncoderReranker:
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1",
+        batch_size: int = 32,
+        cache_size: int = 20000,
+        latency_budget_ms: float = None,
+        min_candidates: int = 10,
+        precision: str = None
+    ):
+        """
+        Sắp xếp lại các đoạn ứng viên bằng cross-encoder (chấm điểm từng cặp câu hỏi/đoạn).
+
+        Điểm của các cặp đã chấm được giữ trong cache LRU. Khi có latency_budget_ms, số ứng
+        viên được chấm được giới hạn theo chi phí trung bình mỗi cặp đo được gần đây, nên
+        tập ứng viên tự thu hẹp khi hệ thống chậm đi (tải cao).
+
+        Args:
+            model_name (str): Tên mô hình cross-encoder từ Hugging Face.
+            batch_size (int): Số cặp trong một lô khi chạy mô hình.
+            cache_size (int): Số điểm tối đa được giữ trong cache.
+            latency_budget_ms (float, optional): Thời gian tối đa dành cho một lần chấm điểm (None: không giới hạn).
+            min_candidates (int): Số ứng viên tối thiểu luôn được chấm điểm cho mỗi câu hỏi.
+            precision (str, optional): Chế độ suy luận trên CPU ("fp32", "bf16", "int8").
+        """
+        self.model = CrossEncoder(model_name)
+        self.precision = "fp32"
+        if precision and self.model.device.type == "cpu":
+            self.model, self.precision = optimize_for_cpu(self.model, precision)
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.latency_budget_ms = latency_budget_ms
+        self.min_candidates = min_candidates
+        self.seconds_per_pair = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"scored_pairs": 0, "cached_pairs": 0, "truncated_queries": 0}
+
+    @staticmethod
+    def _pair_key(query: str, text: str) -> str:
+        return hashlib.sha1(f"{query}\0{text}".encode("utf-8")).hexdigest()
+
+    def candidate_limit(self, num_queries: int) -> int:
+        """
+        Số ứng viên tối đa mỗi câu hỏi để lần chấm điểm nằm trong ngân sách độ trễ.
+        """
+        if not self.latency_budget_ms or self.seconds_per_pair is None:
+            return None
+        max_pairs = self.latency_budget_ms / 1000 / self.seconds_per_pair
+        return max(self.min_candidates, int(max_pairs // max(1, num_queries)))
+
+    def rerank_batch(self, queries: list, candidates: list, top_k: int = 3) -> list:
+        """
+        Chấm điểm ứng viên của toàn bộ câu hỏi trong một lần chạy cross-encoder và giữ top_k.
+
+        Args:
+            queries (list): Danh sách câu hỏi.
+            candidates (list): Với mỗi câu hỏi, danh sách (ID đoạn, nội dung đoạn) theo thứ tự truy xuất.
+            top_k (int): Số đoạn giữ lại cho mỗi câu hỏi.
+
+        Returns:
+            list: Với mỗi câu hỏi, danh sách (ID đoạn, điểm) giảm dần theo điểm.
+        """
+        # Ứng viên được xếp theo thứ tự truy xuất nên cắt bớt phần cuối khi vượt ngân sách
+        limit = self.candidate_limit(len(queries))
+        if limit is not None:
+            limit = max(limit, top_k)
+            self.counters["truncated_queries"] += sum(len(items) > limit for items in candidates)
+            candidates = [items[:limit] for items in candidates]
+
+        # Tra cache, gom các cặp chưa có điểm để chấm trong một lần
+        scores = [[None] * len(items) for items in candidates]
+        pending_keys, pending_pairs, pending_slots = [], [], []
+        with self._lock:
+            for row, (query, items) in enumerate(zip(queries, candidates)):
+                for column, (_, text) in enumerate(items):
+                    key = self._pair_key(query, text)
+                    if key in self._cache:
+                        self._cache.move_to_end(key)
+                        scores[row][column] = self._cache[key]
+                    else:
+                        pending_keys.append(key)
+                        pending_pairs.append((query, text))
+                        pending_slots.append((row, column))
+            self.counters["cached_pairs"] += sum(len(items) for items in candidates) - len(pending_pairs)
+
+        if pending_pairs:
+            start = time.perf_counter()
+            with torch.inference_mode():
+                predicted = np.asarray(self.model.predict(pending_pairs, batch_size=self.batch_size), dtype='float32')
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                # Trung bình trượt chi phí mỗi cặp, phản ánh mức tải hiện tại
+                cost = elapsed / len(pending_pairs)
+                self.seconds_per_pair = cost if self.seconds_per_pair is None else 0.8 * self.seconds_per_pair + 0.2 * cost
+                self.counters["scored_pairs"] += len(pending_pairs)
+                for key, (row, column), score in zip(pending_keys, pending_slots, predicted):
+                    scores[row][column] = float(score)
+                    self._cache[key] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        results = []
+        for items, row_scores in zip(candidates, scores):
+            ranked = sorted(zip((chunk_id for chunk_id, _ in items), row_scores), key=lambda item: -item[1])
+            results.append(ranked[:top_k])
+        return results
+
+    def stats(self) -> dict:
+        """
+        Trả về các bộ đếm, kích thước cache và chi phí trung bình mỗi cặp (ms).
+        """
+        with self._lock:
+            return dict(
+                self.counters,
+                cache_entries=len(self._cache),
+                ms_per_pair=None if self.seconds_per_pair is None else self.seconds_per_pair * 1000
+            )
@@ -10,41 +10,82 @@ load_dotenv()
 # Định nghĩa các hằng số
 EMBEDDING_MODEL = os.getenv("MODEL_EMBEDDING")
 CHUNK_SIZE = 256
-TEST_DATA_PATH = "./data/questions.json"
+DATA_DIR = os.getenv("DATA_DIR", "data")
+TEST_DATA_PATH = os.path.join(DATA_DIR, "questions.json")
 SYSTEM_OUTPUT_PATH = "system_output/system_output.txt"
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "8"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+RERANKER_MODEL = os.getenv("RERANKER_MODEL") or None
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "0"))
+ASSISTANT_MODEL = os.getenv("ASSISTANT_MODEL") or None
+NUM_ASSISTANT_TOKENS = int(os.getenv("NUM_ASSISTANT_TOKENS", "0"))
+CPU_PRECISION = os.getenv("CPU_PRECISION") or None
+PREFIX_CACHE_BYTES = int(os.getenv("PREFIX_CACHE_BYTES", "0"))
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+NUM_INTEROP_THREADS = int(os.getenv("TORCH_NUM_INTEROP_THREADS", "0"))
 
 # Danh sách mô hình
 MODEL_LIST = [{"name": "llama-3.2-1b-instruct", "link": "meta-llama/Llama-3.2-1B-Instruct"}]
 
-def run_rag_process(model_index: int = 0):
+def run_rag_process(
+    model_index: int = 0,
+    batch_size: int = BATCH_SIZE,
+    questions_path: str = TEST_DATA_PATH,
+    output_path: str = SYSTEM_OUTPUT_PATH
+):
     """
     Chạy quy trình RAG để xử lý các câu hỏi và lưu kết quả.
 
     Args:
         model_index (int): Chỉ số của mô hình trong danh sách (mặc định: 0).
+        batch_size (int): Số câu hỏi được sinh câu trả lời trong một lô.
+        questions_path (str): File JSON chứa câu hỏi.
+        output_path (str): File lưu câu trả lời (mỗi dòng một câu).
     """
     # Tải thông tin mô hình
     model_info = MODEL_LIST[model_index]
 
+    # Bước sắp xếp lại bằng cross-encoder (bật khi RERANKER_MODEL được thiết lập)
+    reranker = None
+    if RERANKER_MODEL:
+        from reranker import CrossEncoderReranker
+        reranker = CrossEncoderReranker(
+            RERANKER_MODEL, latency_budget_ms=RERANK_BUDGET_MS or None, precision=CPU_PRECISION
+        )
+
     # Khởi tạo LLMGenerator
     llm = LLMGenerator(
         model_name=model_info["link"],
         embedding_model=EMBEDDING_MODEL,
-        use_rag=True
+        use_rag=True,
+        embedding_cache_dir=EMBEDDING_CACHE_DIR,
+        cpu_precision=CPU_PRECISION,
+        prefix_cache_bytes=PREFIX_CACHE_BYTES,
+        num_threads=NUM_THREADS,
+        num_interop_threads=NUM_INTEROP_THREADS,
+        retrieval_mode=RETRIEVAL_MODE,
+        reranker=reranker,
+        embedding_backend=EMBEDDING_BACKEND,
+        assistant_model_name=ASSISTANT_MODEL,
+        num_assistant_tokens=NUM_ASSISTANT_TOKENS or None
     )
 
     # Đọc dữ liệu câu hỏi từ file JSON
-    with open(TEST_DATA_PATH, "r", encoding="utf-8") as input_file:
+    with open(questions_path, "r", encoding="utf-8") as input_file:
         data = json.load(input_file)
 
     # Danh sách câu trả lời để lưu vào system_output.txt
     system_outputs = []
 
-    # Xử lý từng câu hỏi
-    for index, item in enumerate(data):
+    # Sinh câu trả lời theo lô cho toàn bộ câu hỏi
+    queries = [item["question"] for item in data]
+    answers = llm.generate_batch(queries, batch_size=batch_size, max_length=128)
+
+    for index, (item, answer) in enumerate(zip(data, answers)):
         query = item["question"]
         print(f"\n--- Query {index + 1}: {query.encode('utf-8').decode('utf-8', errors='replace')} ---")
-        answer = llm.generate_text(query, max_length=128)
         rag_answer = answer["rag_answer"].encode('utf-8').decode('utf-8', errors='replace')
         print(f"rag_answer {index + 1}:", rag_answer)
         item["rag_prompt"] = answer["rag_prompt"]
@@ -52,12 +93,13 @@ def run_rag_process(model_index: int = 0):
         system_outputs.append(rag_answer)
 
     # Lưu kết quả vào file JSON
-    json_output_path = f"data/{model_info['name']}-result.json"
+    json_output_path = os.path.join(DATA_DIR, f"{model_info['name']}-result.json")
     with open(json_output_path, "w", encoding="utf-8") as json_file:
         json.dump(data, json_file, ensure_ascii=False, indent=2)
 
     # Lưu câu trả lời vào file system_output.txt
-    with open(SYSTEM_OUTPUT_PATH, "w", encoding="utf-8") as output_file:
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as output_file:
         for output in system_outputs:
             output_file.write(f"{output}\n")
 
@@ -0,0 +1,18 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from answer_cache import AnswerCache
+
+
+def test_answer_reused_only_for_same_max_length(tmp_path):
+    cache = AnswerCache(index_path=str(tmp_path / "faiss_index.bin"))
+    short = {"rag_prompt": "p", "rag_answer": "Xin"}
+    cache.put("Xin chào", short, [1.0, 0.0], max_length=1)
+
+    assert cache.get("xin chào?", [1.0, 0.0], max_length=1) is short
+    # Cùng câu hỏi (khớp chính xác và ngữ nghĩa) nhưng max_length khác
+    assert cache.get("Xin chào", [1.0, 0.0], max_length=128) is None
+    assert cache.get("Chào bạn", [1.0, 0.01], max_length=128) is None
+    assert cache.get("Chào bạn", [1.0, 0.01], max_length=1) is short
@@ -0,0 +1,26 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from llm_generator import LLMGenerator
+from rag_system import RagSystem
+
+
+def _unused(*args, **kwargs):
+    raise AssertionError("Không được gọi mô hình với danh sách rỗng")
+
+
+def test_embed_queries_empty():
+    rag = RagSystem.__new__(RagSystem)
+    rag.embedder = SimpleNamespace(embedding_dimension=8, embedding=_unused)
+    assert rag.embed_queries([]).shape == (0, 8)
+
+
+def test_generate_batch_empty():
+    llm = LLMGenerator.__new__(LLMGenerator)
+    llm.use_rag = True
+    llm.rag = SimpleNamespace(embed_queries=_unused, rag_query_batch=_unused)
+    assert llm.generate_batch([]) == []
+    assert llm.generate_batch([], use_rag=False) == []